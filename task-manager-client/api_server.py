@@ -5,16 +5,22 @@ Exposes task management capabilities via REST API for LM Studio integration
 """
 
 import asyncio
-import json
+import codecs
+import os
 import sys
-from typing import Any, Dict, List
+import tempfile
+from collections.abc import Iterator
+from typing import IO, Any, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+import orjson
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
 from lm_studio_tools import TaskManagerTools
+from metrics import instrument_app
 
 
 # Pydantic models for API
@@ -35,6 +41,14 @@ class ToolDefinition(BaseModel):
     parameters: Dict[str, Any]
 
 
+class TaskUpdate(BaseModel):
+    title: Optional[str] = None
+    description: Optional[str] = None
+    status: Optional[str] = None
+    priority: Optional[int] = None
+    due_at: Optional[str] = None
+
+
 # Global task manager instance
 task_manager: TaskManagerTools = None
 
@@ -43,7 +57,8 @@ task_manager: TaskManagerTools = None
 app = FastAPI(
     title="Task Manager API",
     description="HTTP API for Task Manager MCP Tools - LM Studio Integration",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 # Add CORS middleware
@@ -55,6 +70,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latency histograms for every endpoint, served at /metrics
+instrument_app(app)
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -67,12 +85,20 @@ async def startup_event():
         sys.exit(1)
 
     server_path = sys.argv[1]
-    task_manager = TaskManagerTools(server_path)
-
-    success = await task_manager.connect_to_server()
-    if not success:
-        print("❌ Failed to connect to task manager server")
-        sys.exit(1)
+    # Concurrent requests fan out over this many MCP sessions
+    pool_size = int(os.getenv("TASK_MANAGER_POOL_SIZE", "1"))
+    # Fast start: run the server on its venv interpreter, connect in the
+    # background and answer requests that don't need tools right away
+    fast_start = os.getenv("TASK_MANAGER_FAST_START", "false").lower() == "true"
+    task_manager = TaskManagerTools(server_path, pool_size=pool_size, fast_start=fast_start)
+
+    if fast_start:
+        task_manager.start_background()
+    else:
+        success = await task_manager.connect_to_server()
+        if not success:
+            print("❌ Failed to connect to task manager server")
+            sys.exit(1)
 
     print("🚀 Task Manager API Server started!")
     print("📋 Available at: http://localhost:8000")
@@ -97,22 +123,28 @@ async def root():
         "endpoints": {
             "tools": "/tools",
             "execute": "/execute",
+            "import": "/tasks/import",
+            "export": "/tasks/export",
+            "task": "/tasks/{task_id}",
+            "metrics": "/metrics",
             "docs": "/docs"
         }
     }
 
 
 @app.get("/tools", response_model=List[ToolDefinition])
-async def get_tools():
-    """Get available tool definitions"""
+async def get_tools(if_none_match: Optional[str] = Header(None)):
+    """Get available tool definitions (supports ETag / If-None-Match)"""
     global task_manager
 
     if not task_manager:
         raise HTTPException(status_code=500, detail="Task manager not initialized")
 
     try:
-        tools = await task_manager.get_tool_definitions()
-        return tools
+        body, etag = await task_manager.get_tool_catalogue()
+        if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get tools: {str(e)}")
 
@@ -146,26 +178,57 @@ async def execute_tool(request: ToolExecutionRequest):
         )
 
 
+def json_result(data: Any) -> ORJSONResponse:
+    """Encode a tool result for a convenience endpoint"""
+    return ORJSONResponse(data if isinstance(data, dict) else {"result": data})
+
+
+def task_etag(task: Dict[str, Any]) -> str:
+    """ETag for one task: its version, which changes on every write"""
+    return f'"{task.get("version", 0)}"'
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Expected task version from an If-Match header (None if absent or *)"""
+    if not if_match or if_match.strip() == "*":
+        return None
+    tag = if_match.split(",")[0].strip().removeprefix("W/").strip('"')
+    if not tag.isdigit():
+        raise HTTPException(status_code=400, detail=f"If-Match is not a task ETag: {if_match}")
+    return int(tag)
+
+
 # Convenience endpoints for common operations
 @app.get("/tasks")
-async def get_tasks():
-    """Get all tasks (convenience endpoint)"""
+async def get_tasks(
+    status: Optional[str] = None,
+    title: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+):
+    """Get tasks, optionally filtered, paginated and projected (convenience endpoint)"""
     global task_manager
 
     if not task_manager:
         raise HTTPException(status_code=500, detail="Task manager not initialized")
 
+    query = {
+        "status": status,
+        "title": title,
+        "cursor": cursor,
+        "limit": limit,
+        "fields": fields.split(",") if fields else None,
+    }
+    query = {k: v for k, v in query.items() if v is not None}
+
     try:
-        result = await task_manager.execute_tool("get-tasks", {})
+        result = await task_manager.execute_tool("get-tasks", {"input": query} if query else {})
         if result["success"]:
-            # Parse JSON result
-            tasks_data = json.loads(result["result"])
-            return tasks_data
+            # Already parsed from the tool's structured content; encoded once here
+            return json_result(result["result"])
         else:
             raise HTTPException(status_code=500, detail=result.get("error", "Failed to get tasks"))
-    except json.JSONDecodeError:
-        # If result is not JSON, return as-is
-        return {"result": result["result"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -187,18 +250,168 @@ async def add_task(title: str, description: str = ""):
         })
 
         if result["success"]:
-            # Parse JSON result
-            task_data = json.loads(result["result"])
-            return task_data
+            # Already parsed from the tool's structured content; encoded once here
+            return json_result(result["result"])
         else:
             raise HTTPException(status_code=500, detail=result.get("error", "Failed to add task"))
-    except json.JSONDecodeError:
-        # If result is not JSON, return as-is
-        return {"result": result["result"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+# Uploads are spooled to a temporary file past this size.
+SPOOL_BYTES = 8 * 2**20
+
+
+async def spool_body(request: Request) -> IO[bytes]:
+    """Read the whole request body into a temporary file, rewound for reading
+
+    A StreamingResponse can't read its request: Starlette's disconnect
+    listener takes the same receive channel, so the body has to be consumed
+    before the response starts.
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)  # noqa: SIM115 - closed by the caller
+    try:
+        async for data in request.stream():
+            body.write(data)
+    except BaseException:
+        body.close()
+        raise
+    body.seek(0)
+    return body
+
+
+def upload_batches(body: IO[bytes], fmt: str, batch_size: int, read_size: int = 2**16) -> Iterator[Tuple[str, int]]:
+    """Split an uploaded file into chunks of at most ``batch_size`` whole records
+
+    Yields ``(text, line_offset)``: adding the offset to a line number within
+    the chunk gives the line in the upload. CSV chunks each start with the
+    header row, and a quoted field spanning lines is never split.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    header, header_lines, in_header = "", 0, fmt == "csv"
+    lines: List[str] = []
+    records = quotes = consumed = 0
+
+    def take() -> Tuple[str, int]:
+        nonlocal lines, records, consumed
+        chunk = (header + "".join(lines), consumed - header_lines)
+        consumed += len(lines)
+        lines, records = [], 0
+        return chunk
+
+    def add(line: str) -> Optional[Tuple[str, int]]:
+        nonlocal header, header_lines, in_header, records, quotes, consumed
+        if fmt == "csv":
+            quotes += line.count('"')
+        if in_header:
+            header += line
+            header_lines += 1
+            consumed += 1
+            in_header = quotes % 2 == 1
+            return None
+        lines.append(line)
+        if quotes % 2 == 0 and line.strip():
+            records += 1
+            if records >= batch_size:
+                return take()
+        return None
+
+    pending = ""
+    while data := body.read(read_size):
+        pending += decoder.decode(data)
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            chunk = add(line + "\n")
+            if chunk:
+                yield chunk
+    pending += decoder.decode(b"", final=True)
+    chunk = add(pending) if pending else None
+    if chunk:
+        yield chunk
+    if lines:
+        yield take()
+
+
+@app.post("/tasks/import")
+async def import_tasks(
+    request: Request,
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    batch_size: int = Query(1000, ge=1, le=10000),
+):
+    """Bulk-import tasks from an NDJSON or CSV request body, streaming progress
+
+    The body is spooled (to disk past ``SPOOL_BYTES``) and then sent to the
+    server in batches, so memory stays bounded by the batch size. The
+    response is NDJSON: one progress line per batch, then a final line with
+    ``"done": true``.
+    """
+    if not task_manager:
+        raise HTTPException(status_code=500, detail="Task manager not initialized")
+
+    body = await spool_body(request)
+
+    async def progress():
+        totals = {"created": 0, "updated": 0, "failed": 0}
+        errors: List[Dict[str, Any]] = []
+        try:
+            for text, offset in upload_batches(body, fmt, batch_size):
+                result = await task_manager.execute_tool(
+                    "import-tasks", {"input": {"format": fmt, "data": text, "batch_size": batch_size}}
+                )
+                if not result["success"]:
+                    yield orjson.dumps({"done": True, **totals, "errors": errors, "error": result.get("error")}) + b"\n"
+                    return
+                for key in totals:
+                    totals[key] += result["result"][key]
+                errors.extend({**e, "line": e["line"] + offset} for e in result["result"]["errors"][: 20 - len(errors)])
+                yield orjson.dumps({"done": False, **totals}) + b"\n"
+            yield orjson.dumps({"done": True, **totals, "errors": errors}) + b"\n"
+        finally:
+            body.close()
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+
+@app.get("/tasks/export")
+async def export_tasks(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = None,
+    page_size: int = Query(1000, ge=1, le=10000),
+):
+    """Stream every task (optionally one status) as NDJSON or CSV, page by page"""
+    if not task_manager:
+        raise HTTPException(status_code=500, detail="Task manager not initialized")
+
+    query: Dict[str, Any] = {"format": fmt, "limit": page_size}
+    if status:
+        query["status"] = status
+    first = await task_manager.execute_tool("export-tasks", {"input": query})
+    if not first["success"]:
+        raise HTTPException(status_code=500, detail=first.get("error", "Failed to export tasks"))
+
+    async def pages():
+        page = first["result"]
+        while True:
+            yield page["data"]
+            if page["next_cursor"] is None:
+                return
+            next_query = {**query, "cursor": page["next_cursor"]}
+            result = await task_manager.execute_tool("export-tasks", {"input": next_query})
+            if not result["success"]:
+                # Headers are already sent: abort the stream rather than end it looking complete
+                raise RuntimeError(result.get("error", "Failed to export tasks"))
+            page = result["result"]
+
+    return StreamingResponse(
+        pages(),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="tasks.{fmt}"'},
+    )
+
+
 @app.get("/tasks/{task_id}")
 async def get_task(task_id: str):
     """Get a specific task (convenience endpoint)"""
@@ -215,21 +428,42 @@ async def get_task(task_id: str):
         })
 
         if result["success"]:
-            # Parse JSON result
-            task_data = json.loads(result["result"])
-            return task_data
+            # Already parsed from the tool's structured content; encoded once here
+            response = json_result(result["result"])
+            task = result["result"].get("task")
+            if task:
+                response.headers["ETag"] = task_etag(task)
+            return response
         else:
             raise HTTPException(status_code=404, detail=result.get("error", "Task not found"))
-    except json.JSONDecodeError:
-        # If result is not JSON, return as-is
-        return {"result": result["result"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.patch("/tasks/{task_id}")
+async def update_task(task_id: str, update: TaskUpdate, if_match: Optional[str] = Header(None)):
+    """Update a task; with If-Match (an ETag from GET), only if it hasn't changed since (412 otherwise)"""
+    if not task_manager:
+        raise HTTPException(status_code=500, detail="Task manager not initialized")
+
+    arguments = {"task_id": task_id, **update.model_dump(exclude_none=True)}
+    expected_version = parse_if_match(if_match)
+    if expected_version is not None:
+        arguments["expected_version"] = expected_version
+    result = await task_manager.execute_tool("update-task", {"input": arguments})
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result.get("error", "Failed to update task"))
+    body = result["result"]
+    if body.get("conflict"):
+        return ORJSONResponse(body, status_code=412, headers={"ETag": task_etag(body["conflict"])})
+    if not body.get("task"):
+        raise HTTPException(status_code=404, detail="Task not found")
+    return ORJSONResponse(body, headers={"ETag": task_etag(body["task"])})
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python api_server.py <server_path>")
+        print("Usage: python api_server.py <server_path_or_url>")
         sys.exit(1)
 
     # Run the server
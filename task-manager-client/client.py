@@ -4,15 +4,21 @@ import json
 from typing import Optional, List, Dict, Any
 from contextlib import AsyncExitStack
 
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from mcp import ClientSession
 import lmstudio as lms
 from dotenv import load_dotenv
 import os
 
+from lm_studio_tools import open_transport, tool_result_data
+
 # Load environment variables
 load_dotenv()
 
+# A described task is only marked done when its find-similar-tasks hit scores at
+# least this and clearly beats the runner-up; otherwise the user is asked to be specific.
+MIN_SIMILARITY = 0.4
+MIN_SIMILARITY_MARGIN = 0.1
+
 
 class TaskManagerClient:
     """MCP Client for Task Manager using LM Studio local LLM"""
@@ -37,17 +43,15 @@ class TaskManagerClient:
         """Connect to the task-manager MCP server
 
         Args:
-            server_script_path: Path to the server script (.py)
+            server_script_path: Path to the server script (.py), or the URL of a
+                server started with --transport streamable-http/sse
         """
-        if not server_script_path.endswith(".py"):
-            raise ValueError("Server script must be a .py file")
-
-        # Set up server parameters
-        server_params = StdioServerParameters(command="uv", args=["run", server_script_path], env=None)
+        is_url = server_script_path.startswith(("http://", "https://"))
+        if not is_url and not server_script_path.endswith(".py"):
+            raise ValueError("Server script must be a .py file or an http(s) URL")
 
         # Connect to server
-        stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
-        self.stdio, self.write = stdio_transport
+        self.stdio, self.write = await open_transport(self.exit_stack, server_script_path)
         self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write))
 
         # Initialize session
@@ -169,6 +173,8 @@ Always be helpful and provide clear explanations of what you're doing."""
             "new task",
             "list tasks",
             "show tasks",
+            "find task",
+            "search task",
             "my tasks",
             "all tasks",
             "next task",
@@ -194,40 +200,35 @@ Always be helpful and provide clear explanations of what you're doing."""
                 # Extract task title from query
                 title = self._extract_task_title(query)
                 if title:
-                    result = await self.session.call_tool("add-task", {"title": title})
+                    await self.session.call_tool("add-task", {"input": {"title": title}})
                     return f"✅ Added task: {title}"
 
             # List tasks
             elif any(phrase in query_lower for phrase in ["list tasks", "show tasks", "my tasks", "all tasks"]):
                 result = await self.session.call_tool("get-tasks", {})
-                tasks = result.content.get("tasks", [])
+                tasks = tool_result_data(result).get("tasks", [])
                 if tasks:
                     task_list = "\n".join([f"• {task['title']} ({task['status']})" for task in tasks])
                     return f"📋 Your tasks:\n{task_list}"
                 else:
                     return "📋 You have no tasks yet."
 
+            # Search tasks
+            elif any(phrase in query_lower for phrase in ["find task", "search task"]):
+                return await self._search_tasks(self._extract_search_query(query))
+
             # Next task
             elif any(phrase in query_lower for phrase in ["next task", "what's next"]):
                 result = await self.session.call_tool("next-task", {})
-                task = result.content.get("task")
+                task = tool_result_data(result).get("task")
                 if task:
                     return f"⭐ Next task: {task['title']}"
                 else:
                     return "✨ No pending tasks! You're all caught up."
 
-            # Mark task complete (simplified - would need better parsing in production)
+            # Mark task complete
             elif any(phrase in query_lower for phrase in ["mark", "complete", "done"]):
-                # For demo purposes, mark the first pending task as completed
-                tasks_result = await self.session.call_tool("get-tasks", {})
-                tasks = tasks_result.content.get("tasks", [])
-                pending_tasks = [t for t in tasks if t.get("status") == "pending"]
-                if pending_tasks:
-                    task_id = pending_tasks[0]["id"]
-                    await self.session.call_tool("set-task-status", {"task_id": task_id, "status": "completed"})
-                    return f"✅ Marked '{pending_tasks[0]['title']}' as completed"
-                else:
-                    return "ℹ️ No pending tasks to mark as completed"
+                return await self._mark_done(query)
 
         except Exception as e:
             return f"⚠️ Tool execution error: {str(e)}"
@@ -250,6 +251,81 @@ Always be helpful and provide clear explanations of what you're doing."""
                 return title if title else None
         return None
 
+    async def _mark_done(self, query: str) -> str:
+        """Mark the pending task the query describes as done"""
+        # Resolve the task the user described; with no description, take the first pending one
+        reference = self._extract_task_reference(query)
+        if reference:
+            tasks_result = await self.session.call_tool(
+                "find-similar-tasks",
+                {"input": {"text": reference, "status": "pending", "limit": 3}},
+            )
+        else:
+            tasks_result = await self.session.call_tool(
+                "get-tasks",
+                {"input": {"status": "pending", "limit": 1}},
+            )
+        tasks = tool_result_data(tasks_result).get("tasks", [])
+        pending_tasks = [t for t in tasks if t.get("status") == "pending"]
+        if not pending_tasks:
+            return "ℹ️ No pending tasks to mark as completed"
+        if reference and not self._is_clear_match(pending_tasks):
+            # A weak or ambiguous match: ask rather than close the wrong task
+            candidates = "\n".join(f"  - {t['title']}" for t in pending_tasks)
+            return f"❓ No pending task clearly matches '{reference}'. Did you mean one of these?\n{candidates}"
+        task_id = pending_tasks[0]["id"]
+        await self.session.call_tool(
+            "set-task-status",
+            {"input": {"task_id": task_id, "status": "done"}},
+        )
+        return f"✅ Marked '{pending_tasks[0]['title']}' as completed"
+
+    def _is_clear_match(self, hits: List[Dict[str, Any]]) -> bool:
+        """Whether the best find-similar-tasks hit is close enough, and far enough ahead, to act on"""
+        best = hits[0].get("similarity", 0.0)
+        runner_up = hits[1].get("similarity", 0.0) if len(hits) > 1 else 0.0
+        return best >= MIN_SIMILARITY and best - runner_up >= MIN_SIMILARITY_MARGIN
+
+    def _extract_task_reference(self, query: str) -> str:
+        """Strip the command words from a 'mark ... done' query, leaving the task description"""
+        filler = {
+            "mark",
+            "as",
+            "complete",
+            "completed",
+            "done",
+            "finished",
+            "the",
+            "task",
+            "one",
+            "please",
+            "it",
+            "first",
+        }
+        words = [w for w in query.strip(" .!?").split() if w.lower() not in filler]
+        return " ".join(words)
+
+    async def _search_tasks(self, query_text: str) -> str:
+        """Run search-tasks and list the matches"""
+        result = await self.session.call_tool("search-tasks", {"input": {"query": query_text}})
+        tasks = tool_result_data(result).get("tasks", [])
+        if not tasks:
+            return f"🔎 No tasks match '{query_text}'."
+        task_list = "\n".join([f"• {task['title']} ({task['status']})" for task in tasks])
+        return f"🔎 Matching tasks:\n{task_list}"
+
+    def _extract_search_query(self, query: str) -> str:
+        """Extract search words from query (text after 'find/search tasks')"""
+        query_lower = query.lower()
+        for phrase in ["find tasks", "find task", "search tasks", "search task"]:
+            if phrase in query_lower:
+                text = query[query_lower.find(phrase) + len(phrase) :].strip()
+                for prefix in ["about ", "for ", "with ", "matching ", ":"]:
+                    if text.startswith(prefix):
+                        text = text[len(prefix) :].strip()
+                return text or query
+        return query
+
     async def chat_loop(self):
         """Run interactive chat loop"""
         print(f"\n🚀 {self.client_name} Started!")
@@ -257,6 +333,7 @@ Always be helpful and provide clear explanations of what you're doing."""
         print("📝 Examples:")
         print("  - 'Add a new task to review quarterly reports'")
         print("  - 'Show me all my tasks'")
+        print("  - 'Find tasks about quarterly reports'")
         print("  - 'What's my next task?'")
         print("  - 'Mark task as completed'")
 
@@ -5,133 +5,436 @@ Exposes task management capabilities as tools that LM Studio can call
 """
 
 import asyncio
+import hashlib
 import json
 import sys
-from contextlib import AsyncExitStack
-from typing import Any, Dict, List, Optional
+import time
+from contextlib import AsyncExitStack, suppress
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
-from mcp import ClientSession, StdioServerParameters
+from mcp import ClientSession, McpError, StdioServerParameters, types
+from mcp.client.sse import sse_client
 from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
 
+from metrics import REGISTRY
+
+
+def find_venv_python(server: str) -> Optional[str]:
+    """Find the interpreter of the nearest .venv above a server script"""
+    for directory in Path(server).resolve().parents:
+        for candidate in (directory / ".venv" / "bin" / "python", directory / ".venv" / "Scripts" / "python.exe"):
+            if candidate.exists():
+                return str(candidate)
+    return None
+
+
+async def open_transport(exit_stack: AsyncExitStack, server: str, direct: bool = False):
+    """Open an MCP transport for a server script path or URL
+
+    ``http(s)://.../sse`` URLs use SSE, other URLs streamable HTTP (both
+    share one long-running server); anything else is launched over stdio.
+    With ``direct`` a script is started with its project's venv interpreter
+    instead of ``uv run``, skipping environment resolution on every launch.
+    """
+    if server.startswith(("http://", "https://")):
+        if server.rstrip("/").endswith("/sse"):
+            return await exit_stack.enter_async_context(sse_client(server))
+        read, write, _ = await exit_stack.enter_async_context(streamablehttp_client(server))
+        return read, write
+
+    python = find_venv_python(server) if direct else None
+    server_params = StdioServerParameters(
+        command=python or "uv",
+        args=[server] if python else ["run", server],
+        env=None,
+    )
+    return await exit_stack.enter_async_context(stdio_client(server_params))
+
+
+def result_text(result: types.CallToolResult) -> str:
+    """Join the text items of a tool result"""
+    return "\n".join(item.text if hasattr(item, "text") else str(item) for item in result.content)
+
+
+def tool_result_data(result: types.CallToolResult) -> Any:
+    """Get a tool result as data, parsed exactly once
+
+    Uses the result's ``structuredContent`` when the server sends it; older
+    servers only send JSON text, which is decoded here instead.
+    """
+    if result.structuredContent is not None:
+        return result.structuredContent
+    text = result_text(result)
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+class PooledSession:
+    """One MCP session in the TaskManagerTools pool
+
+    The session lives inside a dedicated task so its transport is opened and
+    closed by the same task, whichever caller triggers a reconnect.
+    """
+
+    def __init__(self, server_path: str, index: int, message_handler=None, direct: bool = False):
+        self.server_path = server_path
+        self.index = index
+        self.message_handler = message_handler
+        self.direct = direct
+        self.session: Optional[ClientSession] = None
+        self.in_flight = 0
+        self.healthy = False
+        self._closing = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Open the transport and initialize the session"""
+        ready = asyncio.get_running_loop().create_future()
+        self._closing = asyncio.Event()
+        self._runner = asyncio.create_task(self._run(ready))
+        await ready
+
+    async def _run(self, ready: asyncio.Future):
+        try:
+            async with AsyncExitStack() as stack:
+                read, write = await open_transport(stack, self.server_path, direct=self.direct)
+                self.session = await stack.enter_async_context(
+                    ClientSession(read, write, message_handler=self.message_handler),
+                )
+                await self.session.initialize()
+                self.healthy = True
+                ready.set_result(None)
+                await self._closing.wait()
+        except Exception as e:  # noqa: BLE001 - handed to start() through ready
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            self.healthy = False
+            self.session = None
+
+    async def close(self):
+        """Close the session and its transport"""
+        self.healthy = False
+        self._closing.set()
+        if self._runner:
+            with suppress(Exception, asyncio.CancelledError):
+                await self._runner
+            self._runner = None
+
+    async def reconnect(self):
+        """Replace a dead session with a fresh one"""
+        await self.close()
+        await self.start()
 
-class TaskManagerTools:
-    """Exposes task management capabilities as LM Studio tools"""
 
-    def __init__(self, server_path: str):
+class TaskManagerTools:
+    """Exposes task management capabilities as LM Studio tools
+
+    Calls are spread over a pool of ``pool_size`` MCP sessions, each to the
+    least busy healthy session. Idle sessions are pinged every
+    ``health_check_interval`` seconds and dead ones are reconnected.
+
+    With ``fast_start`` the server script runs on its venv interpreter,
+    ``start_background()`` connects without blocking the caller, and tool
+    definitions are served from an on-disk cache until the server is ready.
+    """
+
+    def __init__(
+        self,
+        server_path: str,
+        pool_size: int = 1,
+        health_check_interval: float = 30.0,
+        fast_start: bool = False,
+        tool_cache_path: Optional[str] = None,
+    ):
+        if pool_size > 1 and not server_path.startswith(("http://", "https://")):
+            # Every stdio session is its own server process with its own tasks.
+            print(f"⚠️ pool_size={pool_size} needs a server URL; over stdio one session is used instead")
+            pool_size = 1
         self.server_path = server_path
+        self.pool_size = max(1, pool_size)
+        self.health_check_interval = health_check_interval
+        self.fast_start = fast_start
+        if tool_cache_path is None:
+            key = hashlib.sha256(server_path.encode()).hexdigest()[:16]
+            tool_cache_path = Path.home() / ".cache" / "task-manager-client" / f"tools-{key}.json"
+        self.tool_cache_path = Path(tool_cache_path)
+        self._connect_task: Optional[asyncio.Task] = None
+        self.pool: List[PooledSession] = []
         self.session: Optional[ClientSession] = None
-        self.exit_stack = AsyncExitStack()
         self.available_tools = []
+        # Converted tool definitions plus their pre-serialised JSON and ETag,
+        # rebuilt only after the server reports tools/list_changed.
+        self._tool_defs: Optional[List[Dict[str, Any]]] = None
+        self._tool_defs_json = b""
+        self._tool_defs_etag = ""
+        self._tools_stale = False
+        self._health_task: Optional[asyncio.Task] = None
+        self._reconnecting: Dict[int, asyncio.Task] = {}
+        # Tools the server marks read-only, the only ones safe to send twice.
+        self._retryable: set[str] = set()
 
     async def connect_to_server(self):
         """Connect to the MCP task manager server"""
+        # A retry after a failed attempt must not leave the old sessions' server processes running.
+        await self._close_pool()
         try:
-            server_params = StdioServerParameters(
-                command="uv",
-                args=["run", self.server_path],
-                env=None,
-            )
-
-            stdio_transport = await self.exit_stack.enter_async_context(
-                stdio_client(server_params)
-            )
-
-            stdio, write = stdio_transport
-            self.session = await self.exit_stack.enter_async_context(
-                ClientSession(stdio, write)
-            )
-
-            await self.session.initialize()
-
-            # Get available tools
-            list_tools = await self.session.list_tools()
-            self.available_tools = list_tools.tools
-
-            print(f"✅ Connected to task manager server")
+            self.pool = [
+                PooledSession(self.server_path, i, message_handler=self._handle_message, direct=self.fast_start)
+                for i in range(self.pool_size)
+            ]
+            results = await asyncio.gather(*(p.start() for p in self.pool), return_exceptions=True)
+            errors = [r for r in results if isinstance(r, Exception)]
+            if len(errors) == len(self.pool):
+                raise errors[0]  # noqa: TRY301 - reported and cleaned up below
+
+            # Get available tools; only then is the client ready for calls
+            await self._refresh_tools()
+            self.session = self._least_busy().session
+
+            if self.health_check_interval and not self._health_task:
+                self._health_task = asyncio.create_task(self._health_check_loop())
+
+            print(f"✅ Connected to task manager server ({len(self.pool) - len(errors)}/{len(self.pool)} sessions)")
             print(f"📋 Available tools: {[tool.name for tool in self.available_tools]}")
 
             return True
 
         except Exception as e:
             print(f"❌ Failed to connect to server: {e}")
+            await self._close_pool()
             return False
 
+    async def _close_pool(self):
+        self.session = None
+        for task in self._reconnecting.values():
+            task.cancel()
+        self._reconnecting.clear()
+        pool, self.pool = self.pool, []
+        await asyncio.gather(*(p.close() for p in pool), return_exceptions=True)
+
+    def start_background(self) -> asyncio.Task:
+        """Start connecting without waiting; tool calls wait until ready"""
+        if self.fast_start:
+            self._load_tool_cache()
+        if self._connect_task is None:
+            self._connect_task = asyncio.create_task(self.connect_to_server())
+        return self._connect_task
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the background connection started by start_background()"""
+        if self.session:
+            return True
+        if self._connect_task is None or (self._connect_task.done() and not self.session):
+            # Never started, or the background attempt failed: try again now.
+            self._connect_task = asyncio.create_task(self.connect_to_server())
+        return await asyncio.wait_for(asyncio.shield(self._connect_task), timeout)
+
+    def _load_tool_cache(self):
+        """Warm-start the tool catalogue from the last session's definitions"""
+        try:
+            body = self.tool_cache_path.read_bytes()
+            self._tool_defs = json.loads(body)
+        except (OSError, ValueError):
+            return
+        self._tool_defs_json = body
+        self._tool_defs_etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        # Served only until connected, then refreshed from the live server.
+        self._tools_stale = True
+
+    def _save_tool_cache(self):
+        try:
+            self.tool_cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self.tool_cache_path.write_bytes(self._tool_defs_json)
+        except OSError as e:
+            print(f"⚠️ Could not write tool cache {self.tool_cache_path}: {e}")
+
+    def _least_busy(self) -> Optional[PooledSession]:
+        healthy = [p for p in self.pool if p.healthy]
+        return min(healthy, key=lambda p: p.in_flight) if healthy else None
+
+    def _schedule_reconnect(self, pooled: PooledSession) -> asyncio.Task:
+        task = self._reconnecting.get(pooled.index)
+        if task is None or task.done():
+            task = asyncio.create_task(pooled.reconnect())
+            self._reconnecting[pooled.index] = task
+        return task
+
+    async def _acquire(self) -> PooledSession:
+        pooled = self._least_busy()
+        if pooled is None:
+            # Everything is down: wait for the reconnects instead of failing fast.
+            await asyncio.gather(*(self._schedule_reconnect(p) for p in self.pool), return_exceptions=True)
+            pooled = self._least_busy()
+            if pooled is None:
+                msg = "No healthy MCP sessions"
+                raise ConnectionError(msg)
+        return pooled
+
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            for pooled in self.pool:
+                if not pooled.healthy:
+                    self._schedule_reconnect(pooled)
+                elif pooled.in_flight == 0:
+                    try:
+                        await asyncio.wait_for(pooled.session.send_ping(), timeout=5)
+                    except Exception:  # noqa: BLE001 - any failed ping marks the session down
+                        pooled.healthy = False
+                        self._schedule_reconnect(pooled)
+
+    async def _call_tool(self, tool_name: str, arguments: Dict[str, Any]):
+        # A write may have reached the server before the transport failed, so
+        # only read-only tools are retried; a second add-task could duplicate.
+        attempts = 2 if tool_name in self._retryable else 1
+        for attempt in range(attempts):
+            pooled = await self._acquire()
+            pooled.in_flight += 1
+            try:
+                return await pooled.session.call_tool(tool_name, arguments)
+            except McpError:
+                # The server answered with an error; the session itself is fine.
+                raise
+            except Exception:
+                # Transport failure: retire the session and retry once elsewhere.
+                pooled.healthy = False
+                self._schedule_reconnect(pooled)
+                if attempt == attempts - 1:
+                    raise
+            finally:
+                pooled.in_flight -= 1
+        return None
+
+    async def _handle_message(self, message):
+        """Invalidate the tool catalogue when the server's tool list changes"""
+        if isinstance(message, types.ServerNotification) and isinstance(
+            message.root,
+            types.ToolListChangedNotification,
+        ):
+            # Only flag it here: this runs inside the session's receive loop,
+            # which has to stay free to deliver the list_tools response.
+            self._tools_stale = True
+
+    async def _refresh_tools(self):
+        """Fetch the tool list and rebuild the cached definitions"""
+        pooled = await self._acquire()
+        list_tools = await pooled.session.list_tools()
+        self.available_tools = list_tools.tools
+        self._retryable = {
+            tool.name for tool in self.available_tools if tool.annotations and tool.annotations.readOnlyHint
+        }
+        self._tools_stale = False
+        self._tool_defs = [self._convert_tool(tool) for tool in self.available_tools]
+        self._tool_defs_json = json.dumps(self._tool_defs, separators=(",", ":")).encode()
+        self._tool_defs_etag = f'"{hashlib.sha256(self._tool_defs_json).hexdigest()[:32]}"'
+        if self.fast_start:
+            self._save_tool_cache()
+
+    @staticmethod
+    def _convert_tool(tool) -> Dict[str, Any]:
+        """Convert an MCP tool schema to LM Studio tool format"""
+        tool_def = {
+            "name": tool.name,
+            "description": tool.description,
+            "parameters": {
+                "type": "object",
+                "properties": {},
+                "required": [],
+            },
+        }
+
+        # Convert input schema if available
+        if hasattr(tool, "inputSchema") and tool.inputSchema:
+            schema = tool.inputSchema
+            if isinstance(schema, dict):
+                if "properties" in schema:
+                    tool_def["parameters"]["properties"] = schema["properties"]
+                if "required" in schema:
+                    tool_def["parameters"]["required"] = schema["required"]
+
+        return tool_def
+
     async def get_tool_definitions(self) -> List[Dict[str, Any]]:
-        """Get tool definitions in LM Studio format"""
+        """Get tool definitions in LM Studio format (cached per session)"""
         if not self.session:
-            await self.connect_to_server()
-
-        tools = []
-
-        for tool in self.available_tools:
-            # Convert MCP tool schema to LM Studio tool format
-            tool_def = {
-                "name": tool.name,
-                "description": tool.description,
-                "parameters": {
-                    "type": "object",
-                    "properties": {},
-                    "required": []
-                }
-            }
+            if self._tool_defs is not None and self._connect_task and not self._connect_task.done():
+                # Still starting up: answer from the warm-start cache.
+                return self._tool_defs
+            await self.wait_ready()
 
-            # Convert input schema if available
-            if hasattr(tool, 'inputSchema') and tool.inputSchema:
-                schema = tool.inputSchema
-                if isinstance(schema, dict):
-                    if "properties" in schema:
-                        tool_def["parameters"]["properties"] = schema["properties"]
-                    if "required" in schema:
-                        tool_def["parameters"]["required"] = schema["required"]
+        if self._tool_defs is None or self._tools_stale:
+            await self._refresh_tools()
 
-            tools.append(tool_def)
+        return self._tool_defs
 
-        return tools
+    async def get_tool_catalogue(self) -> Tuple[bytes, str]:
+        """Get the serialised tool definitions and their ETag"""
+        await self.get_tool_definitions()
+        return self._tool_defs_json, self._tool_defs_etag
 
     async def execute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute a tool and return the result"""
+        """Execute a tool and return the result, recording its latency and outcome"""
+        start = time.perf_counter()
+        outcome = await self._execute_tool(tool_name, arguments)
+        REGISTRY.observe(
+            "task_manager_tool_call", time.perf_counter() - start, error=not outcome["success"], tool=tool_name
+        )
+        return outcome
+
+    async def _execute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
         if not self.session:
-            await self.connect_to_server()
+            await self.wait_ready()
 
         try:
-            # Execute the tool via MCP
-            result = await self.session.call_tool(tool_name, arguments)
-
-            # Format response for LM Studio
-            if result.content:
-                content = []
-                for item in result.content:
-                    if hasattr(item, 'text'):
-                        content.append(item.text)
-                    else:
-                        content.append(str(item))
+            # Execute the tool via MCP on the least busy pooled session
+            result = await self._call_tool(tool_name, arguments)
+
+            if result.isError:
+                return {
+                    "success": False,
+                    "error": result_text(result) or "Tool execution failed",
+                }
 
+            # Format response for LM Studio: structured data when available
+            if result.structuredContent is not None or result.content:
                 return {
                     "success": True,
-                    "result": "\n".join(content)
+                    "result": tool_result_data(result),
                 }
             else:
                 return {
                     "success": True,
-                    "result": "Tool executed successfully"
+                    "result": "Tool executed successfully",
                 }
 
         except Exception as e:
             return {
                 "success": False,
-                "error": str(e)
+                "error": str(e),
             }
 
     async def cleanup(self):
         """Clean up connections"""
-        await self.exit_stack.aclose()
+        if self._connect_task and not self._connect_task.done():
+            self._connect_task.cancel()
+        if self._health_task:
+            self._health_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._health_task
+            self._health_task = None
+        await self._close_pool()
 
 
 # Example usage and test functions
 async def test_tools():
     """Test the tools integration"""
     if len(sys.argv) < 2:
-        print("Usage: python lm_studio_tools.py <server_path>")
+        print("Usage: python lm_studio_tools.py <server_path_or_url>")
         return
 
     server_path = sys.argv[1]
@@ -0,0 +1,168 @@
+"""
+Request Metrics for the Task Manager Bridge
+Call counts, error counts and latency histograms, exported in Prometheus
+text format at /metrics by the FastAPI apps
+"""
+
+import sys
+import time
+from http import HTTPStatus
+from typing import Dict, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Sub-buckets per power of two: latencies are kept to within 1/32 (~3%)
+SUB_BUCKET_BITS = 5
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def max_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process, or None where unavailable"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class Histogram:
+    """HDR-style log-linear histogram of latencies, counted in microseconds
+
+    Values below 64 µs get exact buckets; above that every power of two is
+    split into 32 equal buckets, so memory grows with the value range, not
+    with the number of samples.
+    """
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def _index(micros: int) -> int:
+        shift = max(0, micros.bit_length() - SUB_BUCKET_BITS - 1)
+        return (shift << SUB_BUCKET_BITS) + (micros >> shift)
+
+    @staticmethod
+    def _upper(index: int) -> int:
+        shift = max(0, (index >> SUB_BUCKET_BITS) - 1)
+        return ((index - (shift << SUB_BUCKET_BITS) + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        index = self._index(max(0, int(seconds * 1_000_000)))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Latency in seconds at quantile ``q`` (upper edge of its bucket)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._upper(index) / 1_000_000, self.max)
+        return self.max
+
+
+class Series:
+    """Errors and latency (which also counts calls) for one metric and label set"""
+
+    def __init__(self):
+        self.errors = 0
+        self.latency = Histogram()
+
+
+class Metrics:
+    """Registry of timed operations, keyed by metric name and labels"""
+
+    def __init__(self):
+        self.series: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Series] = {}
+        self.help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        self.help[name] = help_text
+
+    def observe(self, name: str, seconds: float, error: bool = False, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = Series()
+        series.errors += error
+        series.latency.record(seconds)
+
+    def render(self) -> str:
+        """All series in Prometheus text exposition format"""
+        lines = []
+        for name in sorted({name for name, _ in self.series}):
+            family = sorted((labels, s) for (n, labels), s in self.series.items() if n == name)
+            lines.append(f"# HELP {name}_seconds {self.help.get(name, name)}")
+            lines.append(f"# TYPE {name}_seconds summary")
+            for labels, series in family:
+                lines.extend(
+                    f"{name}_seconds{_labels(labels, quantile=q)} {series.latency.quantile(q):.6f}" for q in QUANTILES
+                )
+                lines.append(f"{name}_seconds_sum{_labels(labels)} {series.latency.sum:.6f}")
+                lines.append(f"{name}_seconds_count{_labels(labels)} {series.latency.count}")
+            lines.append(f"# TYPE {name}_errors_total counter")
+            for labels, series in family:
+                lines.append(f"{name}_errors_total{_labels(labels)} {series.errors}")
+        rss = max_rss_bytes()
+        if rss is not None:
+            lines.append("# HELP process_max_resident_memory_bytes Peak resident set size of this process")
+            lines.append("# TYPE process_max_resident_memory_bytes gauge")
+            lines.append(f"process_max_resident_memory_bytes {rss}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...], **extra: object) -> str:
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in (*labels, *extra.items()))
+    return f"{{{body}}}" if body else ""
+
+
+# Shared by everything in one process: TaskManagerTools and the app serving it
+REGISTRY = Metrics()
+REGISTRY.describe("task_manager_tool_call", "MCP tool calls from this process, including the hop to the server")
+REGISTRY.describe("task_manager_http_request", "HTTP requests handled, until response headers are sent")
+
+
+def instrument_app(app: FastAPI, registry: Metrics = REGISTRY):
+    """Time every request to ``app`` and serve the registry at /metrics"""
+
+    @app.middleware("http")
+    async def record_request(request: Request, call_next):
+        start = time.perf_counter()
+        status = HTTPStatus.INTERNAL_SERVER_ERROR
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # Label by route template, not raw path, so task ids don't create new series
+            route = request.scope.get("route")
+            registry.observe(
+                "task_manager_http_request",
+                time.perf_counter() - start,
+                error=status >= HTTPStatus.INTERNAL_SERVER_ERROR,
+                method=request.method,
+                path=getattr(route, "path", "unmatched"),
+            )
+
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics"""
+        return registry.render()
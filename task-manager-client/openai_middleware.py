@@ -6,17 +6,21 @@ Sits between LM Studio and our MCP server, translating OpenAI API calls to MCP p
 
 import asyncio
 import json
+import os
 import sys
 import uuid
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
 from lm_studio_tools import TaskManagerTools
+from metrics import instrument_app
 
 
 # OpenAI API Models
@@ -66,7 +70,8 @@ task_manager: TaskManagerTools = None
 app = FastAPI(
     title="Task Manager OpenAI Middleware",
     description="OpenAI-compatible API that bridges LM Studio to Task Manager MCP Server",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 # Add CORS middleware
@@ -78,6 +83,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latency histograms for every endpoint, served at /metrics
+instrument_app(app)
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -90,12 +98,20 @@ async def startup_event():
         sys.exit(1)
 
     server_path = sys.argv[1]
-    task_manager = TaskManagerTools(server_path)
-
-    success = await task_manager.connect_to_server()
-    if not success:
-        print("❌ Failed to connect to task manager server")
-        sys.exit(1)
+    # Concurrent requests fan out over this many MCP sessions
+    pool_size = int(os.getenv("TASK_MANAGER_POOL_SIZE", "1"))
+    # Fast start: run the server on its venv interpreter, connect in the
+    # background and answer requests that don't need tools right away
+    fast_start = os.getenv("TASK_MANAGER_FAST_START", "false").lower() == "true"
+    task_manager = TaskManagerTools(server_path, pool_size=pool_size, fast_start=fast_start)
+
+    if fast_start:
+        task_manager.start_background()
+    else:
+        success = await task_manager.connect_to_server()
+        if not success:
+            print("❌ Failed to connect to task manager server")
+            sys.exit(1)
 
     print("🚀 Task Manager OpenAI Middleware started!")
     print("📋 Available at: http://localhost:1234")
@@ -118,7 +134,7 @@ async def list_models():
         "data": [
             ModelInfo(
                 id="task-manager",
-                created=int(datetime.now().timestamp()),
+                created=int(datetime.now(UTC).timestamp()),
                 owned_by="task-manager"
             ).dict()
         ]
@@ -145,8 +161,14 @@ async def chat_completions(request: ChatCompletionRequest):
             raise HTTPException(status_code=400, detail="No user message found")
 
         # Check if this looks like a task management request
-        task_keywords = ["task", "todo", "add", "create", "list", "show", "complete", "done", "update", "delete"]
-        needs_tools = any(keyword in user_message.lower() for keyword in task_keywords)
+        needs_tools = wants_tools(user_message)
+
+        if request.stream:
+            return StreamingResponse(
+                stream_chat_completion(request, user_message, bool(needs_tools and request.tools)),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
 
         if needs_tools and request.tools:
             # This is a tool calling request
@@ -159,120 +181,135 @@ async def chat_completions(request: ChatCompletionRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def handle_tool_request(request: ChatCompletionRequest, user_message: str):
-    """Handle requests that need tool calling"""
-    global task_manager
+TASK_KEYWORDS = ["task", "todo", "add", "create", "list", "show", "complete", "done", "update", "delete"]
+# Searches name what they look for, not "task": "find report" is one too.
+SEARCH_KEYWORDS = ["find", "search", "look for"]
 
-    # Analyze the user message to determine which tool to call
+
+def wants_tools(user_message: str) -> bool:
+    """Whether a message looks like a task management request"""
     message_lower = user_message.lower()
+    return any(word in message_lower for word in SEARCH_KEYWORDS + TASK_KEYWORDS)
 
-    tool_call = None
-    tool_result = None
+
+def plan_tool_call(user_message: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Pick the tool and arguments a user message asks for, if any"""
+    # Analyze the user message to determine which tool to call
+    message_lower = user_message.lower()
 
     if any(word in message_lower for word in ["add", "create", "new"]) and "task" in message_lower:
         # Extract task title and description from message
         title = extract_task_title(user_message)
         description = extract_task_description(user_message)
-
-        tool_call = ToolCall(
-            id=f"call_{uuid.uuid4().hex[:8]}",
-            function={
-                "name": "add-task",
-                "arguments": json.dumps({
-                    "input": {
-                        "title": title,
-                        "description": description
-                    }
-                })
-            }
-        )
-
-        # Execute the tool
-        tool_result = await task_manager.execute_tool("add-task", {
+        return "add-task", {
             "input": {
                 "title": title,
-                "description": description
-            }
-        })
-
-    elif any(word in message_lower for word in ["list", "show", "what"]) and "task" in message_lower:
-        tool_call = ToolCall(
-            id=f"call_{uuid.uuid4().hex[:8]}",
-            function={
-                "name": "get-tasks",
-                "arguments": "{}"
-            }
-        )
-
-        # Execute the tool
-        tool_result = await task_manager.execute_tool("get-tasks", {})
+                "description": description,
+            },
+        }
+
+    if any(word in message_lower for word in SEARCH_KEYWORDS):
+        return "search-tasks", {"input": {"query": extract_search_query(user_message)}}
+
+    if any(word in message_lower for word in ["list", "show", "what"]) and "task" in message_lower:
+        return "get-tasks", {}
+
+    return None
+
+
+def format_tool_result(tool_result: Dict[str, Any], tool_name: Optional[str] = None) -> str:
+    """Turn a tool result into the assistant's reply"""
+    if not tool_result["success"]:
+        return f"❌ Error: {tool_result.get('error', 'Unknown error')}"
+
+    # The result is already structured data; make it more readable
+    result_data = tool_result["result"]
+    try:
+        if "tasks" in result_data:
+            tasks = result_data["tasks"]
+            searched = tool_name == "search-tasks"
+            if not tasks:
+                return "No tasks match that search." if searched else "You don't have any tasks yet."
+            task_list = "\n".join([f"• {task['title']} ({task['status']})" for task in tasks])
+            heading = "Here are the matching tasks" if searched else "Here are your current tasks"
+            return f"{heading}:\n{task_list}"
+        if "task" in result_data:
+            task = result_data["task"]
+            return f"✅ Created task: '{task['title']}' (ID: {task['id']})"
+    except:
+        return str(result_data)
+    return "Task operation completed successfully."
+
+
+def regular_chat_content(user_message: str) -> str:
+    """Simple rule-based responses for task management"""
+    message_lower = user_message.lower()
+
+    if "task" in message_lower:
+        if any(word in message_lower for word in ["add", "create", "new"]):
+            return "I can help you add tasks! What task would you like to create?"
+        if any(word in message_lower for word in ["list", "show", "what"]):
+            return "I can show you your tasks! Let me check what you have..."
+        return "I can help you manage your tasks. You can ask me to add new tasks or show your current tasks."
+    return (
+        "I'm a task management assistant. I can help you add, list, and manage your tasks. What would you like to do?"
+    )
+
+
+async def handle_tool_request(request: ChatCompletionRequest, user_message: str):
+    """Handle requests that need tool calling"""
+    global task_manager
+
+    plan = plan_tool_call(user_message)
+    if plan is None:
+        # Fallback to regular response
+        return await handle_regular_chat(request, user_message)
+
+    tool_name, arguments = plan
+    tool_call = ToolCall(
+        id=f"call_{uuid.uuid4().hex[:8]}",
+        function={
+            "name": tool_name,
+            "arguments": json.dumps(arguments) if arguments else "{}",
+        },
+    )
+
+    # Execute the tool
+    tool_result = await task_manager.execute_tool(tool_name, arguments)
 
     # Generate response
-    if tool_call and tool_result:
-        if tool_result["success"]:
-            # Parse the JSON result to make it more readable
-            try:
-                result_data = json.loads(tool_result["result"])
-                if "tasks" in result_data:
-                    tasks = result_data["tasks"]
-                    if tasks:
-                        task_list = "\n".join([f"• {task['title']} ({task['status']})" for task in tasks])
-                        response_content = f"Here are your current tasks:\n{task_list}"
-                    else:
-                        response_content = "You don't have any tasks yet."
-                elif "task" in result_data:
-                    task = result_data["task"]
-                    response_content = f"✅ Created task: '{task['title']}' (ID: {task['id']})"
-                else:
-                    response_content = "Task operation completed successfully."
-            except:
-                response_content = tool_result["result"]
-        else:
-            response_content = f"❌ Error: {tool_result.get('error', 'Unknown error')}"
+    response_content = format_tool_result(tool_result, tool_name)
 
-        return ChatCompletionResponse(
-            id=f"chatcmpl-{uuid.uuid4().hex[:8]}",
-            created=int(datetime.now().timestamp()),
-            model=request.model,
-            choices=[{
+    return ChatCompletionResponse(
+        id=f"chatcmpl-{uuid.uuid4().hex[:8]}",
+        created=int(datetime.now(UTC).timestamp()),
+        model=request.model,
+        choices=[
+            {
                 "index": 0,
                 "message": {
                     "role": "assistant",
                     "content": response_content,
-                    "tool_calls": [tool_call.dict()]
+                    "tool_calls": [tool_call.dict()],
                 },
-                "finish_reason": "tool_calls"
-            }],
-            usage={
-                "prompt_tokens": len(user_message.split()),
-                "completion_tokens": len(response_content.split()),
-                "total_tokens": len(user_message.split()) + len(response_content.split())
-            }
-        ).dict()
-
-    # Fallback to regular response
-    return await handle_regular_chat(request, user_message)
+                "finish_reason": "tool_calls",
+            },
+        ],
+        usage={
+            "prompt_tokens": len(user_message.split()),
+            "completion_tokens": len(response_content.split()),
+            "total_tokens": len(user_message.split()) + len(response_content.split())
+        }
+    ).dict()
 
 
 async def handle_regular_chat(request: ChatCompletionRequest, user_message: str):
     """Handle regular chat completions without tools"""
-
-    # Simple rule-based responses for task management
-    message_lower = user_message.lower()
-
-    if "task" in message_lower:
-        if any(word in message_lower for word in ["add", "create", "new"]):
-            response_content = "I can help you add tasks! What task would you like to create?"
-        elif any(word in message_lower for word in ["list", "show", "what"]):
-            response_content = "I can show you your tasks! Let me check what you have..."
-        else:
-            response_content = "I can help you manage your tasks. You can ask me to add new tasks or show your current tasks."
-    else:
-        response_content = "I'm a task management assistant. I can help you add, list, and manage your tasks. What would you like to do?"
+    response_content = regular_chat_content(user_message)
 
     return ChatCompletionResponse(
         id=f"chatcmpl-{uuid.uuid4().hex[:8]}",
-        created=int(datetime.now().timestamp()),
+        created=int(datetime.now(UTC).timestamp()),
         model=request.model,
         choices=[{
             "index": 0,
@@ -290,6 +327,66 @@ async def handle_regular_chat(request: ChatCompletionRequest, user_message: str)
     ).dict()
 
 
+async def stream_chat_completion(
+    request: ChatCompletionRequest,
+    user_message: str,
+    use_tools: bool,
+) -> AsyncIterator[str]:
+    """Stream a chat completion as OpenAI chat.completion.chunk server-sent events
+
+    The role and any tool call go out before the tool runs, so clients see the
+    first bytes immediately; the reply then follows line by line.
+    """
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:8]}"
+    created = int(datetime.now(UTC).timestamp())
+
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": request.model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+    yield chunk({"role": "assistant", "content": ""})
+
+    plan = plan_tool_call(user_message) if use_tools else None
+    try:
+        if plan:
+            tool_name, arguments = plan
+            yield chunk(
+                {
+                    "tool_calls": [
+                        {
+                            "index": 0,
+                            "id": f"call_{uuid.uuid4().hex[:8]}",
+                            "type": "function",
+                            "function": {"name": tool_name, "arguments": ""},
+                        },
+                    ],
+                },
+            )
+            yield chunk(
+                {"tool_calls": [{"index": 0, "function": {"arguments": json.dumps(arguments) if arguments else "{}"}}]},
+            )
+            response_content = format_tool_result(await task_manager.execute_tool(tool_name, arguments), tool_name)
+            finish_reason = "tool_calls"
+        else:
+            response_content = regular_chat_content(user_message)
+            finish_reason = "stop"
+    except Exception as e:  # noqa: BLE001 - headers are already sent, so report the failure in-band
+        response_content = f"❌ Error: {e}"
+        finish_reason = "stop"
+
+    for line in response_content.splitlines(keepends=True):
+        yield chunk({"content": line})
+
+    yield chunk({}, finish_reason)
+    yield "data: [DONE]\n\n"
+
+
 def extract_task_title(message: str) -> str:
     """Extract task title from user message"""
     # Simple extraction - look for quoted text or text after "add task"
@@ -317,6 +414,25 @@ def extract_task_title(message: str) -> str:
     return message.replace("add task", "").replace("create task", "").strip()
 
 
+def extract_search_query(message: str) -> str:
+    """Extract what to search for from user message"""
+    # Quoted text wins, otherwise whatever follows the search verb
+    if '"' in message:
+        return message.split('"')[1]
+
+    message_lower = message.lower()
+    for phrase in ["search for", "look for", "search", "find"]:
+        if phrase in message_lower:
+            idx = message_lower.find(phrase)
+            query = message[idx + len(phrase) :].strip(" ?.!")
+            for prefix in ["tasks about ", "tasks for ", "tasks ", "task ", "the ", "my "]:
+                if query.lower().startswith(prefix):
+                    query = query[len(prefix) :]
+            if query:
+                return query
+    return message
+
+
 def extract_task_description(message: str) -> str:
     """Extract task description from user message"""
     # For now, return empty description
@@ -333,14 +449,15 @@ async def root():
         "description": "OpenAI-compatible API for Task Manager MCP Server",
         "endpoints": {
             "models": "/v1/models",
-            "chat": "/v1/chat/completions"
-        }
+            "chat": "/v1/chat/completions",
+            "metrics": "/metrics",
+        },
     }
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python openai_middleware.py <server_path>")
+        print("Usage: python openai_middleware.py <server_path_or_url>")
         sys.exit(1)
 
     # Run on port 1235 (since LM Studio is using 1234)
@@ -0,0 +1,43 @@
+"""A real task manager server, started over streamable HTTP for a test module."""
+
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+SERVER_SCRIPT = Path(__file__).resolve().parents[2] / "task-manager-server" / "task-manager.py"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    pytest.fail(f"Nothing listening on port {port}")
+
+
+@pytest.fixture(scope="module")
+def task_server():
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, str(SERVER_SCRIPT), "--transport", "streamable-http", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port)
+        yield f"http://127.0.0.1:{port}/mcp"
+    finally:
+        proc.terminate()
+        proc.wait()
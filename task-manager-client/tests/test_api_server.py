@@ -0,0 +1,84 @@
+"""Round trips through api_server on a real uvicorn, in front of a real task manager server."""
+
+import json
+import sys
+import threading
+import time
+
+import httpx
+import pytest
+import uvicorn
+from conftest import free_port
+
+import api_server
+
+
+@pytest.fixture(scope="module")
+def api(task_server):
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(api_server.app, host="127.0.0.1", port=port, log_level="warning"))
+    with pytest.MonkeyPatch.context() as mp:
+        # The startup hook connects to the server named on the command line.
+        mp.setattr(sys, "argv", ["api_server.py", task_server])
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        deadline = time.monotonic() + 30
+        while not server.started:
+            assert thread.is_alive(), "api_server exited during startup"
+            assert time.monotonic() < deadline, "api_server did not start"
+            time.sleep(0.05)
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+        yield client
+    server.should_exit = True
+    thread.join()
+
+
+def progress_lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def chunked(data, size=7):
+    # A streamed body with chunk boundaries inside records.
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def test_import_ndjson_streams_progress_and_creates_tasks(api):
+    body = "".join(json.dumps({"title": f"ndjson import {i}"}) + "\n" for i in range(5)).encode()
+    response = api.post("/tasks/import", params={"batch_size": 2}, content=chunked(body))
+    assert response.status_code == 200
+    lines = progress_lines(response)
+    assert [line["created"] for line in lines] == [2, 4, 5, 5]
+    assert lines[-1] == {"done": True, "created": 5, "updated": 0, "failed": 0, "errors": []}
+    tasks = api.get("/tasks", params={"title": "ndjson import"}).json()["tasks"]
+    assert sorted(task["title"] for task in tasks) == [f"ndjson import {i}" for i in range(5)]
+
+
+def test_import_csv_reports_failed_rows_by_upload_line(api):
+    body = b'title,description\ncsv import 1,"spans\ntwo lines"\n,no title\ncsv import 2,\n'
+    response = api.post("/tasks/import", params={"format": "csv", "batch_size": 1}, content=chunked(body))
+    final = progress_lines(response)[-1]
+    assert (final["done"], final["created"], final["failed"]) == (True, 2, 1)
+    assert [error["line"] for error in final["errors"]] == [4]
+    tasks = api.get("/tasks", params={"title": "csv import"}).json()["tasks"]
+    assert {task["title"]: task["description"] for task in tasks} == {
+        "csv import 1": "spans\ntwo lines",
+        "csv import 2": "",
+    }
+
+
+def test_patch_with_stale_if_match_answers_412(api):
+    task = api.post("/tasks", params={"title": "etag task"}).json()["task"]
+    etag = api.get(f"/tasks/{task['id']}").headers["ETag"]
+    assert etag == f'"{task["version"]}"'
+
+    first = api.patch(f"/tasks/{task['id']}", json={"priority": 3}, headers={"If-Match": etag})
+    assert first.status_code == 200
+    assert first.headers["ETag"] == f'"{task["version"] + 1}"'
+
+    # A second writer still holding the old ETag is refused, and told the current version.
+    stale = api.patch(f"/tasks/{task['id']}", json={"title": "lost update"}, headers={"If-Match": etag})
+    assert stale.status_code == 412
+    assert stale.headers["ETag"] == first.headers["ETag"]
+    assert stale.json()["conflict"]["priority"] == 3
+    assert api.get(f"/tasks/{task['id']}").json()["task"]["title"] == "etag task"
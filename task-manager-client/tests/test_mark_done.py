@@ -0,0 +1,40 @@
+"""'mark ... done' queries in mock-mode TaskManagerClient, against a real task manager server."""
+
+import pytest
+
+from client import TaskManagerClient
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("MOCK_MODE", "true")
+    return TaskManagerClient()
+
+
+async def pending_titles(client):
+    result = await client.session.call_tool("get-tasks", {"input": {"status": "pending"}})
+    return {task["title"] for task in result.structuredContent["tasks"]}
+
+
+async def test_only_a_clear_match_is_marked_done(client, task_server):
+    # Connected in the test itself: the transport must close in the task that opened it.
+    await client.connect_to_server(task_server)
+    try:
+        await check_mark_done(client)
+    finally:
+        await client.cleanup()
+
+
+async def check_mark_done(client):
+    titles = {"Write the quarterly report", "Call the dentist", "Fix login bug in the API"}
+    for title in titles:
+        await client.session.call_tool("add-task", {"input": {"title": title}})
+
+    # Nothing is close to this one, so the client asks instead of closing the best of a bad lot.
+    reply = await client.process_query("mark walk the dog as done")
+    assert "Did you mean" in reply
+    assert await pending_titles(client) == titles
+
+    reply = await client.process_query("mark the quarterly report as done")
+    assert "Marked 'Write the quarterly report' as completed" in reply
+    assert await pending_titles(client) == titles - {"Write the quarterly report"}
@@ -0,0 +1,161 @@
+"""Cold storage for completed tasks.
+
+Tasks that have sat in a terminal status past the retention window leave
+TaskDB for a SegmentArchive. Each archival batch becomes one block: its
+tasks as NDJSON, sorted by completion time and gzip-compressed, appended to
+the current segment file. A block index of ``(first, last)`` completion
+times answers "completed between X and Y" by decompressing only the blocks
+whose range overlaps the query. Nothing is ever rewritten: segments and the
+index only grow, and a crash can at worst leave an unindexed block behind.
+"""
+
+import gzip
+import heapq
+import json
+import os
+from bisect import insort
+from datetime import datetime
+from pathlib import Path
+
+# A new segment file is started once the current one passes this size.
+SEGMENT_BYTES = 64 * 2**20
+
+
+def _completed_ts(task):
+    return datetime.fromisoformat(task["completed_at"]).timestamp()
+
+
+def _nth_completed(tasks, n):
+    # Completion time of the n-th earliest of tasks.
+    return heapq.nsmallest(n, map(_completed_ts, tasks))[-1]
+
+
+def archive_path(backend, path):
+    """Where the archive of a store lives by default: next to its storage, or None in memory."""
+    if backend == "sqlite":
+        return f"{path or 'tasks.db'}-archive"
+    if backend == "journal":
+        return str(Path(path or "tasks-journal") / "archive")
+    return None
+
+
+class SegmentArchive:
+    """Append-only, block-compressed archive of task dicts.
+
+    With no ``directory`` the compressed blocks are kept in memory, which
+    still shrinks archived tasks by an order of magnitude but loses them on
+    exit; use a directory whenever the store itself is persistent. Blocks
+    are fsynced before tasks are deleted from the store, unless ``fsync=False``.
+    """
+
+    def __init__(self, directory=None, fsync=True):
+        self.directory = None if directory is None else Path(directory)
+        self.fsync = fsync
+        # (first, last, count, segment, offset, length) per block, by first;
+        # first and last are the block's completion times as epoch seconds.
+        self.blocks = []
+        self._memory = []
+        self._segment = 0
+        if self.directory is not None:
+            # The directory is only created by the first append.
+            self.index_path = self.directory / "index.ndjson"
+            self._load_index()
+
+    def _load_index(self):
+        if not self.index_path.exists():
+            return
+        good = 0
+        with self.index_path.open("rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                block = json.loads(line)
+                good += len(line)
+                insort(self.blocks, tuple(block))
+                self._segment = max(self._segment, block[3])
+        # Drop an entry torn by a crash mid-append so the next one starts on a clean line.
+        if good < self.index_path.stat().st_size:
+            with self.index_path.open("r+b") as f:
+                f.truncate(good)
+
+    def _segment_path(self, segment):
+        return self.directory / f"segment-{segment:06d}.ndjson.gz"
+
+    def append(self, tasks):
+        """Archive task dicts, each with a ``completed_at``, as one block."""
+        tasks = sorted(tasks, key=_completed_ts)
+        if not tasks:
+            return
+        data = gzip.compress(
+            "".join(json.dumps(task, separators=(",", ":")) + "\n" for task in tasks).encode(), mtime=0
+        )
+        if self.directory is None:
+            segment, offset = 0, len(self._memory)
+            self._memory.append(data)
+        else:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self._segment_path(self._segment)
+            if path.exists() and path.stat().st_size >= SEGMENT_BYTES:
+                self._segment += 1
+                path = self._segment_path(self._segment)
+            segment = self._segment
+            with path.open("ab") as f:
+                offset = f.tell()
+                f.write(data)
+                self._sync(f)
+        block = (_completed_ts(tasks[0]), _completed_ts(tasks[-1]), len(tasks), segment, offset, len(data))
+        if self.directory is not None:
+            # Indexed only once the block itself is on disk.
+            with self.index_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(block) + "\n")
+                self._sync(f)
+        insort(self.blocks, block)
+
+    def _sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def _read(self, block):
+        _, _, _, segment, offset, length = block
+        if self.directory is None:
+            data = self._memory[offset]
+        else:
+            with self._segment_path(segment).open("rb") as f:
+                f.seek(offset)
+                data = f.read(length)
+        return [json.loads(line) for line in gzip.decompress(data).splitlines()]
+
+    def query(self, after=None, before=None, limit=None):
+        """Archived tasks completed in ``[after, before]`` (epoch seconds), oldest first.
+
+        With ``limit``, only the first ``limit`` of them: blocks are read in
+        order of their first completion time, and reading stops at a block
+        that starts after the ``limit`` earliest tasks found so far, so a
+        query without bounds does not decompress the whole archive.
+
+        A task archived twice (after a crash between archiving it and
+        deleting it from the store) is returned once, as last archived.
+        """
+        # id -> task, and kept by the copy from the block appended last (by segment and offset).
+        found, placed = {}, {}
+        for block in self.blocks:
+            first, last, _, segment, offset, _ = block
+            if before is not None and first > before:
+                break
+            if after is not None and last < after:
+                continue
+            # Every task in this block and the ones after it completed at or after ``first``.
+            if limit is not None and len(found) >= limit and _nth_completed(found.values(), limit) < first:
+                break
+            for task in self._read(block):
+                completed = _completed_ts(task)
+                if (after is not None and completed < after) or (before is not None and completed > before):
+                    continue
+                if placed.get(task["id"], (-1, -1)) < (segment, offset):
+                    found[task["id"]] = task
+                    placed[task["id"]] = (segment, offset)
+        return sorted(found.values(), key=_completed_ts)[:limit]
+
+    def count(self):
+        return sum(block[2] for block in self.blocks)
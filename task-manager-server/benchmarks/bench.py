@@ -0,0 +1,324 @@
+"""
+End-to-end benchmark for the task stack
+Drives the same workload through each layer and reports throughput,
+p50/p99 latency and peak RSS, saving JSON results to compare between commits
+
+Targets:
+  taskdb      TaskDB called in-process (or ShardedTaskDB with --shards N)
+  mcp-stdio   task-manager.py launched over stdio, called with an MCP session
+  api         a running api_server (--api-url), over HTTP
+  middleware  a running openai_middleware (--middleware-url), chat completions over HTTP
+
+    python benchmarks/bench.py --targets taskdb,mcp-stdio --tasks 5000 --concurrency 8
+    python benchmarks/bench.py --targets api --api-url http://localhost:8000
+    python benchmarks/bench.py --compare before.json after.json
+
+Phases run in order: add (--tasks calls), get (--tasks), next (--tasks) and
+list (--tasks / 10, first page of 50). Targets that can't do a phase skip it.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import re
+import subprocess
+import sys
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR))
+
+from metrics import max_rss_bytes  # noqa: E402
+from sharding import ShardedTaskDB  # noqa: E402
+from tasks_db import TaskDB  # noqa: E402
+
+TARGETS = ("taskdb", "mcp-stdio", "api", "middleware")
+LIST_PAGE = 50
+
+
+def percentile(latencies, q):
+    return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.0
+
+
+async def drive(op, count, concurrency):
+    """Run ``op(i)`` for i in range(count) across ``concurrency`` workers"""
+    latencies, results, errors = [], [], 0
+    indexes = iter(range(count))
+
+    async def worker():
+        nonlocal errors
+        for i in indexes:
+            start = time.perf_counter()
+            try:
+                result = await op(i)
+            except Exception:  # noqa: BLE001 - any failure counts as an error
+                result = None
+            latencies.append(time.perf_counter() - start)
+            if result is None:
+                errors += 1
+            else:
+                results.append(result)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    stats = {
+        "count": count,
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "throughput_per_s": round(count / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+    return stats, results
+
+
+class TaskDBTarget:
+    name = "taskdb"
+
+    def __init__(self, shards=1):
+        self.shards = shards
+
+    async def start(self):
+        self.db = ShardedTaskDB(self.shards) if self.shards > 1 else TaskDB()
+
+    async def add(self, i):
+        return self.db.add_task(f"Bench task {i}", "benchmark")["id"]
+
+    async def get(self, task_id):
+        return self.db.get_task(task_id) or None
+
+    async def next(self):
+        return self.db.next_task()
+
+    async def list(self):
+        return self.db.query_tasks(limit=LIST_PAGE)[0]
+
+    async def rss(self):
+        # The benchmark process itself, so this includes the harness
+        return {"process": max_rss_bytes()}
+
+    async def close(self):
+        self.db.close()
+
+
+class MCPStdioTarget:
+    name = "mcp-stdio"
+
+    async def start(self):
+        self.stack = AsyncExitStack()
+        params = StdioServerParameters(command=sys.executable, args=[str(SERVER_DIR / "task-manager.py")])
+        read, write = await self.stack.enter_async_context(stdio_client(params))
+        self.session = await self.stack.enter_async_context(ClientSession(read, write))
+        await self.session.initialize()
+
+    async def call(self, tool, arguments=None):
+        result = await self.session.call_tool(tool, {"input": arguments} if arguments else {})
+        return None if result.isError else result.structuredContent
+
+    async def add(self, i):
+        data = await self.call("add-task", {"title": f"Bench task {i}", "description": "benchmark"})
+        return data and data["task"]["id"]
+
+    async def get(self, task_id):
+        data = await self.call("get-task", {"task_id": task_id})
+        return data and data["task"]
+
+    async def next(self):
+        return await self.call("next-task")
+
+    async def list(self):
+        return await self.call("get-tasks", {"limit": LIST_PAGE})
+
+    async def rss(self):
+        stats = await self.call("server-stats")
+        return {"server": stats and stats.get("max_rss_bytes")}
+
+    async def close(self):
+        await self.stack.aclose()
+
+
+class HTTPTarget:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    async def start(self):
+        self.http = httpx.AsyncClient(base_url=self.base_url, timeout=60)
+
+    async def app_rss(self):
+        response = await self.http.get("/metrics")
+        match = re.search(r"^process_max_resident_memory_bytes (\d+)", response.text, re.MULTILINE)
+        return int(match.group(1)) if match else None
+
+    async def close(self):
+        await self.http.aclose()
+
+
+class APITarget(HTTPTarget):
+    name = "api"
+
+    async def execute(self, tool, arguments=None):
+        response = await self.http.post("/execute", json={"tool_name": tool, "arguments": arguments or {}})
+        body = response.json()
+        return body["result"] if body.get("success") else None
+
+    async def add(self, i):
+        response = await self.http.post("/tasks", params={"title": f"Bench task {i}", "description": "benchmark"})
+        return response.json()["task"]["id"] if response.is_success else None
+
+    async def get(self, task_id):
+        response = await self.http.get(f"/tasks/{task_id}")
+        return response.json() if response.is_success else None
+
+    async def next(self):
+        return await self.execute("next-task")
+
+    async def list(self):
+        response = await self.http.get("/tasks", params={"limit": LIST_PAGE})
+        return response.json() if response.is_success else None
+
+    async def rss(self):
+        stats = await self.execute("server-stats")
+        return {"app": await self.app_rss(), "server": stats and stats.get("max_rss_bytes")}
+
+
+class MiddlewareTarget(HTTPTarget):
+    name = "middleware"
+    get = next = None
+
+    async def chat(self, message):
+        response = await self.http.post(
+            "/v1/chat/completions",
+            json={"model": "task-manager", "messages": [{"role": "user", "content": message}]},
+        )
+        return response.json() if response.is_success else None
+
+    async def add(self, i):
+        return await self.chat(f'add task "Bench task {i}"')
+
+    async def list(self):
+        return await self.chat("show my tasks")
+
+    async def rss(self):
+        return {"app": await self.app_rss()}
+
+
+async def bench_target(target, tasks, concurrency):
+    await target.start()
+    try:
+        phases = {}
+        stats, ids = await drive(target.add, tasks, concurrency)
+        phases["add"] = stats
+        if target.get is not None and ids:
+            phases["get"], _ = await drive(lambda i: target.get(ids[i % len(ids)]), tasks, concurrency)
+        if target.next is not None:
+            phases["next"], _ = await drive(lambda _: target.next(), tasks, concurrency)
+        phases["list"], _ = await drive(lambda _: target.list(), max(1, tasks // 10), concurrency)
+        return {"phases": phases, "rss_bytes": await target.rss()}
+    finally:
+        await target.close()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],  # noqa: S607
+            cwd=SERVER_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    for target, result in results["targets"].items():
+        rss = ", ".join(f"{k} {v / 2**20:.1f} MiB" for k, v in result["rss_bytes"].items() if v)
+        print(f"🎯 {target}  (peak RSS: {rss or 'n/a'})")
+        for phase, s in result["phases"].items():
+            print(
+                f"  {phase:>5}: {s['throughput_per_s'] or 0:>10,.1f} ops/s  "
+                f"p50 {s['p50_ms']:>8.3f} ms  p99 {s['p99_ms']:>8.3f} ms  errors {s['errors']}"
+            )
+
+
+def compare(before_path, after_path):
+    before = json.loads(Path(before_path).read_text())
+    after = json.loads(Path(after_path).read_text())
+    print(f"📊 {before['meta'].get('commit')} → {after['meta'].get('commit')}")
+    for target, result in after["targets"].items():
+        old = before["targets"].get(target)
+        if old is None:
+            continue
+        print(f"🎯 {target}")
+        for phase, s in result["phases"].items():
+            o = old["phases"].get(phase)
+            if o is None:
+                continue
+            throughput = (s["throughput_per_s"] or 0) / (o["throughput_per_s"] or 1) - 1
+            p99 = s["p99_ms"] / (o["p99_ms"] or 1) - 1
+            print(f"  {phase:>5}: throughput {throughput:+7.1%}   p99 {p99:+7.1%}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default="taskdb,mcp-stdio", help=f"Comma-separated subset of {','.join(TARGETS)}")
+    parser.add_argument("--tasks", type=int, default=2000, help="Calls per phase (list runs a tenth as many)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("--shards", type=int, default=1, help="Worker processes for the taskdb target")
+    parser.add_argument("--api-url", default="http://localhost:8000")
+    parser.add_argument("--middleware-url", default="http://localhost:1234")
+    parser.add_argument("--output", help="Where to save JSON results (default: bench-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two saved result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    builders = {
+        "taskdb": lambda: TaskDBTarget(args.shards),
+        "mcp-stdio": MCPStdioTarget,
+        "api": lambda: APITarget(args.api_url),
+        "middleware": lambda: MiddlewareTarget(args.middleware_url),
+    }
+    names = [name.strip() for name in args.targets.split(",") if name.strip()]
+    unknown = set(names) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    commit = git_commit()
+    results = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tasks": args.tasks,
+            "concurrency": args.concurrency,
+            "shards": args.shards,
+        },
+        "targets": {},
+    }
+    for name in names:
+        print(f"⏱️  {name}: {args.tasks:,} tasks, concurrency {args.concurrency}")
+        results["targets"][name] = await bench_target(builders[name](), args.tasks, args.concurrency)
+
+    print_results(results)
+    output = Path(args.output or f"bench-{commit or 'local'}.json")
+    output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"💾 Saved {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""
+Memory benchmark for TaskDB
+Compares the per-task footprint of the previous layout (a dict per task
+keyed by its 36-char UUID string) with a full TaskDB: its task table
+(columns, text blobs and id index) plus the scheduler heap. A TaskDB whose
+search index has been built by a first search is shown for reference
+
+    python benchmarks/memory.py --tasks 1000000
+"""
+
+import argparse
+import gc
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from metrics import max_rss_bytes
+from tasks_db import TaskDB
+
+
+def build_dicts(n):
+    """The pre-record layout: {str id: dict} with ISO timestamp strings"""
+    tasks = {}
+    for i in range(n):
+        task_id = str(uuid.uuid4())
+        tasks[task_id] = {
+            "id": task_id,
+            "title": f"Task {i}",
+            "description": "",
+            "status": "pending",
+            "priority": 0,
+            "due_at": None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "lease_owner": None,
+            "lease_expires_at": None,
+        }
+    return tasks
+
+
+def build_taskdb(n, batch=1_000):
+    # Small batches, so the dicts add_tasks() returns barely move peak RSS.
+    db = TaskDB(change_log_size=0)
+    for start in range(0, n, batch):
+        db.add_tasks({"title": f"Task {i}"} for i in range(start, min(n, start + batch)))
+    return db
+
+
+def build_searched(n):
+    # A query matching one task, so the peak is the index and not the scores.
+    db = build_taskdb(n)
+    db.search_tasks("0")
+    return db
+
+
+def measure(layout, n):
+    """Build one layout in this process and print bytes/task and build time"""
+    gc.collect()
+    before = max_rss_bytes()
+    started = time.perf_counter()
+    store = LAYOUTS[layout](n)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    grown = max_rss_bytes() - before
+    print(f"{layout},{grown},{grown / n:.1f},{elapsed:.2f}")
+    del store
+
+
+LAYOUTS = {"dicts": build_dicts, "taskdb": build_taskdb, "searched": build_searched}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--layout", choices=list(LAYOUTS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.layout:
+        measure(args.layout, args.tasks)
+        return
+
+    # Each layout runs in a fresh interpreter so peak RSS is not shared
+    print(f"📏 Building {args.tasks:,} tasks per layout")
+    results = {}
+    for layout in LAYOUTS:
+        out = subprocess.run(  # noqa: S603 - this script again, under the same interpreter
+            [sys.executable, __file__, "--layout", layout, "--tasks", str(args.tasks)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+        _, total, per_task, seconds = out.split(",")
+        results[layout] = float(per_task)
+        print(f"  {layout:>8}: {int(total) / 2**20:8.1f} MiB  {float(per_task):7.1f} B/task  built in {seconds}s")
+    change = 1 - results["taskdb"] / results["dicts"]
+    print(f"📉 A full TaskDB uses {abs(change):.0%} {'less' if change >= 0 else 'more'} memory per task than dicts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Concurrency stress check for ThreadSafeTaskDB
+Hammers one store from many threads and checks that the outcome is
+linearizable, i.e. explained by the calls taking effect one at a time:
+
+  claims     every task is claimed by exactly one of many racing workers
+  change log versions reach listeners gapless and in order, and replaying
+             the log alone rebuilds the final state of every task
+  results    every state a write returned is one the log recorded for it
+  indexes    status buckets and the scheduler agree with the tasks
+
+Exits non-zero on the first violation. --unsafe runs the same load against a
+plain TaskDB to show what the lock prevents.
+
+    python benchmarks/stress.py --threads 16 --ops 5000
+"""
+
+import argparse
+import random
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tasks_db import PENDING, TaskDB, ThreadSafeTaskDB
+
+STATUSES = ("pending", "in_progress", "done")
+# Relative weights of the operations each writer thread picks from.
+WRITE_MIX = {"update": 30, "status": 20, "claim": 15, "renew": 10, "add": 5, "read": 20}
+
+
+def run_threads(count, target):
+    errors = []
+    start = threading.Barrier(count)
+
+    def guarded(index):
+        try:
+            start.wait()
+            target(index)
+        except Exception as e:  # noqa: BLE001 - a race in an unsafe store surfaces as any exception
+            errors.append(repr(e))
+
+    threads = [threading.Thread(target=guarded, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+def stress_claims(db_class, threads, tasks):
+    db = db_class()
+    db.add_tasks({"title": f"Task {i}"} for i in range(tasks))
+    claimed = [[] for _ in range(threads)]
+
+    def worker(index):
+        while task := db.claim_next(f"worker-{index}", ttl=3600):
+            claimed[index].append(task["id"])
+
+    errors = run_threads(threads, worker)
+    check(not errors, f"claims raised: {errors[:3]}")
+    ids = [task_id for ids in claimed for task_id in ids]
+    check(len(ids) == tasks, f"{len(ids)} claims for {tasks} tasks")
+    check(len(set(ids)) == tasks, f"{len(ids) - len(set(ids))} tasks claimed twice")
+    print(f"✅ claims: {tasks:,} tasks, each claimed once across {threads} workers")
+
+
+def stress_writes(db_class, threads, ops, seed):
+    db = db_class(change_log_size=None)
+    seen = []
+    db.add_listener(lambda change: seen.append(change["version"]))
+    ids = [task["id"] for task in db.add_tasks({"title": f"Task {i}"} for i in range(256))]
+    returned = [[] for _ in range(threads)]
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        out = returned[index]
+        for op in rng.choices(list(WRITE_MIX), weights=list(WRITE_MIX.values()), k=ops):
+            task_id = rng.choice(ids)
+            if op == "update":
+                out.append(db.update_task(task_id, priority=rng.randint(0, 9), title=f"T{rng.randint(0, 99)}"))
+            elif op == "status":
+                db.set_status(task_id, rng.choice(STATUSES))
+            elif op == "claim":
+                out.append(db.claim_next(f"worker-{index}", ttl=3600))
+            elif op == "renew":
+                out.append(db.renew_lease(task_id, f"worker-{index}", ttl=3600))
+            elif op == "add":
+                out.append(db.add_task(f"New {index}", priority=rng.randint(0, 9)))
+            else:
+                db.next_task()
+                db.get_task(task_id)
+
+    errors = run_threads(threads, worker)
+    check(not errors, f"writers raised: {errors[:3]}")
+
+    # Listeners run in commit order, so versions must arrive gapless and increasing.
+    check(seen == list(range(1, db.version + 1)), "change versions reached listeners out of order or with gaps")
+
+    # Replaying the log alone must rebuild the final state of every task.
+    changes, reset = db.changes_since(0, limit=db.version)
+    check(not reset and len(changes) == db.version, "change log incomplete")
+    replayed = {}
+    recorded = {}
+    for change in changes:
+        replayed[change["task"]["id"]] = change["task"]
+        recorded.setdefault(change["task"]["id"], []).append(change["task"])
+    final = {task["id"]: task for task in db.list_tasks()}
+    check(replayed == final, "replaying the change log does not reproduce the final state")
+
+    # Each state a write returned must be one the log recorded for that task.
+    results = [task for out in returned for task in out if task]
+    missing = [task for task in results if task not in recorded.get(task["id"], [])]
+    check(not missing, f"{len(missing)} returned states never appear in the change log")
+
+    # Indexes agree with the tasks.
+    counts = db.count_by_status()
+    for status in set(counts) | {task["status"] for task in final.values()}:
+        expected = sum(1 for task in final.values() if task["status"] == status)
+        check(counts.get(status, 0) == expected, f"count_by_status[{status}] is {counts.get(status)}, not {expected}")
+    pending = [task for task in final.values() if task["status"] == PENDING]
+    best = min(
+        pending,
+        key=lambda t: (-t["priority"], t["due_at"] is None, t["due_at"] or "", t["created_at"]),
+        default={},
+    )
+    check(db.next_task().get("priority") == best.get("priority"), "next_task disagrees with a scan of pending tasks")
+    print(f"✅ writes: {threads * ops:,} operations over {threads} threads, {db.version:,} changes replay exactly")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=3000, help="Operations per thread in the write phase")
+    parser.add_argument("--tasks", type=int, default=20000, help="Tasks raced for in the claim phase")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--unsafe", action="store_true", help="Use plain TaskDB to demonstrate the races")
+    args = parser.parse_args()
+
+    # Switch threads as often as possible to provoke interleavings.
+    sys.setswitchinterval(1e-6)
+    db_class = TaskDB if args.unsafe else ThreadSafeTaskDB
+    print(f"🔨 {db_class.__name__}: {args.threads} threads")
+    try:
+        stress_claims(db_class, args.threads, args.tasks)
+        stress_writes(db_class, args.threads, args.ops, args.seed)
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Per-tool call counts, error counts and latency histograms.
+
+Each tool call is timed as its ``tool`` stage: the tool body, that is the
+TaskDB operation and building the response. Argument validation and result
+serialization happen inside FastMCP, outside any hook it offers; a client's
+own timing of the call minus this stage is FastMCP's overhead.
+"""
+
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Sub-buckets per power of two: latencies are kept to within 1/32 (~3%).
+SUB_BUCKET_BITS = 5
+
+
+def max_rss_bytes():
+    """Peak resident set size of this process, or None where unavailable."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class Histogram:
+    """HDR-style log-linear histogram of latencies, counted in microseconds.
+
+    Values below 64 µs get exact buckets; above that every power of two is
+    split into 32 equal buckets, so memory grows with the value range rather
+    than the number of samples.
+    """
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def _index(micros):
+        shift = max(0, micros.bit_length() - SUB_BUCKET_BITS - 1)
+        return (shift << SUB_BUCKET_BITS) + (micros >> shift)
+
+    @staticmethod
+    def _upper(index):
+        shift = max(0, (index >> SUB_BUCKET_BITS) - 1)
+        return ((index - (shift << SUB_BUCKET_BITS) + 1) << shift) - 1
+
+    def record(self, seconds):
+        self.counts[self._index(max(0, int(seconds * 1_000_000)))] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Latency in seconds at quantile ``q`` (upper edge of its bucket)."""
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._upper(index) / 1_000_000, self.max)
+        return self.max
+
+    def summary(self):
+        ms = 1000
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum / self.count * ms, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * ms, 3),
+            "p90_ms": round(self.quantile(0.9) * ms, 3),
+            "p99_ms": round(self.quantile(0.99) * ms, 3),
+            "max_ms": round(self.max * ms, 3),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.latency = defaultdict(Histogram)
+        self.errors = defaultdict(int)
+
+    def observe(self, tool, stage, seconds, error=False):
+        self.latency[tool, stage].record(seconds)
+        if error:
+            self.errors[tool, stage] += 1
+
+    @contextmanager
+    def timer(self, tool, stage):
+        """Time the body as one call; an exception counts as an error."""
+        start = time.perf_counter()
+        error = True
+        try:
+            yield
+            error = False
+        finally:
+            self.observe(tool, stage, time.perf_counter() - start, error)
+
+    def snapshot(self):
+        """``{tool: {stage: {count, errors, mean/p50/p90/p99/max in ms}}}``."""
+        out = {}
+        for (tool, stage), histogram in sorted(self.latency.items()):
+            out.setdefault(tool, {})[stage] = {**histogram.summary(), "errors": self.errors[tool, stage]}
+        return out
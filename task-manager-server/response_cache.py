@@ -0,0 +1,50 @@
+"""Cache of read-tool responses invalidated by TaskDB writes.
+
+Polling clients tend to repeat the same reads while nothing changes. A
+response is stored under its tool name and arguments together with the
+TaskDB version it was built at; the first lookup after any write sees a new
+version and drops every entry.
+
+Lookups may come from several threads at once (the server calls a sharded
+store from threads); a response whose build overlapped a write is returned
+but not kept.
+"""
+
+import threading
+
+
+class ResponseCache:
+    def __init__(self, db, max_entries=4096):
+        self.db = db
+        self.max_entries = max_entries
+        self.version = None
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, tool, arguments, build):
+        """Return the cached response for ``tool`` and ``arguments`` (any
+        hashable, e.g. the input's JSON), calling ``build()`` on a miss."""
+        # Expiring leases is itself a write, so run it before comparing versions.
+        self.db.expire_leases()
+        version = self.db.version
+        key = (tool, arguments)
+        with self._lock:
+            if self.version != version:
+                self.entries.clear()
+                self.version = version
+            response = self.entries.get(key)
+            if response is not None:
+                self.hits += 1
+                return response
+            self.misses += 1
+        response = build()
+        with self._lock:
+            if self.version != version or self.db.version != version:
+                return response
+            if len(self.entries) >= self.max_entries:
+                # Oldest first: dicts keep insertion order.
+                del self.entries[next(iter(self.entries))]
+            self.entries[key] = response
+        return response
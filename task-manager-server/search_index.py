@@ -0,0 +1,93 @@
+"""Full-text index over task titles and descriptions.
+
+An inverted index kept in memory next to TaskDB and updated on every write,
+so searches never scan tasks. Results are ranked with BM25; title words
+count ``TITLE_WEIGHT`` times as much as description words.
+"""
+
+import heapq
+import math
+import re
+from collections import defaultdict
+from operator import itemgetter
+
+TOKEN = re.compile(r"\w+")
+TITLE_WEIGHT = 2
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+class SearchIndex:
+    # Standard BM25 parameters: term-frequency saturation and length normalization.
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        # term -> {task key: weighted term frequency}, or a bare (key, tf)
+        # pair while a single task has the term: most terms are that rare,
+        # and the pair is a fraction of the size of a dict.
+        self.postings = {}
+        # task key -> weighted document length
+        self.lengths = {}
+        self.total_length = 0
+
+    def _terms(self, title, description):
+        counts = {}
+        for term in tokenize(title):
+            counts[term] = counts.get(term, 0) + TITLE_WEIGHT
+        for term in tokenize(description):
+            counts[term] = counts.get(term, 0) + 1
+        return counts
+
+    def add(self, key, title, description):
+        counts = self._terms(title, description)
+        for term, tf in counts.items():
+            posting = self.postings.get(term)
+            if posting is None or (isinstance(posting, tuple) and posting[0] == key):
+                self.postings[term] = (key, tf)
+            elif isinstance(posting, tuple):
+                self.postings[term] = {posting[0]: posting[1], key: tf}
+            else:
+                posting[key] = tf
+        length = sum(counts.values())
+        self.lengths[key] = length
+        self.total_length += length
+
+    def remove(self, key, title, description):
+        """Drop a task indexed under this title and description."""
+        for term in self._terms(title, description):
+            posting = self.postings.get(term)
+            if isinstance(posting, tuple):
+                if posting[0] == key:
+                    del self.postings[term]
+            elif posting is not None:
+                posting.pop(key, None)
+                if len(posting) == 1:
+                    self.postings[term] = next(iter(posting.items()))
+        self.total_length -= self.lengths.pop(key, 0)
+
+    def search(self, query, limit=10, accept=None):
+        """Best ``limit`` ``(key, score)`` pairs for ``query``, best first.
+
+        Tasks match if they contain any query term. ``accept(key)``, if
+        given, filters candidates before ranking.
+        """
+        terms = set(tokenize(query))
+        n = len(self.lengths)
+        if not terms or not n:
+            return []
+        avg_length = self.total_length / n or 1
+        scores = defaultdict(float)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            entries = (posting,) if isinstance(posting, tuple) else posting.items()
+            idf = math.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+            for key, tf in entries:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[key] / avg_length)
+                scores[key] += idf * tf * (self.k1 + 1) / (tf + norm)
+        candidates = scores.items() if accept is None else ((k, s) for k, s in scores.items() if accept(k))
+        return heapq.nlargest(limit, candidates, key=itemgetter(1))
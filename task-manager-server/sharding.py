@@ -0,0 +1,462 @@
+"""A task store hash-partitioned by id across worker processes.
+
+ShardedTaskDB has TaskDB's interface, but each shard is a TaskDB (with its
+own storage engine) in a separate process, so indexing, search and storage
+writes for different shards run on different cores. Calls that name one task
+go to the shard owning its id; listings, next_task and the other whole-store
+reads go to every shard at once and the partial results are merged here.
+
+Workers are this module run as a script, speaking pickled
+``(op, args, kwargs)`` requests and ``(ok, result, changes, due)`` replies
+over their stdin/stdout. ``changes`` are the shard's writes during the call,
+which the front end re-records in its own change feed, so versions, listeners
+and changes_since() behave as they do for a single TaskDB. ``due`` is the
+shard's next_expiry(): every call expires the shard's leases first, and the
+front end only asks a shard to expire leases on its own once one is due.
+
+Replies come back in request order, so a shard can have many requests in
+flight; one thread per shard reads its replies and hands each to the caller
+waiting for it.
+"""
+
+import contextlib
+import heapq
+import os
+import pickle
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import Future
+from itertools import islice
+from pathlib import Path
+
+from archive import SegmentArchive, archive_path
+from storage import open_storage
+from tasks_db import ChangeFeed, TaskDB, VersionConflict, from_iso, to_key
+from vector_index import load_embedding
+
+# Marks an exhausted shard in a query_tasks() cursor.
+DONE = "x"
+
+
+def shard_path(backend, path, index):
+    """Storage location of shard ``index``: ``tasks.0.db`` or ``tasks-journal/shard-0``."""
+    if backend == "sqlite":
+        path = Path(path or "tasks.db")
+        return str(path.with_name(f"{path.stem}.{index}{path.suffix}"))
+    if backend == "journal":
+        return str(Path(path or "tasks-journal") / f"shard-{index}")
+    return path
+
+
+def serve(backend, path, archive_dir):
+    """Worker loop: answer requests from stdin until EOF or a None request."""
+    inbox, outbox = sys.stdin.buffer, sys.stdout.buffer
+    # Replies own stdout; anything else printed goes to the server's stderr.
+    sys.stdout = sys.stderr
+    spec = os.getenv("TASK_EMBEDDING")
+    db = TaskDB(
+        open_storage(backend, path or None),
+        change_log_size=0,
+        embedding=load_embedding(spec) if spec else None,
+        archive=SegmentArchive(archive_dir or None),
+        archive_after=float(os.getenv("TASK_ARCHIVE_AFTER", "0")) or None,
+    )
+    changes = []
+    db.add_listener(lambda change: changes.append((change["type"], change["task"])))
+    while True:
+        try:
+            request = pickle.load(inbox)  # noqa: S301 - from the front end that spawned us
+        except EOFError:
+            break
+        if request is None:
+            break
+        op, args, kwargs = request
+        try:
+            if op != "expire_leases":
+                db.expire_leases()
+            reply = (True, getattr(db, op)(*args, **kwargs))
+        except Exception as e:  # noqa: BLE001 - any error goes back to the caller, who re-raises it
+            reply = (False, e)
+        pickle.dump((*reply, changes, db.next_expiry()), outbox, pickle.HIGHEST_PROTOCOL)
+        outbox.flush()
+        changes.clear()
+    db.close()
+
+
+def _sched_key(task):
+    # TaskDB's scheduling order, from the string form of a task.
+    due = from_iso(task["due_at"])
+    return (-task["priority"], due is None, due or 0.0, from_iso(task["created_at"]) or 0.0)
+
+
+class _Worker:
+    """One shard's process and the replies it still owes, oldest first."""
+
+    def __init__(self, argv):
+        # argv runs this module under the server's own interpreter.
+        self.process = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE)  # noqa: S603
+        self.pending = deque()
+        self.send_lock = threading.Lock()
+        self.closed = False
+        # The shard's next_expiry(); 0.0 until its first reply says otherwise.
+        self.due = 0.0
+        self.reader = None
+
+
+class ShardedTaskDB(ChangeFeed):
+    """TaskDB spread over ``shards`` worker processes.
+
+    Tasks live on shard ``int(id) % shards`` for good, so a data set must
+    always be opened with the same shard count. Dependency edges never cross
+    shards: a new task gets an id on the shard of its dependencies, and
+    dependencies spread over several shards are rejected. Search scores are
+    computed per shard and merged as they are.
+
+    Unlike TaskDB it may be called from several threads at once, which is how
+    the server keeps its event loop free while shards work. Requests are
+    pipelined: any number can be in flight to a shard, and requests for
+    different shards are all sent before any reply is awaited, so a
+    scatter-gather costs one round trip, not one per shard. Reads run side by
+    side; writes take one lock, so a write that checks every shard before
+    changing any of them can't be overtaken in between.
+    """
+
+    def __init__(self, shards=2, backend="memory", path=None, change_log_size=100_000, archive_dir=None):
+        super().__init__(change_log_size)
+        # Held while recording a shard's changes and while reading the log.
+        self._feed_lock = threading.Lock()
+        self._writes = threading.Lock()
+        script = str(Path(__file__).resolve())
+        self.workers = []
+        for i in range(shards):
+            location = shard_path(backend, path, i)
+            archive = Path(archive_dir) / f"shard-{i}" if archive_dir else archive_path(backend, location)
+            worker = _Worker([sys.executable, script, backend, location or "", str(archive or "")])
+            worker.reader = threading.Thread(target=self._read_replies, args=(i, worker), daemon=True)
+            worker.reader.start()
+            self.workers.append(worker)
+
+    def _shard(self, key):
+        return int.from_bytes(key, "big") % len(self.workers)
+
+    def _read_replies(self, index, worker):
+        # Runs on the worker's reader thread until the worker exits.
+        while True:
+            try:
+                ok, result, changes, due = pickle.load(worker.process.stdout)  # noqa: S301 - from our own worker
+            except EOFError:
+                break
+            worker.due = due
+            with self._feed_lock:
+                for kind, task in changes:
+                    self._record(kind, task)
+            worker.pending.popleft().set_result((ok, result))
+        with worker.send_lock:
+            worker.closed = True
+        msg = f"Shard {index} exited (code {worker.process.wait()})"
+        while worker.pending:
+            worker.pending.popleft().set_exception(RuntimeError(msg))
+
+    def _send(self, index, op, args=(), kwargs=None):
+        """Queue a request to shard ``index``; returns a Future of its ``(ok, result)``."""
+        worker = self.workers[index]
+        future = Future()
+        with worker.send_lock:
+            if worker.closed:
+                msg = f"Shard {index} exited (code {worker.process.poll()})"
+                raise RuntimeError(msg)
+            worker.pending.append(future)
+            pickle.dump((op, args, kwargs or {}), worker.process.stdin, pickle.HIGHEST_PROTOCOL)
+            worker.process.stdin.flush()
+        return future
+
+    @staticmethod
+    def _result(future):
+        ok, result = future.result()
+        if not ok:
+            raise result
+        return result
+
+    def _call(self, index, op, *args, **kwargs):
+        return self._result(self._send(index, op, args, kwargs))
+
+    def _scatter(self, requests):
+        """Send ``{shard: (op, args, kwargs)}`` at once and gather ``{shard: result}``.
+
+        Waits for every reply before raising the first error, so no shard is
+        still working on a part when the caller moves on.
+        """
+        futures = {index: self._send(index, op, args, kwargs) for index, (op, args, kwargs) in requests.items()}
+        replies = {index: future.result() for index, future in futures.items()}
+        error = next((result for ok, result in replies.values() if not ok), None)
+        if error is not None:
+            raise error
+        return {index: result for index, (_, result) in replies.items()}
+
+    def _broadcast(self, op, *args, **kwargs):
+        results = self._scatter(dict.fromkeys(range(len(self.workers)), (op, args, kwargs)))
+        return [results[i] for i in range(len(self.workers))]
+
+    def _group(self, keys):
+        """``{shard: [positions in keys]}`` for the valid keys."""
+        groups = {}
+        for pos, key in enumerate(keys):
+            if key is not None:
+                groups.setdefault(self._shard(key), []).append(pos)
+        return groups
+
+    def changes_since(self, version, limit=1000):
+        with self._feed_lock:
+            return super().changes_since(version, limit)
+
+    def flush(self):
+        self._broadcast("flush")
+
+    def close(self):
+        # A worker closes its storage when its request stream ends. One that
+        # has died leaves a broken pipe, but its reader must still be joined.
+        for worker in self.workers:
+            with worker.send_lock:
+                if not worker.closed:
+                    with contextlib.suppress(OSError):
+                        pickle.dump(None, worker.process.stdin)
+                with contextlib.suppress(OSError):
+                    worker.process.stdin.close()
+        for worker in self.workers:
+            worker.reader.join()
+            worker.process.stdout.close()
+
+    def expire_leases(self):
+        """Expire leases on the shards with one due by now.
+
+        Every call routed to a shard expires its leases first, so this only
+        costs a round trip once a shard's reported next_expiry() has passed.
+        """
+        now = time.time()
+        due = {i: ("expire_leases", (), {}) for i, w in enumerate(self.workers) if w.due is not None and w.due <= now}
+        if not due:
+            return []
+        return [task for tasks in self._scatter(due).values() for task in tasks]
+
+    def list_tasks(self, status=None):
+        tasks = [task for part in self._broadcast("list_tasks", status) for task in part]
+        return sorted(tasks, key=lambda task: task["created_at"] or "")
+
+    def query_tasks(self, status=None, title=None, cursor=0, limit=None, fields=None):
+        """TaskDB.query_tasks() over all shards, merged in creation order.
+
+        ``next_cursor`` is a string holding each shard's position, e.g. ``"12.x.7"``.
+        """
+        if not cursor:
+            positions = [0] * len(self.workers)
+        else:
+            parts = str(cursor).split(".")
+            if len(parts) != len(self.workers) or not all(p == DONE or p.isdigit() for p in parts):
+                msg = f"Not a cursor from this store: {cursor!r}"
+                raise ValueError(msg)
+            positions = [None if p == DONE else int(p) for p in parts]
+        pages = self._scatter(
+            {
+                i: ("page_tasks", (status, title, pos, limit, fields), {})
+                for i, pos in enumerate(positions)
+                if pos is not None
+            }
+        )
+        streams = [[(created_at, i, seq, task) for seq, created_at, task in items] for i, (items, _) in pages.items()]
+        merged = heapq.merge(*streams)
+        out = list(islice(merged, limit))
+        taken = Counter(i for _, i, _, _ in out)
+        for i, (items, next_pos) in pages.items():
+            positions[i] = items[taken[i]][0] if taken[i] < len(items) else next_pos
+        if all(pos is None for pos in positions):
+            next_cursor = None
+        else:
+            next_cursor = ".".join(DONE if pos is None else str(pos) for pos in positions)
+        return [task for _, _, _, task in out], next_cursor
+
+    def search_tasks(self, query, status=None, limit=10):
+        hits = [task for part in self._broadcast("search_tasks", query, status, limit) for task in part]
+        return sorted(hits, key=lambda task: -task["score"])[:limit]
+
+    def find_similar(self, text, status=None, limit=5):
+        hits = [task for part in self._broadcast("find_similar", text, status, limit) for task in part]
+        return sorted(hits, key=lambda task: -task["similarity"])[:limit]
+
+    def archive_completed(self):
+        with self._writes:
+            return sum(self._broadcast("archive_completed"))
+
+    def completed_tasks(self, after=None, before=None, limit=100):
+        tasks = [task for part in self._broadcast("completed_tasks", after, before, limit) for task in part]
+        return heapq.nsmallest(limit, tasks, key=lambda task: task["completed_at"])
+
+    def count_by_status(self):
+        counts = Counter()
+        for part in self._broadcast("count_by_status"):
+            counts.update(part)
+        return dict(counts)
+
+    def _shards_of(self, task_ids):
+        # Invalid ids are left for the shard to reject.
+        return {self._shard(key) for key in map(to_key, task_ids or ()) if key is not None}
+
+    def _new_id(self, depends_on=None):
+        """A fresh task id on the one shard holding all of ``depends_on``."""
+        shards = self._shards_of(depends_on)
+        if len(shards) > 1:
+            msg = "In sharded mode a task's dependencies must all be on one shard"
+            raise ValueError(msg)
+        while True:
+            task_id = uuid.uuid4()
+            if not shards or self._shard(task_id.bytes) in shards:
+                return str(task_id)
+
+    def _check_exist(self, task_ids):
+        task_ids = list(dict.fromkeys(task_ids))
+        for task_id, task in zip(task_ids, self.get_tasks(task_ids), strict=True):
+            if not task:
+                msg = f"Unknown dependency: {task_id}"
+                raise ValueError(msg)
+
+    def add_task(self, title, description="", priority=0, due_at=None, depends_on=None):
+        task_id = self._new_id(depends_on)
+        with self._writes:
+            return self._call(
+                self._shard(to_key(task_id)), "add_task", title, description, priority, due_at, task_id, depends_on
+            )
+
+    def add_tasks(self, items):
+        items = [{**item, "task_id": self._new_id(item.get("depends_on"))} for item in items]
+        groups = self._group([to_key(item["task_id"]) for item in items])
+        with self._writes:
+            # Checked here so an unknown dependency can't leave other shards' parts added.
+            self._check_exist(dep for item in items for dep in item.get("depends_on") or ())
+            results = self._scatter({i: ("add_tasks", ([items[p] for p in pos],), {}) for i, pos in groups.items()})
+        out = [None] * len(items)
+        for i, pos in groups.items():
+            for p, task in zip(pos, results[i], strict=True):
+                out[p] = task
+        return out
+
+    def import_tasks(self, rows):
+        rows = [row if "id" in row else {**row, "id": self._new_id(row.get("depends_on"))} for row in rows]
+        groups = self._group([to_key(row["id"]) for row in rows])
+        with self._writes:
+            if any(row.get("depends_on") for row in rows):
+                for row in rows:
+                    if self._shards_of(row.get("depends_on")) - {self._shard(to_key(row["id"]))}:
+                        msg = f"In sharded mode task {row['id']} must be on the shard of its dependencies"
+                        raise ValueError(msg)
+                # Every shard checks its part before any shard writes.
+                self._scatter({i: ("check_import", ([rows[p] for p in pos],), {}) for i, pos in groups.items()})
+            results = self._scatter({i: ("import_tasks", ([rows[p] for p in pos],), {}) for i, pos in groups.items()})
+        return sum(r[0] for r in results.values()), sum(r[1] for r in results.values())
+
+    def set_status(self, task_id, status, expected_version=None):
+        key = to_key(task_id)
+        if key is None:
+            return False
+        with self._writes:
+            return self._call(self._shard(key), "set_status", task_id, status, expected_version)
+
+    def set_statuses(self, updates):
+        updates = [(*update, None)[:3] for update in updates]
+        # Check every expected version before any shard applies its part, so
+        # a conflict still leaves the whole batch unapplied.
+        expected = [(task_id, version) for task_id, _, version in updates if version is not None]
+        groups = self._group([to_key(update[0]) for update in updates])
+        with self._writes:
+            if expected:
+                tasks = self.get_tasks([task_id for task_id, _ in expected])
+                for (_, version), task in zip(expected, tasks, strict=True):
+                    if task and task["version"] != version:
+                        raise VersionConflict(task, version)
+            results = self._scatter(
+                {i: ("set_statuses", ([updates[p] for p in pos],), {}) for i, pos in groups.items()}
+            )
+        out = [False] * len(updates)
+        for i, pos in groups.items():
+            for p, found in zip(pos, results[i], strict=True):
+                out[p] = found
+        return out
+
+    def get_task(self, task_id):
+        key = to_key(task_id)
+        return {} if key is None else self._call(self._shard(key), "get_task", task_id)
+
+    def get_tasks(self, task_ids):
+        task_ids = list(task_ids)
+        groups = self._group([to_key(task_id) for task_id in task_ids])
+        results = self._scatter({i: ("get_tasks", ([task_ids[p] for p in pos],), {}) for i, pos in groups.items()})
+        out = [{}] * len(task_ids)
+        for i, pos in groups.items():
+            for p, task in zip(pos, results[i], strict=True):
+                out[p] = task
+        return out
+
+    def _best(self, min_priority=None, due_before=None):
+        # Each shard's next task, and the shard holding the most urgent of them.
+        heads = self._broadcast("next_task", min_priority, due_before)
+        candidates = [(_sched_key(task), i) for i, task in enumerate(heads) if task]
+        if not candidates:
+            return {}, None
+        _, index = min(candidates)
+        return heads[index], index
+
+    def next_task(self, min_priority=None, due_before=None):
+        return self._best(min_priority, due_before)[0]
+
+    def claim_next(self, owner, ttl, min_priority=None, due_before=None):
+        # Writes are serialized here, so the shard's head can't change between
+        # the peek and the claim.
+        with self._writes:
+            _, index = self._best(min_priority, due_before)
+            if index is None:
+                return {}
+            return self._call(index, "claim_next", owner, ttl, min_priority, due_before)
+
+    def renew_lease(self, task_id, owner, ttl):
+        key = to_key(task_id)
+        if key is None:
+            return {}
+        with self._writes:
+            return self._call(self._shard(key), "renew_lease", task_id, owner, ttl)
+
+    def update_task(  # noqa: PLR0913, PLR0917 - one parameter per field update-task takes
+        self,
+        task_id,
+        title=None,
+        description=None,
+        status=None,
+        priority=None,
+        due_at=None,
+        expected_version=None,
+        depends_on=None,
+    ):
+        key = to_key(task_id)
+        if key is None:
+            return {}
+        if self._shards_of(depends_on) - {self._shard(key)}:
+            msg = "In sharded mode a task's dependencies must be on its own shard"
+            raise ValueError(msg)
+        with self._writes:
+            return self._call(
+                self._shard(key),
+                "update_task",
+                task_id,
+                title,
+                description,
+                status,
+                priority,
+                due_at,
+                expected_version,
+                depends_on,
+            )
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], sys.argv[2], sys.argv[3])
@@ -0,0 +1,274 @@
+"""Storage engines that persist TaskDB state.
+
+TaskDB always serves reads from memory; an engine only has to replay saved
+tasks on startup (``load``), durably record every changed task (``save``)
+and forget archived ones (``delete_many``). Records are full task states, so
+replaying one twice is harmless.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+# Task fields stored by SQLiteStorage and their column definitions. Columns
+# missing from an existing database are added on open.
+SCHEMA = {
+    "id": "TEXT PRIMARY KEY",
+    "title": "TEXT NOT NULL",
+    "description": "TEXT NOT NULL",
+    "status": "TEXT NOT NULL",
+    "priority": "INTEGER NOT NULL DEFAULT 0",
+    "due_at": "TEXT",
+    "created_at": "TEXT",
+    "lease_owner": "TEXT",
+    "lease_expires_at": "TEXT",
+    "version": "INTEGER NOT NULL DEFAULT 0",
+    "completed_at": "TEXT",
+    # Space-separated task ids.
+    "depends_on": "TEXT NOT NULL DEFAULT ''",
+}
+COLUMNS = tuple(SCHEMA)
+
+
+class MemoryStorage:
+    """No persistence: everything is lost when the process exits."""
+
+    def load(self):
+        return iter(())
+
+    def save(self, task):
+        pass
+
+    def save_many(self, tasks):
+        pass
+
+    def delete_many(self, task_ids):
+        pass
+
+    def wants_snapshot(self):
+        return False
+
+    def snapshot(self, tasks):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteStorage(MemoryStorage):
+    """SQLite in WAL mode, committing every save before it returns.
+
+    ``synchronous`` is SQLite's pragma: the default ``FULL`` syncs the WAL on
+    every commit, so a committed save survives power loss; ``NORMAL`` only
+    syncs at checkpoints, so a power cut may roll back the latest commits
+    (a process crash still loses nothing).
+
+    Group commit is opt-in: with ``batch_size > 1`` and a ``flush_interval``,
+    writes are buffered per task id and committed in one transaction once
+    ``batch_size`` tasks are dirty or ``flush_interval`` seconds have passed,
+    whichever comes first. A buffered write has already been acknowledged, so
+    a crash inside that window loses it; batch tools (``save_many``) are
+    always committed before they return.
+    """
+
+    UPSERT = (
+        f"INSERT INTO tasks ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "  # noqa: S608 - COLUMNS is a constant
+        f"ON CONFLICT(id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in COLUMNS[1:])}"
+    )
+
+    def __init__(self, path, batch_size=1, flush_interval=0.0, synchronous="FULL"):
+        if synchronous not in {"OFF", "NORMAL", "FULL", "EXTRA"}:
+            msg = f"Unknown SQLite synchronous mode: {synchronous}"
+            raise ValueError(msg)
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._dirty = {}
+        self._lock = threading.RLock()
+        self._timer = None
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={synchronous}")
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS tasks ({', '.join(f'{c} {d}' for c, d in SCHEMA.items())})")
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(tasks)")}
+        for column, decl in SCHEMA.items():
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {decl}")
+
+    @staticmethod
+    def _row(task):
+        return tuple(" ".join(task[c]) if c == "depends_on" else task[c] for c in COLUMNS)
+
+    def load(self):
+        cursor = self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM tasks ORDER BY rowid")  # noqa: S608
+        cursor.arraysize = 4096
+        while rows := cursor.fetchmany():
+            for row in rows:
+                task = dict(zip(COLUMNS, row, strict=True))
+                task["depends_on"] = task["depends_on"].split()
+                yield task
+
+    def save(self, task):
+        with self._lock:
+            self._dirty[task["id"]] = self._row(task)
+            if len(self._dirty) >= self.batch_size or self.flush_interval <= 0:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def save_many(self, tasks):
+        with self._lock:
+            for task in tasks:
+                self._dirty[task["id"]] = self._row(task)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            rows, self._dirty = list(self._dirty.values()), {}
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(self.UPSERT, rows)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def delete_many(self, task_ids):
+        with self._lock:
+            for task_id in task_ids:
+                self._dirty.pop(task_id, None)
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany("DELETE FROM tasks WHERE id = ?", [(task_id,) for task_id in task_ids])
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+class JournalStorage(MemoryStorage):
+    """Append-only NDJSON journal with periodic snapshot compaction.
+
+    Every save appends the task's full state to ``journal.ndjson``. After
+    ``snapshot_every`` appends TaskDB is asked for a snapshot, which is written
+    atomically to ``snapshot.ndjson`` before the journal is truncated, so a
+    restart reads the snapshot plus only the journal tail written since.
+
+    Each save is fsynced before it returns; with ``fsync=False`` it only
+    reaches the OS, which survives a process crash but not power loss.
+    """
+
+    def __init__(self, directory, snapshot_every=10_000, fsync=True):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.snapshot_path = self.directory / "snapshot.ndjson"
+        self.journal_path = self.directory / "journal.ndjson"
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self._appended = 0
+        self._journal = None
+
+    def load(self):
+        if self.snapshot_path.exists():
+            with self.snapshot_path.open("rb") as f:
+                for line in f:
+                    yield json.loads(line)
+        if not self.journal_path.exists():
+            return
+        good = 0
+        with self.journal_path.open("rb") as f:
+            for line in f:
+                try:
+                    task = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                good += len(line)
+                self._appended += 1
+                yield task
+        # Drop a torn final record left by a crash mid-append so new appends
+        # start on a clean line.
+        if good < self.journal_path.stat().st_size:
+            with self.journal_path.open("r+b") as f:
+                f.truncate(good)
+
+    def _append(self, task):
+        if self._journal is None:
+            self._journal = self.journal_path.open("a", encoding="utf-8")
+        self._journal.write(json.dumps(task, separators=(",", ":")) + "\n")
+        self._appended += 1
+
+    def save(self, task):
+        self._append(task)
+        self.flush()
+
+    def save_many(self, tasks):
+        for task in tasks:
+            self._append(task)
+        self.flush()
+
+    def delete_many(self, task_ids):
+        # A tombstone: TaskDB drops the task when it replays this record.
+        for task_id in task_ids:
+            self._append({"id": task_id, "archived": True})
+        self.flush()
+
+    def wants_snapshot(self):
+        return self._appended >= self.snapshot_every
+
+    def snapshot(self, tasks):
+        tmp = self.snapshot_path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for task in tasks:
+                f.write(json.dumps(task, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        tmp.replace(self.snapshot_path)
+        # Safe to drop the journal now: replaying it over the new snapshot
+        # would only re-apply states the snapshot already holds.
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = self.journal_path.open("w", encoding="utf-8")
+        self._appended = 0
+
+    def flush(self):
+        if self._journal is None:
+            return
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def close(self):
+        if self._journal is not None:
+            self.flush()
+            self._journal.close()
+            self._journal = None
+
+
+def open_storage(backend="memory", path=None):
+    """Build a storage engine by name: ``memory``, ``sqlite`` or ``journal``."""
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "sqlite":
+        return SQLiteStorage(path or "tasks.db")
+    if backend == "journal":
+        return JournalStorage(path or "tasks-journal")
+    msg = f"Unknown storage backend: {backend}"
+    raise ValueError(msg)
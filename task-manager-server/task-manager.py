@@ -1,10 +1,44 @@
+import argparse
+import asyncio
+import functools
+import io
+import json
+import os
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Literal
 
-from mcp.server.fastmcp import FastMCP
-from pydantic import BaseModel, Field
+import anyio
+import uvicorn
+from mcp import types
+from mcp.server.fastmcp import Context, FastMCP
+from pydantic import AnyUrl, BaseModel, Field
 
-from tasks_db import TaskDB
+from archive import SegmentArchive, archive_path
+from metrics import Metrics, max_rss_bytes
+from response_cache import ResponseCache
+from sharding import ShardedTaskDB
+from storage import open_storage
+from task_io import read_rows, write_rows
+from tasks_db import TaskDB, VersionConflict
+from vector_index import load_embedding
 
-db = TaskDB()
+# Storage engine: "memory" (default), "sqlite" or "journal"; see storage.py.
+# TASK_EMBEDDING=module:function swaps in a local embedding model for find-similar-tasks.
+# TASK_DB_SHARDS=N (N > 1) spreads tasks over N worker processes; see sharding.py.
+# TASK_ARCHIVE_AFTER=seconds moves tasks finished that long ago to the archive
+# (TASK_ARCHIVE_PATH, by default next to the storage); see archive.py.
+backend, path = os.getenv("TASK_DB_BACKEND", "memory"), os.getenv("TASK_DB_PATH")
+if int(os.getenv("TASK_DB_SHARDS", "1")) > 1:
+    db = ShardedTaskDB(int(os.environ["TASK_DB_SHARDS"]), backend, path, archive_dir=os.getenv("TASK_ARCHIVE_PATH"))
+else:
+    db = TaskDB(
+        open_storage(backend, path),
+        embedding=load_embedding(os.environ["TASK_EMBEDDING"]) if os.getenv("TASK_EMBEDDING") else None,
+        archive=SegmentArchive(os.getenv("TASK_ARCHIVE_PATH") or archive_path(backend, path)),
+        archive_after=float(os.getenv("TASK_ARCHIVE_AFTER", "0")) or None,
+    )
 
 
 # Schemas
@@ -13,67 +47,563 @@ class Task(BaseModel):
     title: str
     description: str
     status: str
+    priority: int = 0
+    due_at: str | None = None
+    created_at: str | None = None
+    lease_owner: str | None = None
+    lease_expires_at: str | None = None
+    version: int = 0
+    completed_at: str | None = None
+    depends_on: list[str] = []
+
+
+def to_utc_iso(value: datetime | None) -> str | None:
+    # ISO 8601 UTC is what the store takes and returns; it keeps epoch seconds internally. Naive times are taken as UTC.
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+class GetTasksInput(BaseModel):
+    status: str | None = None
+    title: str | None = Field(None, description="Case-insensitive substring of the task title.")
+    cursor: int | str | None = Field(None, description="next_cursor from a previous page.")
+    limit: int | None = Field(None, ge=1, le=1000)
+    fields: (
+        list[
+            Literal[
+                "id",
+                "title",
+                "description",
+                "status",
+                "priority",
+                "due_at",
+                "created_at",
+                "lease_owner",
+                "lease_expires_at",
+                "version",
+                "completed_at",
+                "depends_on",
+            ]
+        ]
+        | None
+    ) = Field(None, description="Only return these task fields, e.g. ['id', 'status'].")
 
 
 class AddTaskInput(BaseModel):
     title: str = Field(..., min_length=1, max_length=100)
     description: str | None = ""
+    priority: int = Field(0, description="Higher is more urgent.")
+    due_at: datetime | None = None
+    depends_on: list[str] | None = Field(None, description="Ids of tasks that must be done before this one.")
+
+    def task_fields(self) -> dict[str, Any]:
+        return {
+            "title": self.title,
+            "description": self.description or "",
+            "priority": self.priority,
+            "due_at": to_utc_iso(self.due_at),
+            "depends_on": self.depends_on,
+        }
 
 
 class SetTaskStatusInput(BaseModel):
     task_id: str
     status: str
+    expected_version: int | None = Field(None, description="Only write if the task is still at this version.")
+
+
+class AddTasksInput(BaseModel):
+    tasks: list[AddTaskInput] = Field(..., min_length=1, max_length=1000)
+
+
+class SetTaskStatusesInput(BaseModel):
+    updates: list[SetTaskStatusInput] = Field(..., min_length=1, max_length=1000)
+
+
+class GetTasksByIdsInput(BaseModel):
+    task_ids: list[str] = Field(..., min_length=1, max_length=1000)
 
 
 class UpdateTaskInput(BaseModel):
     task_id: str
     title: str | None = None
     description: str | None = None
+    status: str | None = None
+    priority: int | None = None
+    due_at: datetime | None = None
+    expected_version: int | None = Field(None, description="Only write if the task is still at this version.")
+    depends_on: list[str] | None = Field(None, description="Replaces the task's dependencies; [] clears them.")
+
+
+class NextTaskInput(BaseModel):
+    min_priority: int | None = None
+    due_before: datetime | None = Field(None, description="Only consider tasks due at or before this time.")
+
+
+class ClaimNextTaskInput(NextTaskInput):
+    owner: str = Field(..., min_length=1, description="Worker id holding the lease.")
+    ttl_seconds: float = Field(300, gt=0, le=86400, description="Lease length; the task is requeued if not renewed.")
+
+
+class RenewTaskLeaseInput(BaseModel):
+    task_id: str
+    owner: str = Field(..., min_length=1)
+    ttl_seconds: float = Field(300, gt=0, le=86400)
+
+
+class GetChangesSinceInput(BaseModel):
+    version: int = Field(..., ge=0, description="Last version seen; 0 to read the whole retained log.")
+    epoch: str | None = Field(None, description="Epoch returned with that version; a mismatch forces a reset.")
+    limit: int = Field(1000, ge=1, le=10000)
 
 
 class GetTaskInput(BaseModel):
     task_id: str
 
 
+class SearchTasksInput(BaseModel):
+    query: str = Field(..., min_length=1, description="Words to look for in task titles and descriptions.")
+    status: str | None = None
+    limit: int = Field(10, ge=1, le=100)
+
+
+class FindSimilarTasksInput(BaseModel):
+    text: str = Field(..., min_length=1, description="Loose description of the task, e.g. 'the quarterly report one'.")
+    status: str | None = None
+    limit: int = Field(5, ge=1, le=100)
+
+
+class GetCompletedTasksInput(BaseModel):
+    after: datetime | None = Field(None, description="Completed at or after this time.")
+    before: datetime | None = Field(None, description="Completed at or before this time.")
+    limit: int = Field(100, ge=1, le=1000)
+
+
+class ImportTasksInput(BaseModel):
+    format: Literal["ndjson", "csv"] = "ndjson"
+    data: str = Field(..., description="One task per NDJSON line, or CSV with a header row; only title is required.")
+    batch_size: int = Field(1000, ge=1, le=10000, description="Rows per store write and progress report.")
+
+
+class ExportTasksInput(BaseModel):
+    format: Literal["ndjson", "csv"] = "ndjson"
+    status: str | None = None
+    cursor: int | str | None = Field(None, description="next_cursor from a previous page.")
+    limit: int = Field(1000, ge=1, le=10000)
+
+
 # MCP Server
 mcp = FastMCP("task-mcp-server")
+# Read-tool responses, reused until the next write to db.
+responses = ResponseCache(db)
+
+
+# Call counts and latency per tool, reported by server-stats.
+metrics = Metrics()
+started = time.monotonic()
+
+
+async def run_db(method, *args, **kwargs):
+    """Call ``method`` of db. A sharded store waits on its worker processes,
+    so its calls run on a thread and the event loop keeps serving meanwhile."""
+    if isinstance(db, ShardedTaskDB):
+        return await anyio.to_thread.run_sync(functools.partial(method, *args, **kwargs))
+    return method(*args, **kwargs)
+
+
+async def cached(tool: str, input: BaseModel, build):
+    return await run_db(responses.get, tool, input.model_dump_json(), build)
+
+
+def tool(name: str, description: str, read_only: bool = False):
+    """Register an MCP tool, timing each call of its body as the "tool" stage.
+
+    ``read_only`` tools are annotated as such, which tells clients they are
+    safe to retry after a transport failure.
+    """
+
+    def register(fn):
+        @functools.wraps(fn)
+        async def timed(*args, **kwargs):
+            with metrics.timer(name, "tool"):
+                return await fn(*args, **kwargs)
 
+        annotations = types.ToolAnnotations(readOnlyHint=True) if read_only else None
+        return mcp.tool(name, description=description, annotations=annotations)(timed)
 
-@mcp.tool("get-tasks", description="List all tasks.")
-async def get_tasks() -> dict[str, list[Task]]:
-    return {"tasks": [Task(**t) for t in db.list_tasks()]}
+    return register
 
 
-@mcp.tool("add-task", description="Add a new task.")
+@tool(
+    "get-tasks",
+    description="List tasks, optionally filtered by status/title, paginated with cursor/limit and projected to fields.",
+    read_only=True,
+)
+async def get_tasks(input: GetTasksInput | None = None) -> dict[str, Any]:
+    q = input or GetTasksInput()
+
+    def build():
+        # Rows come from the store already filtered and projected, so no Task model is built per row.
+        tasks, next_cursor = db.query_tasks(q.status, q.title, q.cursor, q.limit, q.fields)
+        return {"tasks": tasks, "next_cursor": next_cursor}
+
+    return await cached("get-tasks", q, build)
+
+
+@tool("add-task", description="Add a new task.")
 async def add_task(input: AddTaskInput) -> dict[str, Task]:
-    task = db.add_task(input.title, input.description or "")
+    task = await run_db(db.add_task, **input.task_fields())
     return {"task": Task(**task)}
 
 
-@mcp.tool("set-task-status", description="Set a task's status.")
-async def set_task_status(input: SetTaskStatusInput) -> dict[str, bool]:
-    ok = db.set_status(input.task_id, input.status)
+@tool("set-task-status", description="Set a task's status.")
+async def set_task_status(input: SetTaskStatusInput) -> dict[str, Any]:
+    try:
+        ok = await run_db(db.set_status, input.task_id, input.status, input.expected_version)
+    except VersionConflict as e:
+        return {"success": False, "conflict": Task(**e.task)}
     return {"success": ok}
 
 
-@mcp.tool("get-task", description="Get details for a specific task.")
+@tool("add-tasks", description="Add many tasks in one call.")
+async def add_tasks(input: AddTasksInput) -> dict[str, list[Task]]:
+    tasks = await run_db(db.add_tasks, (t.task_fields() for t in input.tasks))
+    return {"tasks": [Task(**t) for t in tasks]}
+
+
+@tool(
+    "set-task-statuses",
+    description="Set the status of many tasks in one call; on a version conflict none of them are changed.",
+)
+async def set_task_statuses(input: SetTaskStatusesInput) -> dict[str, Any]:
+    try:
+        oks = await run_db(db.set_statuses, ((u.task_id, u.status, u.expected_version) for u in input.updates))
+    except VersionConflict as e:
+        results = [{"task_id": u.task_id, "success": False} for u in input.updates]
+        return {"results": results, "conflict": Task(**e.task)}
+    return {"results": [{"task_id": u.task_id, "success": ok} for u, ok in zip(input.updates, oks, strict=True)]}
+
+
+@tool("get-tasks-by-ids", description="Get details for many tasks in one call.", read_only=True)
+async def get_tasks_by_ids(input: GetTasksByIdsInput) -> dict[str, list[Task | None]]:
+    return await cached(
+        "get-tasks-by-ids",
+        input,
+        lambda: {"tasks": [Task(**t) if t else None for t in db.get_tasks(input.task_ids)]},
+    )
+
+
+@tool("get-task", description="Get details for a specific task.", read_only=True)
 async def get_task(input: GetTaskInput) -> dict[str, Task | None]:
-    t = db.get_task(input.task_id)
-    return {"task": Task(**t) if t else None}
+    def build():
+        t = db.get_task(input.task_id)
+        return {"task": Task(**t) if t else None}
+
+    return await cached("get-task", input, build)
+
 
+@tool(
+    "search-tasks",
+    description="Full-text search over task titles and descriptions, best matches first with a relevance score.",
+    read_only=True,
+)
+async def search_tasks(input: SearchTasksInput) -> dict[str, list[dict[str, Any]]]:
+    return await cached(
+        "search-tasks", input, lambda: {"tasks": db.search_tasks(input.query, input.status, input.limit)}
+    )
 
-@mcp.tool("next-task", description="Get the next pending task.")
-async def next_task() -> dict[str, Task | None]:
-    t = db.next_task()
+
+@tool(
+    "find-similar-tasks",
+    description="Tasks closest in meaning to a free-text description, with cosine similarity; resolves task ids.",
+    read_only=True,
+)
+async def find_similar_tasks(input: FindSimilarTasksInput) -> dict[str, list[dict[str, Any]]]:
+    return await cached(
+        "find-similar-tasks", input, lambda: {"tasks": db.find_similar(input.text, input.status, input.limit)}
+    )
+
+
+@tool(
+    "next-task",
+    description=(
+        "Get the most urgent pending task whose dependencies are all done: "
+        "highest priority, then earliest due date, then oldest."
+    ),
+    read_only=True,
+)
+async def next_task(input: NextTaskInput | None = None) -> dict[str, Task | None]:
+    q = input or NextTaskInput()
+
+    def build():
+        t = db.next_task(q.min_priority, to_utc_iso(q.due_before))
+        return {"task": Task(**t) if t else None}
+
+    return await cached("next-task", q, build)
+
+
+@tool(
+    "claim-next-task",
+    description="Atomically take the next pending task: it moves to in_progress under a lease held by owner.",
+)
+async def claim_next_task(input: ClaimNextTaskInput) -> dict[str, Task | None]:
+    t = await run_db(db.claim_next, input.owner, input.ttl_seconds, input.min_priority, to_utc_iso(input.due_before))
     return {"task": Task(**t) if t else None}
 
 
-@mcp.tool("update-task", description="Update task details.")
+@tool("renew-task-lease", description="Extend a lease from claim-next-task before it expires.")
+async def renew_task_lease(input: RenewTaskLeaseInput) -> dict[str, Any]:
+    t = await run_db(db.renew_lease, input.task_id, input.owner, input.ttl_seconds)
+    return {"success": bool(t), "task": Task(**t) if t else None}
+
+
+@tool(
+    "update-task",
+    description="Update task details. Pass expected_version to fail with the current task as conflict if it changed.",
+)
 async def update_task(input: UpdateTaskInput) -> dict[str, Task | None]:
-    updated = db.update_task(input.task_id, input.title, input.description)
+    try:
+        updated = await run_db(
+            db.update_task,
+            input.task_id,
+            input.title,
+            input.description,
+            input.status,
+            input.priority,
+            to_utc_iso(input.due_at),
+            input.expected_version,
+            input.depends_on,
+        )
+    except VersionConflict as e:
+        return {"task": None, "conflict": Task(**e.task)}
     return {"task": Task(**updated) if updated else None}
 
 
+@tool(
+    "get-changes-since",
+    description="Task changes (created/updated/status_changed/archived) after a version, for incremental sync.",
+    read_only=True,
+)
+async def get_changes_since(input: GetChangesSinceInput) -> dict[str, Any]:
+    if input.epoch is not None and input.epoch != db.epoch:
+        changes, reset = [], True
+    else:
+        changes, reset = db.changes_since(input.version, input.limit)
+    # On reset, resync with get-tasks and continue from the returned version.
+    return {"epoch": db.epoch, "version": db.version, "reset": reset, "changes": changes}
+
+
+# import-tasks reports the first this many failed rows.
+MAX_IMPORT_ERRORS = 20
+
+
+@tool(
+    "import-tasks",
+    description="Bulk-add or replace tasks from NDJSON or CSV, written in batches with progress notifications.",
+)
+async def import_tasks(input: ImportTasksInput, ctx: Context) -> dict[str, Any]:
+    rows = read_rows(io.StringIO(input.data), input.format)
+    created = updated = failed = 0
+    errors = []
+    while batch := list(islice(rows, input.batch_size)):
+        tasks = []
+        for line, task, error in batch:
+            if error is None:
+                tasks.append(task)
+            else:
+                failed += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append({"line": line, "error": error})
+        try:
+            c, u = await run_db(db.import_tasks, tasks)
+        except ValueError as e:
+            # Bad dependencies reject the whole batch before anything is written.
+            c = u = 0
+            failed += len(tasks)
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({"line": batch[0][0], "error": str(e)})
+        created += c
+        updated += u
+        await ctx.report_progress(created + updated + failed)
+        # Let other clients in between batches of a large import.
+        await asyncio.sleep(0)
+    return {"created": created, "updated": updated, "failed": failed, "errors": errors}
+
+
+@tool(
+    "get-completed-tasks",
+    description="Tasks finished (done or cancelled) within a time range, oldest first, including archived ones.",
+    read_only=True,
+)
+async def get_completed_tasks(input: GetCompletedTasksInput | None = None) -> dict[str, list[Task]]:
+    q = input or GetCompletedTasksInput()
+
+    def build():
+        tasks = db.completed_tasks(to_utc_iso(q.after), to_utc_iso(q.before), q.limit)
+        return {"tasks": [Task(**t) for t in tasks]}
+
+    return await cached("get-completed-tasks", q, build)
+
+
+@tool(
+    "export-tasks",
+    description="Export one page of tasks as NDJSON or CSV text; follow next_cursor for the rest.",
+    read_only=True,
+)
+async def export_tasks(input: ExportTasksInput) -> dict[str, Any]:
+    tasks, next_cursor = await run_db(db.query_tasks, input.status, cursor=input.cursor, limit=input.limit)
+    # CSV pages after the first continue the same table, so only the first has a header.
+    data = write_rows(tasks, input.format, header=not input.cursor)
+    return {"data": data, "count": len(tasks), "next_cursor": next_cursor}
+
+
+@tool(
+    "server-stats",
+    description="Per-tool call counts, errors and latency percentiles, plus store and cache stats.",
+    read_only=True,
+)
+async def server_stats() -> dict[str, Any]:
+    return {
+        "uptime_seconds": round(time.monotonic() - started, 1),
+        "max_rss_bytes": max_rss_bytes(),
+        "version": db.version,
+        "tasks": await run_db(db.count_by_status),
+        "response_cache": {"entries": len(responses.entries), "hits": responses.hits, "misses": responses.misses},
+        "tools": metrics.snapshot(),
+    }
+
+
+# Change notifications
+CHANGES_URI = "tasks://changes"
+
+
+def lowlevel_server():
+    # FastMCP has no API for resource subscriptions; they live on the low-level server it wraps.
+    return mcp._mcp_server  # noqa: SLF001
+
+
+@mcp.resource(CHANGES_URI, name="task-changes", mime_type="application/json")
+def changes_resource() -> str:
+    """Current change-feed position. Subscribe to be notified after every write."""
+    return json.dumps({"epoch": db.epoch, "version": db.version})
+
+
+@mcp.resource("tasks://changes/{since}", name="task-changes-since", mime_type="application/json")
+def changes_since_resource(since: str) -> str:
+    """Changes after version `since`, same shape as the get-changes-since tool."""
+    if not since.isdigit():
+        msg = f"Not a change-feed version: {since!r}; use the version from {CHANGES_URI}"
+        raise ValueError(msg)
+    changes, reset = db.changes_since(int(since))
+    return json.dumps({"epoch": db.epoch, "version": db.version, "reset": reset, "changes": changes})
+
+
+class ChangeNotifier:
+    """Tells subscribed sessions that CHANGES_URI moved, once per burst of writes."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.loop = None
+        self.scheduled = False
+        # Running sends, referenced so they are not garbage-collected mid-flight.
+        self.tasks = set()
+
+    async def notify(self):
+        self.scheduled = False
+        for session in list(self.subscribers):
+            try:
+                await session.send_resource_updated(AnyUrl(CHANGES_URI))
+            except (anyio.BrokenResourceError, anyio.ClosedResourceError):  # noqa: PERF203 - per session
+                self.subscribers.discard(session)
+
+    def subscribe(self, session) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.subscribers.add(session)
+
+    def on_change(self, _change: dict[str, Any]) -> None:
+        # Coalesce a burst of writes into one notification per event-loop turn.
+        # A sharded store records changes on its reply threads, not the loop's.
+        if not self.subscribers or self.scheduled:
+            return
+        self.scheduled = True
+        self.loop.call_soon_threadsafe(self.start_notify)
+
+    def start_notify(self) -> None:
+        task = self.loop.create_task(self.notify())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+
+notifier = ChangeNotifier()
+db.add_listener(notifier.on_change)
+
+
+def advertise_subscriptions(get_capabilities):
+    # The low-level server reports resources.subscribe=False even with a
+    # subscribe handler registered, so clients following the spec would never subscribe.
+    @functools.wraps(get_capabilities)
+    def wrapper(*args, **kwargs):
+        capabilities = get_capabilities(*args, **kwargs)
+        if capabilities.resources is not None:
+            capabilities.resources = capabilities.resources.model_copy(update={"subscribe": True})
+        return capabilities
+
+    return wrapper
+
+
+lowlevel_server().get_capabilities = advertise_subscriptions(lowlevel_server().get_capabilities)
+
+
+@lowlevel_server().subscribe_resource()
+async def subscribe_resource(uri: AnyUrl) -> None:
+    if str(uri) == CHANGES_URI:
+        notifier.subscribe(lowlevel_server().request_context.session)
+
+
+@lowlevel_server().unsubscribe_resource()
+async def unsubscribe_resource(uri: AnyUrl) -> None:
+    if str(uri) == CHANGES_URI:
+        notifier.subscribers.discard(lowlevel_server().request_context.session)
+
+
 # Entrypoint
+def parse_args():
+    parser = argparse.ArgumentParser(description="Task manager MCP server")
+    parser.add_argument(
+        "--transport",
+        choices=["stdio", "sse", "streamable-http"],
+        default=os.getenv("TASK_SERVER_TRANSPORT", "stdio"),
+        help="stdio serves one client per process; sse/streamable-http serve many clients from one shared store",
+    )
+    parser.add_argument("--host", default=os.getenv("TASK_SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("TASK_SERVER_PORT", "8080")))
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=int(os.getenv("TASK_SERVER_MAX_CONCURRENCY", "0")) or None,
+        help="Maximum concurrent connections/requests before answering 503 (default: unlimited)",
+    )
+    return parser.parse_args()
+
+
+def run_network(transport, host, port, max_concurrency):
+    # Like FastMCP.run(), but a single uvicorn worker with a concurrency cap:
+    # extra worker processes would each get their own private TaskDB.
+    app = mcp.sse_app() if transport == "sse" else mcp.streamable_http_app()
+    uvicorn.run(app, host=host, port=port, workers=1, limit_concurrency=max_concurrency, log_level="info")
+
+
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
+    args = parse_args()
+    try:
+        if args.transport == "stdio":
+            mcp.run(transport="stdio")
+        else:
+            mcp.settings.host = args.host
+            mcp.settings.port = args.port
+            run_network(args.transport, args.host, args.port, args.max_concurrency)
+    finally:
+        db.close()
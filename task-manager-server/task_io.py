@@ -0,0 +1,116 @@
+"""NDJSON and CSV encoding of tasks for bulk import and export.
+
+Both directions work row by row over an iterable of lines, so a caller can
+feed a file or a network stream through in bounded memory. Exports carry
+every stored field; imports only need ``title`` and ignore lease fields.
+"""
+
+import csv
+import io
+import json
+import uuid
+from datetime import datetime, timezone
+
+from storage import COLUMNS
+
+FORMATS = ("ndjson", "csv")
+
+
+def _timestamp(value, field):
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        msg = f"{field} is not an ISO 8601 timestamp: {value!r}"
+        raise ValueError(msg) from None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+def normalize(raw):
+    """Validate one imported row into a task dict for TaskDB.import_tasks().
+
+    Empty values count as missing, so CSV blanks and JSON nulls both fall
+    back to TaskDB's defaults. Raises ValueError for an unusable row.
+    """
+    if not isinstance(raw, dict):
+        msg = "expected an object"
+        raise ValueError(msg)  # noqa: TRY004
+    row = {k: v for k, v in raw.items() if v is not None and v != ""}
+    title = str(row.get("title", "")).strip()
+    if not title:
+        msg = "title is required"
+        raise ValueError(msg)
+    task = {"title": title, "description": str(row.get("description", ""))}
+    if "id" in row:
+        try:
+            task["id"] = str(uuid.UUID(str(row["id"])))
+        except ValueError:
+            msg = f"id is not a UUID: {row['id']!r}"
+            raise ValueError(msg) from None
+    if "status" in row:
+        task["status"] = str(row["status"])
+    if "priority" in row:
+        try:
+            task["priority"] = int(row["priority"])
+        except (TypeError, ValueError):
+            msg = f"priority is not an integer: {row['priority']!r}"
+            raise ValueError(msg) from None
+    for field in ("due_at", "created_at", "completed_at"):
+        if field in row:
+            task[field] = _timestamp(row[field], field)
+    if "depends_on" in row:
+        depends_on = row["depends_on"]
+        if isinstance(depends_on, str):
+            depends_on = depends_on.replace(",", " ").split()
+        try:
+            task["depends_on"] = [str(uuid.UUID(str(dep))) for dep in depends_on]
+        except (TypeError, ValueError):
+            msg = f"depends_on is not a list of UUIDs: {row['depends_on']!r}"
+            raise ValueError(msg) from None
+    return task
+
+
+def read_rows(lines, fmt="ndjson"):
+    """Yield ``(line_number, task, error)`` for each record in ``lines``.
+
+    Exactly one of ``task`` and ``error`` is set; CSV input needs a header
+    row. Blank NDJSON lines are skipped.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for raw in reader:
+            try:
+                yield reader.line_num, normalize(raw), None
+            except ValueError as e:  # noqa: PERF203 - a bad row is reported, not fatal
+                yield reader.line_num, None, str(e)
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, normalize(json.loads(line)), None
+        except ValueError as e:
+            yield number, None, str(e)
+
+
+def _cell(task, column):
+    value = task[column]
+    if value is None:
+        return ""
+    return " ".join(value) if column == "depends_on" else value
+
+
+def write_rows(tasks, fmt="ndjson", header=True):
+    """Encode task dicts as NDJSON lines or CSV rows (with a header row if ``header``).
+
+    In CSV, ``depends_on`` is written as space-separated ids.
+    """
+    if fmt == "csv":
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        if header:
+            writer.writerow(COLUMNS)
+        writer.writerows([_cell(task, c) for c in COLUMNS] for task in tasks)
+        return out.getvalue()
+    return "".join(json.dumps(task, separators=(",", ":")) + "\n" for task in tasks)
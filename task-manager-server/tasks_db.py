@@ -1,39 +1,1323 @@
+import functools
+import heapq
+import math
+import re
+import threading
+import time
 import uuid
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, deque
+from datetime import datetime, timezone
+from itertools import islice, product
+from typing import NamedTuple
 
+from archive import SegmentArchive
+from search_index import SearchIndex
+from storage import MemoryStorage
+from vector_index import VectorIndex
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+# Dependencies count as complete once in this status.
+DONE = "done"
+CANCELLED = "cancelled"
+# Statuses a task is finished in; it can be archived after a while in one.
+TERMINAL = frozenset({DONE, CANCELLED})
+# Other names clients use for a status; "completed" is what client.py sends.
+STATUS_ALIASES = {"completed": DONE}
+# Scheduling due date of a task without one: after every dated task.
+UNDATED = float("inf")
+# A task id in the form str(uuid.UUID(...)) gives, which needs no parsing.
+CANONICAL_ID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+ID_LENGTH = 36
+
+
+def to_iso(ts):
+    return None if ts is None else datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def from_iso(value):
+    return None if value is None else datetime.fromisoformat(value).timestamp()
+
+
+class VersionConflict(Exception):  # noqa: N818 - an expected outcome of a conditional write, not a fault
+    """A write's ``expected_version`` is not the task's current version.
+
+    ``task`` is the task as it stands, so the caller can retry from it.
+    """
+
+    def __init__(self, task, expected):
+        super().__init__(task, expected)
+        self.task = task
+        self.expected = expected
+
+    def __str__(self):
+        return f"Task {self.task['id']} is at version {self.task['version']}, not {self.expected}"
+
+
+def canonical_status(status):
+    """The status ``status`` stands for: aliases map to their status, others are unchanged."""
+    return STATUS_ALIASES.get(status, status)
+
+
+def to_key(task_id):
+    try:
+        return uuid.UUID(task_id).bytes
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def canonical_id(task_id):
+    """``task_id`` in lowercase hyphenated form, or None if it is not a UUID."""
+    if isinstance(task_id, str) and CANONICAL_ID.fullmatch(task_id):
+        return task_id
+    try:
+        return str(uuid.UUID(task_id))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def _task_id(task_id):
+    canonical = canonical_id(task_id)
+    if canonical is None:
+        msg = f"Not a task id: {task_id!r}"
+        raise ValueError(msg)
+    return canonical
+
+
+def _dependency_ids(task_ids):
+    return tuple(dict.fromkeys(_task_id(task_id) for task_id in task_ids or ()))
+
+
+def _priority(value):
+    # Priorities live in a 64-bit column.
+    if not -(2**63) <= value < 2**63:
+        msg = f"Priority out of range: {value}"
+        raise ValueError(msg)
+    return value
+
+
+def _parse(data):
+    """A task dict in its string form, with ids checked and times as epoch floats."""
+    return {
+        "id": _task_id(data["id"]),
+        "title": data["title"],
+        "description": data.get("description", ""),
+        "status": canonical_status(data["status"]),
+        "priority": _priority(data.get("priority", 0)),
+        "due_at": from_iso(data.get("due_at")),
+        "created_at": from_iso(data.get("created_at")),
+        "depends_on": _dependency_ids(data.get("depends_on")),
+        "lease_owner": data.get("lease_owner"),
+        "lease_expires_at": from_iso(data.get("lease_expires_at")),
+        "version": data.get("version") or 0,
+        "completed_at": from_iso(data.get("completed_at")),
+    }
+
+
+class Text(NamedTuple):
+    """The string fields of a task, as kept in one UTF-8 blob per task."""
+
+    id: str
+    created_at: str | None
+    due_at: str | None
+    completed_at: str | None
+    title: str
+    description: str
+
+
+# Lengths of the ISO 8601 UTC strings to_iso() produces, by the 2-bit code
+# TaskTable.stamps keeps for each timestamp; 0 is None.
+STAMP_LENGTHS = (0, 25, 32)
+STAMP_CODES = {length: code for code, length in enumerate(STAMP_LENGTHS)}
+
+
+def _stamp_ends():
+    # Where created_at, due_at and completed_at end in a blob (the last is
+    # where the title starts), indexed by the stamps byte of their codes.
+    ends = [None] * 64
+    for codes in product(range(len(STAMP_LENGTHS)), repeat=3):
+        lengths = [STAMP_LENGTHS[code] for code in codes]
+        ends[codes[0] | codes[1] << 2 | codes[2] << 4] = tuple(ID_LENGTH + sum(lengths[: i + 1]) for i in range(3))
+    return ends
+
+
+STAMP_ENDS = _stamp_ends()
+# Status codes are bytes, and 0 marks a removed row.
+MAX_STATUS_CODE = 255
+# Slots of TaskTable's id index.
+EMPTY, DELETED = 0, -1
+
+
+class TaskTable:
+    """Tasks held column-wise, one row per task in creation order.
+
+    A row is a handful of machine values spread over arrays (status code,
+    priority, version, epoch times) plus one UTF-8 blob in a shared buffer
+    holding the id, the ISO strings of the timestamps and the text. Reads
+    slice the blob instead of formatting ids and times, and no per-task
+    Python object is kept at all: a task costs a few dozen bytes of columns
+    next to its text, against several hundred for a dict or slotted object.
+
+    Rows are addressed by position, row + start. Removed rows keep their
+    place with status 0 until they lead the table and are trimmed; blobs
+    that are replaced or removed are garbage in the buffer until it is
+    compacted. An open-addressing hash index maps ids to positions.
+    """
 
-class TaskDB:
     def __init__(self):
-        self.tasks = {}
+        self.start = 0
+        self.count = 0
+        # Status code per row; 0 marks a removed row.
+        self.status = bytearray()
+        self.priority = array("q")
+        self.version = array("I")
+        # Epoch times, NaN for None. Kept next to their ISO strings in the
+        # blob because scheduling and archiving compare them.
+        self.created = array("d")
+        self.due = array("d")
+        self.completed = array("d")
+        # Index of the row's entry in TaskDB's scheduler heap, or -1.
+        self.queued = array("i")
+        self.text = bytearray()
+        self.text_at = array("Q")
+        self.text_len = array("I")
+        # Title length in characters, and the STAMP_LENGTHS codes of
+        # created_at, due_at and completed_at, 2 bits each.
+        self.title_len = array("I")
+        self.stamps = bytearray()
+        self.garbage = 0
+        # Position + 1 of the row holding an id, EMPTY or DELETED.
+        self.slots = array("q", [EMPTY]) * 8
+        self.used = 0
+
+    @staticmethod
+    def _encode(text):
+        blob = "".join((text.id, text.created_at or "", text.due_at or "", text.completed_at or "", text.title))
+        stamps = 0
+        for shift, stamp in ((0, text.created_at), (2, text.due_at), (4, text.completed_at)):
+            stamps |= STAMP_CODES[len(stamp or "")] << shift
+        return (blob + text.description).encode(), len(text.title), stamps
+
+    def append(self, text, status, priority, created, due):
+        """Add a row; returns its position."""
+        blob, title_len, stamps = self._encode(text)
+        pos = self.start + len(self.status)
+        self._claim_slot(text.id, pos)
+        self.status.append(status)
+        self.priority.append(priority)
+        self.version.append(0)
+        self.created.append(math.nan if created is None else created)
+        self.due.append(math.nan if due is None else due)
+        self.completed.append(math.nan)
+        self.queued.append(-1)
+        self.text_at.append(len(self.text))
+        self.text_len.append(len(blob))
+        self.title_len.append(title_len)
+        self.stamps.append(stamps)
+        self.text += blob
+        self.count += 1
+        return pos
+
+    def read(self, row):
+        """The row's Text fields as a plain tuple."""
+        at = self.text_at[row]
+        blob = self.text[at : at + self.text_len[row]].decode()
+        created, due, completed = STAMP_ENDS[self.stamps[row]]
+        title = completed + self.title_len[row]
+        return (
+            blob[:ID_LENGTH],
+            blob[ID_LENGTH:created] or None,
+            blob[created:due] or None,
+            blob[due:completed] or None,
+            blob[completed:title],
+            blob[title:],
+        )
+
+    def task_id(self, row):
+        at = self.text_at[row]
+        return self.text[at : at + ID_LENGTH].decode()
+
+    def title(self, row):
+        at = self.text_at[row] + STAMP_ENDS[self.stamps[row]][2]
+        # Titles are mostly ASCII, where the first title_len bytes are the title.
+        head = self.text[at : at + self.title_len[row]]
+        return head.decode() if head.isascii() else self.read(row)[4]
+
+    def rewrite(self, row, **changes):
+        """Replace some of the row's Text fields."""
+        blob, title_len, stamps = self._encode(Text(*self.read(row))._replace(**changes))
+        self.garbage += self.text_len[row]
+        self.text_at[row] = len(self.text)
+        self.text_len[row] = len(blob)
+        self.title_len[row] = title_len
+        self.stamps[row] = stamps
+        self.text += blob
+        if self.garbage > 1 << 20 and 2 * self.garbage > len(self.text):
+            self._compact()
+
+    def _compact(self):
+        text = bytearray()
+        for row, status in enumerate(self.status):
+            if status:
+                at = self.text_at[row]
+                self.text_at[row] = len(text)
+                text += self.text[at : at + self.text_len[row]]
+        self.text = text
+        self.garbage = 0
+
+    def remove(self, row):
+        self._release_slot(self.task_id(row))
+        self.status[row] = 0
+        self.queued[row] = -1
+        self.garbage += self.text_len[row]
+        self.text_len[row] = 0
+        self.count -= 1
+
+    def trim(self):
+        """Drop removed rows from the front of the table."""
+        drop = len(self.status) - len(self.status.lstrip(b"\0"))
+        if not drop:
+            return
+        for column in (
+            self.status,
+            self.priority,
+            self.version,
+            self.created,
+            self.due,
+            self.completed,
+            self.queued,
+            self.text_at,
+            self.text_len,
+            self.title_len,
+            self.stamps,
+        ):
+            del column[:drop]
+        self.start += drop
+
+    def rows(self, first=0):
+        """Rows still in the table from ``first`` on, in creation order."""
+        status = self.status
+        for row in range(max(first, 0), len(status)):
+            if status[row]:
+                yield row
+
+    def find(self, task_id):
+        """Position of the row holding canonical id ``task_id``, or None."""
+        slots, mask = self.slots, len(self.slots) - 1
+        key = task_id.encode()
+        i = hash(task_id) & mask
+        while (slot := slots[i]) != EMPTY:
+            if slot != DELETED:
+                at = self.text_at[slot - 1 - self.start]
+                if self.text[at : at + ID_LENGTH] == key:
+                    return slot - 1
+            i = (i + 1) & mask
+        return None
+
+    def _claim_slot(self, task_id, pos):
+        if 3 * (self.used + 1) > 2 * len(self.slots):
+            self._resize()
+        slots, mask = self.slots, len(self.slots) - 1
+        i = hash(task_id) & mask
+        while slots[i] > EMPTY:
+            i = (i + 1) & mask
+        if slots[i] == EMPTY:
+            self.used += 1
+        slots[i] = pos + 1
+
+    def _release_slot(self, task_id):
+        slots, mask = self.slots, len(self.slots) - 1
+        pos = self.find(task_id)
+        i = hash(task_id) & mask
+        while slots[i] != pos + 1:
+            i = (i + 1) & mask
+        slots[i] = DELETED
+
+    def _resize(self):
+        # Room for twice the live rows; deleted slots are dropped on the way.
+        size = 8
+        while size < 2 * (self.count + 1):
+            size *= 2
+        self.slots = array("q", [EMPTY]) * size
+        self.used = 0
+        for row in self.rows():
+            slots, mask = self.slots, size - 1
+            i = hash(self.task_id(row)) & mask
+            while slots[i] != EMPTY:
+                i = (i + 1) & mask
+            slots[i] = row + self.start + 1
+            self.used += 1
+
+
+class ChangeFeed:
+    """Versioned log of task changes with listeners.
+
+    Every recorded change bumps version and is appended to a bounded log;
+    epoch identifies this log so clients notice a restart.
+    """
+
+    def __init__(self, change_log_size=100_000):
+        self.version = 0
+        self.epoch = uuid.uuid4().hex
+        self._changes = deque(maxlen=change_log_size)
+        self._listeners = []
+
+    def _record(self, kind, data):
+        self.version += 1
+        change = {"version": self.version, "type": kind, "task": data}
+        self._changes.append(change)
+        for listener in self._listeners:
+            listener(change)
+
+    def add_listener(self, listener):
+        """Call ``listener(change)`` after every recorded change."""
+        self._listeners.append(listener)
+
+    def changes_since(self, version, limit=1000):
+        """Changes after ``version``, oldest first, at most ``limit`` of them.
+
+        Returns ``(changes, reset)``. ``reset`` is True when ``version`` is not
+        from this log (another epoch, or older than the retained window); the
+        caller must then resync from get-tasks and continue from self.version.
+        """
+        oldest = self._changes[0]["version"] if self._changes else self.version + 1
+        if version > self.version or version < oldest - 1:
+            return [], True
+        # Versions in the log are contiguous, so positions follow directly;
+        # indexing from the recent end keeps a caught-up client's poll O(changes).
+        start = version - oldest + 1
+        end = min(len(self._changes), start + limit)
+        return [self._changes[i - len(self._changes)] for i in range(start, end)], False
+
+
+class TaskDB(ChangeFeed):
+    # Seconds between checks for tasks to archive.
+    archive_every = 60.0
+
+    def __init__(self, storage=None, change_log_size=100_000, embedding=None, archive=None, archive_after=None):
+        super().__init__(change_log_size)
+        # Every task, as a row of the table. Public methods take and return
+        # string ids and plain dicts; positions are only handed out as the
+        # cursors of query_tasks().
+        self._table = TaskTable()
+        # Status <-> the code the table keeps, and how many tasks are in each.
+        self._statuses = [None, PENDING, IN_PROGRESS, DONE, CANCELLED]
+        self._codes = {status: code for code, status in enumerate(self._statuses) if status}
+        self._counts = Counter()
+        # Scheduler for next_task(): a binary heap of the positions of the
+        # pending tasks that are not blocked, ordered by _rank(). Each row
+        # knows its index in the heap, so a task leaving the schedule or
+        # changing its rank is fixed in place in O(log n).
+        self._heap = array("q")
+        # Lease expiry heap of (expires_ts, position, expires_iso) entries,
+        # invalidated lazily: an entry is live only while it is the one in
+        # _leases. Owners are kept apart, as a lease can outlive its expiry.
+        self._lease_heap = []
+        self._leases = {}
+        self._lease_owners = {}
+        self.clock = time.time
+        # Cold store for tasks finished more than archive_after seconds ago
+        # (never, if None).
+        self.archive = SegmentArchive() if archive is None else archive
+        self.archive_after = archive_after
+        self._next_archive = 0.0
+        # Finished tasks by completion time, for archiving and
+        # completed_tasks(): sorted completion times and the positions they
+        # belong to. Entries are invalidated lazily, like the lease heap's:
+        # one is live only while its task still has that completion time.
+        self._completed_times = array("d")
+        self._completed_positions = array("q")
+        # Dependency graph: position -> ids the task depends on, and reversed,
+        # task id -> ids of the tasks depending on it. Entries may name tasks
+        # not in the store (yet); those count as complete, and block their
+        # dependents once inserted unless done. _blocked counts, per position,
+        # the dependencies in the store that are not done yet; only unblocked
+        # tasks are scheduled.
+        self._depends_on = {}
+        self._dependents = {}
+        self._blocked = {}
+        # Inverted index over title and description for search_tasks(), and
+        # the embedding index for find_similar(). Both are built on first use:
+        # postings and vectors cost more memory than the tasks themselves.
+        self._search = None
+        self.embedding = embedding
+        self._vectors = None
+        self.storage = storage or MemoryStorage()
+        for data in self.storage.load():
+            self._load(data)
+        self._table.trim()
+
+    def _load(self, data):
+        if data.get("archived"):
+            pos = self._table.find(_task_id(data["id"]))
+            if pos is not None:
+                self._remove(pos)
+            return
+        incoming = _parse(data)
+        pos = self._table.find(incoming["id"])
+        if pos is None:
+            self._insert(incoming)
+            return
+        table = self._table
+        row = pos - table.start
+        self._retext(pos, incoming["title"], incoming["description"])
+        table.priority[row] = incoming["priority"]
+        self._set_due(pos, incoming["due_at"])
+        created = incoming["created_at"]
+        table.created[row] = math.nan if created is None else created
+        table.rewrite(row, created_at=to_iso(created))
+        table.version[row] = max(table.version[row], incoming["version"])
+        self._set_dependencies(pos, incoming["depends_on"])
+        self._move(pos, incoming["status"])
+        self._set_completed(pos, incoming["completed_at"])
+        self._set_lease(pos, incoming["lease_owner"], incoming["lease_expires_at"])
+        self._reschedule(pos)
+
+    def _persist(self, pos, kind):
+        self._table.version[pos - self._table.start] += 1
+        data = self._to_dict(pos)
+        self.storage.save(data)
+        self._record(kind, data)
+        if self.storage.wants_snapshot():
+            self.storage.snapshot(self._all())
+
+    def _persist_many(self, positions, kind):
+        self._persist_changes((pos, kind) for pos in positions)
+
+    def _persist_changes(self, changes):
+        """Save ``(position, kind)`` pairs in one storage write and record each change."""
+        rows = []
+        for pos, kind in changes:
+            self._table.version[pos - self._table.start] += 1
+            rows.append((self._to_dict(pos), kind))
+        self.storage.save_many([data for data, _ in rows])
+        for data, kind in rows:
+            self._record(kind, data)
+        if self.storage.wants_snapshot():
+            self.storage.snapshot(self._all())
+
+    def flush(self):
+        self.storage.flush()
+
+    def close(self):
+        self.storage.close()
+
+    def _to_dict(self, pos, fields=None):
+        return next(self._to_dicts((pos,), fields))
+
+    def _to_dicts(self, positions, fields=None):
+        """Yield tasks at ``positions`` in their string form, projected onto ``fields``.
+
+        TaskTable.read() inlined, with everything looked up once: this is
+        what every listing spends its time in.
+        """
+        table = self._table
+        start, text, text_at, text_len = table.start, table.text, table.text_at, table.text_len
+        stamps, title_len, status, statuses = table.stamps, table.title_len, table.status, self._statuses
+        priority, version = table.priority, table.version
+        leases, owners, depends_on = self._leases, self._lease_owners, self._depends_on
+        for pos in positions:
+            row = pos - start
+            at = text_at[row]
+            blob = text[at : at + text_len[row]].decode()
+            created, due, completed = STAMP_ENDS[stamps[row]]
+            title = completed + title_len[row]
+            lease = leases.get(pos)
+            data = {
+                "id": blob[:ID_LENGTH],
+                "title": blob[completed:title],
+                "description": blob[title:],
+                "status": statuses[status[row]],
+                "priority": priority[row],
+                "due_at": blob[created:due] or None,
+                "created_at": blob[ID_LENGTH:created] or None,
+                "lease_owner": owners.get(pos),
+                "lease_expires_at": lease and lease[2],
+                "version": version[row],
+                "completed_at": blob[due:completed] or None,
+                "depends_on": list(depends_on.get(pos, ())),
+            }
+            yield {f: data[f] for f in fields} if fields else data
+
+    def _all(self):
+        start = self._table.start
+        return self._to_dicts(row + start for row in self._table.rows())
+
+    def _status(self, pos):
+        return self._statuses[self._table.status[pos - self._table.start]]
+
+    def _code(self, status):
+        code = self._codes.get(status)
+        if code is None:
+            if len(self._statuses) > MAX_STATUS_CODE:
+                msg = f"Too many distinct statuses to add {status!r}"
+                raise ValueError(msg)
+            code = self._codes[status] = len(self._statuses)
+            self._statuses.append(status)
+        return code
+
+    def _insert(self, task):
+        status = task["status"]
+        text = Text(
+            task["id"], to_iso(task["created_at"]), to_iso(task["due_at"]), None, task["title"], task["description"]
+        )
+        pos = self._table.append(text, self._code(status), task["priority"], task["created_at"], task["due_at"])
+        self._table.version[pos - self._table.start] = task["version"]
+        self._counts[status] += 1
+        self._link(pos, task["id"], task["depends_on"])
+        if status != DONE:
+            self._block_dependents(task["id"], 1)
+        if status in TERMINAL:
+            self._set_completed(pos, task["completed_at"])
+        if self._search is not None:
+            self._search.add(pos, task["title"], task["description"])
+        self._embed(pos, task["title"], task["description"])
+        if task["lease_owner"] is not None or task["lease_expires_at"] is not None:
+            self._set_lease(pos, task["lease_owner"], task["lease_expires_at"])
+        self._reschedule(pos)
+        return pos
 
-    def list_tasks(self):
-        return list(self.tasks.values())
+    def _retext(self, pos, title, description):
+        row = pos - self._table.start
+        _, _, _, _, old_title, old_description = self._table.read(row)
+        if title == old_title and description == old_description:
+            return
+        if self._search is not None:
+            self._search.remove(pos, old_title, old_description)
+            self._search.add(pos, title, description)
+        self._table.rewrite(row, title=title, description=description)
+        self._embed(pos, title, description)
 
-    def add_task(self, title, description=""):
-        task_id = str(uuid.uuid4())
-        task = {"id": task_id, "title": title, "description": description, "status": "pending"}
-        self.tasks[task_id] = task
-        return task
+    def _embed(self, pos, title, description):
+        if self._vectors is not None:
+            self._vectors.update(pos, f"{title}\n{description}")
 
-    def set_status(self, task_id, status):
-        if task_id in self.tasks:
-            self.tasks[task_id]["status"] = status
-            return True
-        return False
+    def _lookup(self, task_id):
+        task_id = canonical_id(task_id)
+        return None if task_id is None else self._table.find(task_id)
+
+    def _check_version(self, pos, expected_version):
+        if expected_version is not None and expected_version != self._table.version[pos - self._table.start]:
+            raise VersionConflict(self._to_dict(pos), expected_version)
+
+    def _move(self, pos, status):
+        status = canonical_status(status)
+        old = self._status(pos)
+        if old == status:
+            return False
+        self._set_lease(pos, None, None)
+        self._table.status[pos - self._table.start] = self._code(status)
+        self._counts[old] -= 1
+        if not self._counts[old]:
+            del self._counts[old]
+        self._counts[status] += 1
+        if (old == DONE) != (status == DONE):
+            self._block_dependents(self._table.task_id(pos - self._table.start), 1 if old == DONE else -1)
+        self._set_completed(pos, None)
+        self._reschedule(pos)
+        return True
+
+    def _set_due(self, pos, due_at):
+        row = pos - self._table.start
+        self._table.due[row] = math.nan if due_at is None else due_at
+        self._table.rewrite(row, due_at=to_iso(due_at))
+
+    def _set_completed(self, pos, completed_at):
+        # Terminal tasks get a completion time (now, unless one is given)
+        # and an entry in the completion index; others lose theirs.
+        table = self._table
+        row = pos - table.start
+        if self._status(pos) not in TERMINAL:
+            if not math.isnan(table.completed[row]):
+                table.completed[row] = math.nan
+                table.rewrite(row, completed_at=None)
+            return
+        completed_at = self.clock() if completed_at is None else completed_at
+        if table.completed[row] == completed_at:
+            return
+        table.completed[row] = completed_at
+        table.rewrite(row, completed_at=to_iso(completed_at))
+        i = bisect_right(self._completed_times, completed_at)
+        self._completed_times.insert(i, completed_at)
+        self._completed_positions.insert(i, pos)
+        if len(self._completed_times) > 2 * (self._counts[DONE] + self._counts[CANCELLED]) + 64:
+            self._reindex_completed()
+
+    def _reindex_completed(self):
+        # Mostly stale entries: rebuild from the finished tasks in O(n log n).
+        table = self._table
+        finished = sorted(
+            (table.completed[row], row + table.start)
+            for row in table.rows()
+            if self._statuses[table.status[row]] in TERMINAL
+        )
+        self._completed_times = array("d", [completed_at for completed_at, _ in finished])
+        self._completed_positions = array("q", [pos for _, pos in finished])
+
+    def _finished(self, first, last):
+        """Yield live ``(index, position)`` entries of the completion index in ``[first, last)``."""
+        seen = set()
+        for i in range(first, last):
+            pos = self._completed_positions[i]
+            if pos not in seen and self._completed_at(pos) == self._completed_times[i]:
+                seen.add(pos)
+                yield i, pos
+
+    def _completed_at(self, pos):
+        # Completion time of a task still in the table, else None.
+        row = pos - self._table.start
+        if row < 0 or not self._table.status[row]:
+            return None
+        completed_at = self._table.completed[row]
+        return None if math.isnan(completed_at) else completed_at
+
+    def _remove(self, pos):
+        table = self._table
+        row = pos - table.start
+        status = self._status(pos)
+        self._counts[status] -= 1
+        if not self._counts[status]:
+            del self._counts[status]
+        self._dequeue(pos)
+        task_id, _, _, _, title, description = table.read(row)
+        self._unlink(pos, task_id)
+        self._set_lease(pos, None, None)
+        if self._search is not None:
+            self._search.remove(pos, title, description)
+        if self._vectors is not None:
+            self._vectors.remove(pos)
+        table.remove(row)
+
+    def _link(self, pos, task_id, depends_on):
+        if not depends_on:
+            return
+        self._depends_on[pos] = depends_on
+        blocked = 0
+        for dep in depends_on:
+            self._dependents.setdefault(dep, set()).add(task_id)
+            other = self._table.find(dep)
+            if other is not None and self._status(other) != DONE:
+                blocked += 1
+        if blocked:
+            self._blocked[pos] = blocked
+
+    def _unlink(self, pos, task_id):
+        for dep in self._depends_on.pop(pos, ()):
+            dependents = self._dependents[dep]
+            dependents.discard(task_id)
+            if not dependents:
+                del self._dependents[dep]
+        self._blocked.pop(pos, None)
+
+    def _set_dependencies(self, pos, depends_on):
+        if depends_on == self._depends_on.get(pos, ()):
+            return
+        task_id = self._table.task_id(pos - self._table.start)
+        self._unlink(pos, task_id)
+        self._link(pos, task_id, depends_on)
+        self._reschedule(pos)
+
+    def _block_dependents(self, task_id, delta):
+        # O(1) per dependent: adjust its count of unfinished dependencies and
+        # take it off or put it on the schedule when that crosses zero.
+        for dependent in self._dependents.get(task_id, ()):
+            pos = self._table.find(dependent)
+            blocked = self._blocked.get(pos, 0) + delta
+            if blocked:
+                self._blocked[pos] = blocked
+            else:
+                del self._blocked[pos]
+            if not blocked or blocked == delta == 1:
+                self._reschedule(pos)
+
+    def _check_dependencies(self, task_id, depends_on, planned=None):
+        """Raise ValueError unless every dependency exists and none leads back to ``task_id``.
+
+        ``planned`` maps ids to dependency lists about to replace the stored ones.
+        """
+        planned = planned or {}
+        for dep in depends_on:
+            if dep not in planned and self._table.find(dep) is None:
+                msg = f"Unknown dependency: {dep}"
+                raise ValueError(msg)
+        seen, stack = set(), list(depends_on)
+        while stack:
+            dep = stack.pop()
+            if dep == task_id:
+                msg = f"Dependency cycle through task {task_id}"
+                raise ValueError(msg)
+            if dep in seen:
+                continue
+            seen.add(dep)
+            if dep in planned:
+                stack.extend(planned[dep])
+            elif (pos := self._table.find(dep)) is not None:
+                stack.extend(self._depends_on.get(pos, ()))
+
+    def _rank(self, pos):
+        # Most urgent first: higher priority, then earliest due date (undated
+        # last), then oldest. The creation position makes ties deterministic.
+        table = self._table
+        row = pos - table.start
+        due, created = table.due[row], table.created[row]
+        return (-table.priority[row], UNDATED if math.isnan(due) else due, 0.0 if math.isnan(created) else created, pos)
+
+    def _sift_up(self, i):
+        heap, queued, start = self._heap, self._table.queued, self._table.start
+        pos = heap[i]
+        rank = self._rank(pos)
+        while i:
+            parent = (i - 1) >> 1
+            above = heap[parent]
+            if rank > self._rank(above):
+                break
+            heap[i] = above
+            queued[above - start] = i
+            i = parent
+        heap[i] = pos
+        queued[pos - start] = i
+        return i
+
+    def _sift_down(self, i):
+        heap, queued, start = self._heap, self._table.queued, self._table.start
+        pos = heap[i]
+        rank = self._rank(pos)
+        while (child := 2 * i + 1) < len(heap):
+            child_rank = self._rank(heap[child])
+            if child + 1 < len(heap) and (right := self._rank(heap[child + 1])) < child_rank:
+                child, child_rank = child + 1, right
+            if rank < child_rank:
+                break
+            heap[i] = heap[child]
+            queued[heap[i] - start] = i
+            i = child
+        heap[i] = pos
+        queued[pos - start] = i
+
+    def _reschedule(self, pos):
+        """Put a task on the schedule, move it, or take it off, to match its fields."""
+        row = pos - self._table.start
+        i = self._table.queued[row]
+        if self._table.status[row] == self._codes[PENDING] and pos not in self._blocked:
+            if i < 0:
+                self._heap.append(pos)
+                self._sift_up(len(self._heap) - 1)
+            else:
+                self._sift_down(self._sift_up(i))
+        elif i >= 0:
+            self._dequeue(pos)
+
+    def _dequeue(self, pos):
+        row = pos - self._table.start
+        i = self._table.queued[row]
+        if i < 0:
+            return
+        self._table.queued[row] = -1
+        last = self._heap.pop()
+        if i < len(self._heap):
+            self._heap[i] = last
+            self._sift_down(self._sift_up(i))
+
+    def _set_lease(self, pos, owner, expires_at):
+        if owner is None:
+            self._lease_owners.pop(pos, None)
+        else:
+            self._lease_owners[pos] = owner
+        if expires_at is None:
+            self._leases.pop(pos, None)
+            return
+        entry = (expires_at, pos, to_iso(expires_at))
+        self._leases[pos] = entry
+        heapq.heappush(self._lease_heap, entry)
+        if len(self._lease_heap) > 2 * len(self._leases) + 64:
+            self._lease_heap = list(self._leases.values())
+            heapq.heapify(self._lease_heap)
+
+    def expire_leases(self):
+        """Requeue in-progress tasks whose lease has run out.
+
+        Only looks at the head of the expiry heap, so it is cheap enough to
+        run before every read; returns the requeued tasks.
+        """
+        now = self.clock()
+        if self.archive_after is not None and now >= self._next_archive:
+            self._next_archive = now + self.archive_every
+            self.archive_completed()
+        expired = []
+        while self._lease_heap and self._lease_heap[0][0] <= now:
+            entry = heapq.heappop(self._lease_heap)
+            pos = entry[1]
+            if self._leases.get(pos) is not entry:
+                continue
+            self._move(pos, PENDING)
+            expired.append(pos)
+        if expired:
+            self._persist_many(expired, "status_changed")
+        return list(self._to_dicts(expired))
+
+    def next_expiry(self):
+        """Epoch time from which expire_leases() may have work to do, or None.
+
+        Lets a caller holding the store elsewhere (see sharding.py) skip
+        asking it to expire leases until then.
+        """
+        due = [self._lease_heap[0][0]] if self._lease_heap else []
+        if self.archive_after is not None:
+            due.append(self._next_archive)
+        return min(due, default=None)
+
+    def _scheduled(self):
+        """Yield positions of pending tasks in scheduling order without popping.
+
+        Walks the heap as a tree with a small frontier heap, so reading the
+        first k tasks costs O(k log k).
+        """
+        heap = self._heap
+        frontier = [(self._rank(heap[0]), 0)] if heap else []
+        while frontier:
+            _, i = heapq.heappop(frontier)
+            yield heap[i]
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (self._rank(heap[child]), child))
+
+    def list_tasks(self, status=None):
+        self.expire_leases()
+        return list(self._to_dicts(self._matching(status)))
+
+    def query_tasks(self, status=None, title=None, cursor=0, limit=None, fields=None):
+        """Filter and page tasks in creation order.
+
+        Returns ``(tasks, next_cursor)``; ``next_cursor`` is None once the
+        listing is exhausted. ``title`` is a case-insensitive substring match
+        and ``fields`` projects each returned task onto those keys.
+        """
+        self.expire_leases()
+        positions, next_cursor = self._page(status, title, cursor, limit)
+        return list(self._to_dicts(positions, fields)), next_cursor
+
+    def page_tasks(self, status=None, title=None, cursor=0, limit=None, fields=None):
+        """query_tasks() with each task's position and creation time.
+
+        Returns ``([(position, created_ts, task), ...], next_cursor)``, so
+        pages from several stores can be merged in creation order and each
+        store resumed where it stopped (see sharding.py).
+        """
+        self.expire_leases()
+        positions, next_cursor = self._page(status, title, cursor, limit)
+        created = [self._table.created[pos - self._table.start] for pos in positions]
+        tasks = self._to_dicts(positions, fields)
+        out = [
+            (pos, 0.0 if math.isnan(ts) else ts, task) for pos, ts, task in zip(positions, created, tasks, strict=True)
+        ]
+        return out, next_cursor
+
+    def _page(self, status, title, cursor, limit):
+        # Positions of up to ``limit`` matching tasks, and of the next one or None.
+        positions = list(islice(self._matching(status, title, cursor), None if limit is None else limit + 1))
+        if limit is not None and len(positions) > limit:
+            return positions[:limit], positions[limit]
+        return positions, None
+
+    def _matching(self, status=None, title=None, cursor=0):
+        """Yield positions of tasks passing query_tasks()' filters from position ``cursor`` on."""
+        table = self._table
+        first = max(int(cursor or 0) - table.start, 0)
+        if status is None:
+            rows = table.rows(first)
+        else:
+            code = self._codes.get(canonical_status(status))
+            rows = self._rows_with(code, first) if code else ()
+        needle = title.lower() if title else None
+        for row in rows:
+            if needle is not None and needle not in table.title(row).lower():
+                continue
+            yield row + table.start
+
+    def _rows_with(self, code, first):
+        # Skips between matches at memchr speed, so a rare status is cheap to list.
+        statuses = self._table.status
+        row = statuses.find(code, first)
+        while row >= 0:
+            yield row
+            row = statuses.find(code, row + 1)
+
+    def _accept(self, status):
+        # Filter on positions for the search indexes, or None for any status.
+        if status is None:
+            return None
+        code = self._codes.get(canonical_status(status))
+        table = self._table
+        return lambda pos: table.status[pos - table.start] == code
+
+    def search_tasks(self, query, status=None, limit=10):
+        """Tasks whose title or description match ``query``, best first.
+
+        Each task carries its relevance as ``score``; the first call indexes
+        every task, later calls only the ones written since.
+        """
+        self.expire_leases()
+        if self._search is None:
+            self._search = SearchIndex()
+            for row in self._table.rows():
+                _, _, _, _, title, description = self._table.read(row)
+                self._search.add(row + self._table.start, title, description)
+        hits = self._search.search(query, limit, self._accept(status))
+        return [{**self._to_dict(pos), "score": round(score, 4)} for pos, score in hits]
+
+    def find_similar(self, text, status=None, limit=5):
+        """Tasks whose title and description are closest in meaning to ``text``.
+
+        Each task carries its cosine ``similarity``; the first call embeds
+        every task, later calls only the ones written since.
+        """
+        self.expire_leases()
+        if self._vectors is None:
+            self._vectors = VectorIndex(self.embedding)
+            for row in self._table.rows():
+                _, _, _, _, title, description = self._table.read(row)
+                self._embed(row + self._table.start, title, description)
+        hits = self._vectors.search(text, limit, self._accept(status))
+        return [{**self._to_dict(pos), "similarity": round(score, 4)} for pos, score in hits]
+
+    def archive_completed(self):
+        """Move tasks finished more than archive_after seconds ago to the archive.
+
+        Runs by itself every archive_every seconds, on the next call that
+        expires leases. Each archived task is recorded as an ``archived``
+        change; returns how many were archived.
+        """
+        if self.archive_after is None:
+            return 0
+        cutoff = self.clock() - self.archive_after
+        times, positions = self._completed_times, self._completed_positions
+        end = bisect_right(times, cutoff)
+        due, held = [], []
+        for i, pos in self._finished(0, end):
+            task_id = self._table.task_id(pos - self._table.start)
+            if self._status(pos) != DONE and task_id in self._dependents:
+                # A cancelled dependency still blocks; dropping it would release
+                # its dependents. It stays indexed, for once they are gone.
+                held.append(i)
+            else:
+                due.append(pos)
+        times[:end] = array("d", [times[i] for i in held])
+        positions[:end] = array("q", [positions[i] for i in held])
+        if not due:
+            return 0
+        rows = list(self._to_dicts(due))
+        # Archived first, so a crash in between leaves a task in both places, never in neither.
+        self.archive.append(rows)
+        self.storage.delete_many([row["id"] for row in rows])
+        for pos in due:
+            self._remove(pos)
+        self._table.trim()
+        for row in rows:
+            self._record("archived", row)
+        return len(rows)
+
+    def completed_tasks(self, after=None, before=None, limit=100):
+        """Tasks that reached a terminal status between ``after`` and ``before``.
+
+        Both bounds are inclusive ISO 8601 UTC strings and optional. Covers
+        finished tasks still in the store and archived ones, oldest
+        completion first.
+        """
+        self.expire_leases()
+        lo, hi = from_iso(after), from_iso(before)
+        found = {task["id"]: task for task in self.archive.query(lo, hi, limit)}
+        times = self._completed_times
+        first = 0 if lo is None else bisect_left(times, lo)
+        last = len(times) if hi is None else bisect_right(times, hi)
+        # The index is in completion order, so the first ``limit`` live entries are the oldest.
+        live = [pos for _, pos in islice(self._finished(first, last), limit)]
+        for task in self._to_dicts(live):
+            found[task["id"]] = task
+        return heapq.nsmallest(limit, found.values(), key=lambda task: task["completed_at"])
+
+    def count_by_status(self):
+        return dict(self._counts)
+
+    def _new_task(  # noqa: PLR0913, PLR0917 - add-task's fields plus a preset id
+        self, title, description="", priority=0, due_at=None, task_id=None, depends_on=None
+    ):
+        return {
+            "id": str(uuid.uuid4()) if task_id is None else _task_id(task_id),
+            "title": title,
+            "description": description,
+            "status": PENDING,
+            "priority": _priority(priority),
+            "due_at": from_iso(due_at),
+            "created_at": self.clock(),
+            "depends_on": _dependency_ids(depends_on),
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "version": 0,
+            "completed_at": None,
+        }
+
+    def add_task(  # noqa: PLR0913, PLR0917 - add-task's fields plus a preset id
+        self, title, description="", priority=0, due_at=None, task_id=None, depends_on=None
+    ):
+        """Add a pending task; ``task_id`` presets its id (a new UUID by default).
+
+        ``depends_on`` lists ids of existing tasks that must be done before
+        next_task() offers this one; ValueError if one is unknown.
+        """
+        task = self._new_task(title, description, priority, due_at, task_id, depends_on)
+        self._check_dependencies(task["id"], task["depends_on"])
+        pos = self._insert(task)
+        self._persist(pos, "created")
+        return self._to_dict(pos)
+
+    def add_tasks(self, items):
+        """Add many tasks in one storage write.
+
+        Each item is a mapping of add_task() keyword arguments; dependencies
+        may also name tasks earlier or later in the same batch. All items are
+        checked before any is added.
+        """
+        tasks = [self._new_task(**item) for item in items]
+        planned = {task["id"]: task["depends_on"] for task in tasks}
+        for task in tasks:
+            self._check_dependencies(task["id"], task["depends_on"], planned)
+        positions = [self._insert(task) for task in tasks]
+        self._persist_many(positions, "created")
+        return list(self._to_dicts(positions))
+
+    def import_tasks(self, rows):
+        """Insert or replace many tasks in one storage write.
+
+        Rows are task dicts as produced by task_io.normalize(): only title is
+        required. A row without an id gets a new one, and a row whose id
+        already exists replaces that task. Dependencies may name tasks in the
+        store or in ``rows``; ValueError before anything is written if one is
+        unknown or they form a cycle. Returns ``(created, updated)``.
+        """
+        created, updated = {}, {}
+        for data in self._prepare_import(rows):
+            task_id = _task_id(data["id"])
+            if self._table.find(task_id) is not None and task_id not in created:
+                updated[task_id] = None
+            else:
+                created[task_id] = None
+            self._load(data)
+        changes = [(self._table.find(task_id), "created") for task_id in created]
+        changes += [(self._table.find(task_id), "updated") for task_id in updated]
+        if changes:
+            self._persist_changes(changes)
+        return len(created), len(updated)
+
+    def check_import(self, rows):
+        """Raise ValueError if import_tasks(rows) would, without changing anything."""
+        self._prepare_import(rows)
+
+    def _prepare_import(self, rows):
+        # Fill in defaults and check dependencies, without changing anything.
+        defaults = {"description": "", "status": PENDING, "priority": 0, "due_at": None}
+        batch = []
+        for row in rows:
+            data = {**defaults, **row}
+            data.setdefault("id", str(uuid.uuid4()))
+            data.setdefault("created_at", to_iso(self.clock()))
+            _priority(data["priority"])
+            batch.append(data)
+        planned = {_task_id(data["id"]): _dependency_ids(data.get("depends_on")) for data in batch}
+        for task_id, depends_on in planned.items():
+            self._check_dependencies(task_id, depends_on, planned)
+        return batch
+
+    def set_status(self, task_id, status, expected_version=None):
+        """Move a task to ``status``; False if there is no such task.
+
+        With ``expected_version``, raises VersionConflict unless the task is
+        still at that version.
+        """
+        pos = self._lookup(task_id)
+        if pos is None:
+            return False
+        self._check_version(pos, expected_version)
+        if self._move(pos, status):
+            self._persist(pos, "status_changed")
+        return True
+
+    def set_statuses(self, updates):
+        """Apply many ``(task_id, status)`` pairs in one storage write.
+
+        An update may carry a third item, the expected version; if any task
+        is not at its expected version, VersionConflict is raised and nothing
+        is applied. Returns one bool per update, False for unknown task ids.
+        """
+        # Pad each update to (task_id, status, expected_version).
+        updates = [(*update, None)[:3] for update in updates]
+        positions = [self._lookup(task_id) for task_id, _, _ in updates]
+        for pos, (_, _, expected_version) in zip(positions, updates, strict=True):
+            if pos is not None:
+                self._check_version(pos, expected_version)
+        results, changed = [], {}
+        for pos, (_, status, _) in zip(positions, updates, strict=True):
+            results.append(pos is not None)
+            if pos is not None and self._move(pos, status):
+                changed[pos] = None
+        if changed:
+            self._persist_many(changed, "status_changed")
+        return results
 
     def get_task(self, task_id):
-        return self.tasks.get(task_id, {})
-
-    def next_task(self):
-        for t in self.tasks.values():
-            if t["status"] == "pending":
-                return t
-        return {}
-
-    def update_task(self, task_id, title=None, description=None):
-        if task_id in self.tasks:
-            if title is not None:
-                self.tasks[task_id]["title"] = title
-            if description is not None:
-                self.tasks[task_id]["description"] = description
-            return self.tasks[task_id]
-        return {}
+        self.expire_leases()
+        pos = self._lookup(task_id)
+        return {} if pos is None else self._to_dict(pos)
+
+    def get_tasks(self, task_ids):
+        self.expire_leases()
+        return [{} if pos is None else self._to_dict(pos) for pos in map(self._lookup, task_ids)]
+
+    def _pick(self, min_priority=None, due_before=None):
+        due_before = from_iso(due_before)
+        table = self._table
+        for pos in self._scheduled():
+            row = pos - table.start
+            if min_priority is not None and table.priority[row] < min_priority:
+                # Scheduling order is by priority first: nothing later qualifies.
+                break
+            # NaN (undated) compares false, so undated tasks never qualify.
+            if due_before is not None and not table.due[row] <= due_before:
+                continue
+            return pos
+        return None
+
+    def next_task(self, min_priority=None, due_before=None):
+        """Most urgent pending task, optionally with at least ``min_priority``
+        and/or due no later than ``due_before`` (an ISO 8601 UTC string)."""
+        self.expire_leases()
+        pos = self._pick(min_priority, due_before)
+        return {} if pos is None else self._to_dict(pos)
+
+    def claim_next(self, owner, ttl, min_priority=None, due_before=None):
+        """Atomically move the next task to in_progress under a lease.
+
+        The lease lasts ``ttl`` seconds unless renewed; once it expires the
+        task goes back to pending. Returns the claimed task or {}.
+        """
+        self.expire_leases()
+        pos = self._pick(min_priority, due_before)
+        if pos is None:
+            return {}
+        self._move(pos, IN_PROGRESS)
+        self._set_lease(pos, owner, self.clock() + ttl)
+        self._persist(pos, "status_changed")
+        return self._to_dict(pos)
+
+    def renew_lease(self, task_id, owner, ttl):
+        """Extend ``owner``'s lease on a task by ``ttl`` seconds from now.
+
+        Returns the task, or {} if ``owner`` does not hold a live lease on it.
+        """
+        self.expire_leases()
+        pos = self._lookup(task_id)
+        if pos is None or self._lease_owners.get(pos) != owner or pos not in self._leases:
+            return {}
+        self._set_lease(pos, owner, self.clock() + ttl)
+        self._persist(pos, "updated")
+        return self._to_dict(pos)
+
+    def update_task(  # noqa: PLR0913, PLR0917 - one parameter per field update-task takes
+        self,
+        task_id,
+        title=None,
+        description=None,
+        status=None,
+        priority=None,
+        due_at=None,
+        expected_version=None,
+        depends_on=None,
+    ):
+        """Change the given fields of a task; {} if there is no such task.
+
+        ``depends_on`` replaces the task's dependencies (``[]`` clears them);
+        ValueError if one is unknown or would close a cycle. With
+        ``expected_version``, raises VersionConflict unless the task is still
+        at that version.
+        """
+        pos = self._lookup(task_id)
+        if pos is None:
+            return {}
+        self._check_version(pos, expected_version)
+        table = self._table
+        row = pos - table.start
+        if depends_on is not None:
+            depends_on = _dependency_ids(depends_on)
+            self._check_dependencies(table.task_id(row), depends_on)
+            self._set_dependencies(pos, depends_on)
+        _, _, _, _, old_title, old_description = table.read(row)
+        self._retext(
+            pos,
+            old_title if title is None else title,
+            old_description if description is None else description,
+        )
+        if priority is not None:
+            table.priority[row] = _priority(priority)
+        due_ts = from_iso(due_at)
+        if due_ts is not None and due_ts != table.due[row]:
+            self._set_due(pos, due_ts)
+        moved = status is not None and self._move(pos, status)
+        self._reschedule(pos)
+        self._persist(pos, "status_changed" if moved else "updated")
+        return self._to_dict(pos)
+
+
+def _locked(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class ThreadSafeTaskDB(TaskDB):
+    """TaskDB that can be shared between threads.
+
+    Every public method runs under one re-entrant lock, so each call is
+    atomic and all calls take effect in a single order (the order of their
+    change-log versions). Striping by task would not help: every write also
+    touches the shared table, status counts, scheduler heap and change log,
+    and even reads expire leases. Listeners run under the lock, in version
+    order.
+
+    A single asyncio event loop does not need this: TaskDB methods never
+    await, so coroutines can't interleave inside one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._lock = threading.RLock()
+        super().__init__(*args, **kwargs)
+
+    add_listener = _locked(TaskDB.add_listener)
+    changes_since = _locked(TaskDB.changes_since)
+    flush = _locked(TaskDB.flush)
+    close = _locked(TaskDB.close)
+    expire_leases = _locked(TaskDB.expire_leases)
+    next_expiry = _locked(TaskDB.next_expiry)
+    list_tasks = _locked(TaskDB.list_tasks)
+    query_tasks = _locked(TaskDB.query_tasks)
+    page_tasks = _locked(TaskDB.page_tasks)
+    search_tasks = _locked(TaskDB.search_tasks)
+    find_similar = _locked(TaskDB.find_similar)
+    count_by_status = _locked(TaskDB.count_by_status)
+    archive_completed = _locked(TaskDB.archive_completed)
+    completed_tasks = _locked(TaskDB.completed_tasks)
+    add_task = _locked(TaskDB.add_task)
+    add_tasks = _locked(TaskDB.add_tasks)
+    import_tasks = _locked(TaskDB.import_tasks)
+    check_import = _locked(TaskDB.check_import)
+    set_status = _locked(TaskDB.set_status)
+    set_statuses = _locked(TaskDB.set_statuses)
+    get_task = _locked(TaskDB.get_task)
+    get_tasks = _locked(TaskDB.get_tasks)
+    next_task = _locked(TaskDB.next_task)
+    claim_next = _locked(TaskDB.claim_next)
+    renew_lease = _locked(TaskDB.renew_lease)
+    update_task = _locked(TaskDB.update_task)
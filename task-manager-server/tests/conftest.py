@@ -0,0 +1,18 @@
+"""The MCP server module, loaded fresh over an in-memory TaskDB for each test."""
+
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+SERVER = Path(__file__).parent.parent / "task-manager.py"
+
+
+@pytest.fixture
+def server(monkeypatch):
+    for name in ("TASK_DB_BACKEND", "TASK_DB_PATH", "TASK_DB_SHARDS", "TASK_EMBEDDING", "TASK_ARCHIVE_AFTER"):
+        monkeypatch.delenv(name, raising=False)
+    spec = importlib.util.spec_from_file_location("task_manager", SERVER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
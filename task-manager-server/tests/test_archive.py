@@ -0,0 +1,128 @@
+"""SegmentArchive round trips and bounded queries, and archival from TaskDB."""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from archive import SegmentArchive
+from tasks_db import TaskDB
+
+
+def task(i, completed):
+    return {
+        "id": f"00000000-0000-0000-0000-{i:012d}",
+        "title": f"Task {i}",
+        "status": "done",
+        "completed_at": datetime.fromtimestamp(completed, timezone.utc).isoformat(),
+    }
+
+
+def fill(archive, blocks=10, per_block=50):
+    # Blocks of consecutive completion times, one second apart.
+    tasks = [task(i, 1_000 + i) for i in range(blocks * per_block)]
+    for start in range(0, len(tasks), per_block):
+        archive.append(tasks[start : start + per_block])
+    return tasks
+
+
+def count_reads(archive, monkeypatch):
+    reads = []
+    read = archive._read  # noqa: SLF001 - counting decompressed blocks
+
+    def counted(block):
+        reads.append(block)
+        return read(block)
+
+    monkeypatch.setattr(archive, "_read", counted)
+    return reads
+
+
+def test_round_trip_through_segment_files(tmp_path):
+    tasks = fill(SegmentArchive(tmp_path))
+    reopened = SegmentArchive(tmp_path)
+    assert reopened.count() == len(tasks)
+    assert reopened.query() == tasks
+    assert reopened.query(1_100, 1_149) == tasks[100:150]
+
+
+def test_torn_index_entry_is_dropped_on_open(tmp_path):
+    tasks = fill(SegmentArchive(tmp_path), blocks=2)
+    with (tmp_path / "index.ndjson").open("a") as f:
+        f.write("[1, 2, 3, 0, 9")
+    assert SegmentArchive(tmp_path).query() == tasks
+
+
+@pytest.mark.parametrize("directory", [None, "dir"])
+def test_limit_stops_reading_blocks(directory, tmp_path, monkeypatch):
+    archive = SegmentArchive(tmp_path if directory else None)
+    tasks = fill(archive)
+    reads = count_reads(archive, monkeypatch)
+    assert archive.query(limit=75) == tasks[:75]
+    assert len(reads) == 2
+    reads.clear()
+    assert archive.query(after=1_210, limit=20) == tasks[210:230]
+    assert len(reads) == 1
+
+
+def test_limit_with_overlapping_blocks_keeps_the_earliest():
+    archive = SegmentArchive()
+    early, late = [task(i, 1_000 + 2 * i) for i in range(20)], [task(100 + i, 1_001 + 2 * i) for i in range(20)]
+    archive.append(early)
+    archive.append(late)
+    merged = sorted(early + late, key=lambda t: t["completed_at"])
+    assert archive.query(limit=10) == merged[:10]
+
+
+def test_task_archived_twice_is_returned_once():
+    archive = SegmentArchive()
+    first = task(1, 1_000)
+    archive.append([first, task(2, 1_001)])
+    archive.append([{**first, "title": "again"}])
+    assert [t["title"] for t in archive.query(limit=1)] == ["again"]
+    assert len(archive.query()) == 2
+
+
+def test_tasks_marked_completed_are_archived():
+    db = TaskDB(archive_after=60)
+    now = 10_000.0
+    db.clock = lambda: now
+    done = db.add_task("finished")
+    db.add_task("open")
+    db.set_status(done["id"], "completed")
+    now += 61
+    assert db.archive_completed() == 1
+    assert [t["title"] for t in db.list_tasks()] == ["open"]
+    assert [t["title"] for t in db.completed_tasks()] == ["finished"]
+
+
+def test_cancelled_dependency_is_archived_once_its_dependents_are_gone():
+    db = TaskDB(archive_after=60)
+    now = 10_000.0
+    db.clock = lambda: now
+    blocker = db.add_task("blocker")
+    waiting = db.add_task("waiting", depends_on=[blocker["id"]])
+    db.set_status(blocker["id"], "cancelled")
+    now += 61
+    assert db.archive_completed() == 0
+    db.update_task(waiting["id"], depends_on=[])
+    now += 1
+    assert db.archive_completed() == 1
+    assert [t["title"] for t in db.list_tasks()] == ["waiting"]
+
+
+def test_completed_tasks_is_bounded_by_completion_time():
+    db = TaskDB()
+    now = 10_000.0
+    db.clock = lambda: now
+    ids = [db.add_task(f"Task {i}")["id"] for i in range(6)]
+    for task_id in ids:
+        now += 10
+        db.set_status(task_id, "done")
+    db.set_status(ids[2], "pending")
+
+    def iso(ts):
+        return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+    found = db.completed_tasks(after=iso(10_020), before=iso(10_050))
+    assert [t["title"] for t in found] == ["Task 1", "Task 3", "Task 4"]
+    assert [t["title"] for t in db.completed_tasks(limit=2)] == ["Task 0", "Task 1"]
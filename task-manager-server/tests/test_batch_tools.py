@@ -0,0 +1,65 @@
+"""The add-tasks, set-task-statuses and get-tasks-by-ids tools: many tasks per call, one storage write."""
+
+import pytest
+from mcp.server.fastmcp.exceptions import ToolError
+
+
+async def call(server, tool, arguments):
+    _, result = await server.mcp.call_tool(tool, {"input": arguments})
+    return result
+
+
+@pytest.fixture
+def writes(server, monkeypatch):
+    # Storage writes the tools make, as (method, task count) pairs.
+    calls = []
+    storage = server.db.storage
+    monkeypatch.setattr(storage, "save", lambda _task: calls.append(("save", 1)))
+    monkeypatch.setattr(storage, "save_many", lambda tasks: calls.append(("save_many", len(tasks))))
+    return calls
+
+
+async def test_add_tasks_creates_all_in_one_write(server, writes):
+    result = await call(server, "add-tasks", {"tasks": [{"title": f"Task {i}", "priority": i} for i in range(5)]})
+    assert [(task["title"], task["priority"]) for task in result["tasks"]] == [(f"Task {i}", i) for i in range(5)]
+    assert writes == [("save_many", 5)]
+
+    found = await call(server, "get-tasks-by-ids", {"task_ids": [result["tasks"][1]["id"], "missing"]})
+    assert found["tasks"][0]["title"] == "Task 1"
+    assert found["tasks"][1] is None
+
+
+async def test_set_task_statuses_reports_each_update(server, writes):
+    tasks = (await call(server, "add-tasks", {"tasks": [{"title": "a"}, {"title": "b"}]}))["tasks"]
+    writes.clear()
+    updates = [
+        {"task_id": tasks[0]["id"], "status": "done"},
+        {"task_id": "missing", "status": "done"},
+        {"task_id": tasks[1]["id"], "status": "in_progress"},
+    ]
+    result = await call(server, "set-task-statuses", {"updates": updates})
+    assert [r["success"] for r in result["results"]] == [True, False, True]
+    assert "conflict" not in result
+    assert writes == [("save_many", 2)]
+    assert [t["status"] for t in server.db.get_tasks([t["id"] for t in tasks])] == ["done", "in_progress"]
+
+
+async def test_set_task_statuses_changes_nothing_on_a_conflict(server, writes):
+    tasks = (await call(server, "add-tasks", {"tasks": [{"title": "a"}, {"title": "b"}]}))["tasks"]
+    writes.clear()
+    updates = [
+        {"task_id": tasks[0]["id"], "status": "done", "expected_version": tasks[0]["version"]},
+        {"task_id": tasks[1]["id"], "status": "done", "expected_version": tasks[1]["version"] + 1},
+    ]
+    result = await call(server, "set-task-statuses", {"updates": updates})
+    assert [r["success"] for r in result["results"]] == [False, False]
+    assert result["conflict"]["id"] == tasks[1]["id"]
+    assert writes == []
+    assert {t["status"] for t in server.db.get_tasks([t["id"] for t in tasks])} == {"pending"}
+
+
+async def test_batches_are_bounded(server):
+    with pytest.raises(ToolError, match="1000"):
+        await call(server, "add-tasks", {"tasks": [{"title": "x"}] * 1001})
+    with pytest.raises(ToolError):
+        await call(server, "set-task-statuses", {"updates": []})
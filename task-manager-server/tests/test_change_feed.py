@@ -0,0 +1,47 @@
+"""The tasks://changes resource: subscriptions, update notifications and the since feed."""
+
+import json
+
+import anyio
+import pytest
+from mcp import types
+from mcp.shared.exceptions import McpError
+from mcp.shared.memory import create_connected_server_and_client_session
+from pydantic import AnyUrl
+
+
+async def test_subscribers_are_notified_after_a_write(server):
+    updated = []
+    received = anyio.Event()
+
+    async def on_message(message):
+        if isinstance(message, types.ServerNotification) and isinstance(
+            message.root, types.ResourceUpdatedNotification
+        ):
+            updated.append(str(message.root.params.uri))
+            received.set()
+
+    async with create_connected_server_and_client_session(
+        server.mcp._mcp_server,  # noqa: SLF001 - the low-level server behind FastMCP
+        message_handler=on_message,
+    ) as client:
+        assert client.get_server_capabilities().resources.subscribe is True
+        await client.subscribe_resource(AnyUrl(server.CHANGES_URI))
+        await client.call_tool("add-task", {"input": {"title": "Write the report"}})
+        with anyio.fail_after(5):
+            await received.wait()
+    assert updated == [server.CHANGES_URI]
+
+
+async def test_changes_since_reads_the_feed_and_rejects_bad_versions(server):
+    async with create_connected_server_and_client_session(
+        server.mcp._mcp_server,  # noqa: SLF001 - the low-level server behind FastMCP
+    ) as client:
+        await client.call_tool("add-task", {"input": {"title": "Write the report"}})
+        result = await client.read_resource(AnyUrl("tasks://changes/0"))
+        feed = json.loads(result.contents[0].text)
+        assert feed["version"] == 1
+        assert [change["task"]["title"] for change in feed["changes"]] == ["Write the report"]
+
+        with pytest.raises(McpError, match="Not a change-feed version"):
+            await client.read_resource(AnyUrl("tasks://changes/abc"))
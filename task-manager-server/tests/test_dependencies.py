@@ -0,0 +1,69 @@
+"""Dependency ready-set: which pending tasks next_task() and claim_next() may hand out."""
+
+from tasks_db import DONE, TaskDB
+
+
+def ready(db):
+    # Titles of the tasks claim_next() hands out, in order, until none is ready.
+    out = []
+    while task := db.claim_next("probe", ttl=60):
+        out.append(task["title"])
+    return out
+
+
+def test_blocked_tasks_wait_for_their_dependencies():
+    db = TaskDB()
+    design = db.add_task("design", priority=1)
+    build = db.add_task("build", priority=5, depends_on=[design["id"]])
+    db.add_task("ship", priority=9, depends_on=[build["id"]])
+    db.add_task("docs")
+    assert db.next_task()["title"] == "design"
+
+    db.set_status(design["id"], DONE)
+    assert db.next_task()["title"] == "build"
+
+    # Reopening a dependency blocks its dependents again.
+    db.set_status(design["id"], "pending")
+    assert db.next_task()["title"] == "design"
+
+
+def test_ready_set_after_every_dependency_is_done():
+    db = TaskDB()
+    a = db.add_task("a")
+    b = db.add_task("b")
+    db.add_task("needs a and b", priority=5, depends_on=[a["id"], b["id"]])
+    db.set_status(a["id"], DONE)
+    assert db.next_task()["title"] == "b"
+    db.set_status(b["id"], DONE)
+    assert ready(db) == ["needs a and b"]
+
+
+def test_cancelled_dependency_keeps_dependents_blocked():
+    db = TaskDB()
+    a = db.add_task("a")
+    db.add_task("after a", priority=5, depends_on=[a["id"]])
+    db.set_status(a["id"], "cancelled")
+    assert db.next_task() == {}
+
+
+def test_completed_is_accepted_as_done():
+    # client.py marks tasks finished with "completed".
+    db = TaskDB()
+    a = db.add_task("a")
+    b = db.add_task("b")
+    db.add_task("after a", priority=5, depends_on=[a["id"]])
+    db.add_task("after b", priority=4, depends_on=[b["id"]])
+
+    assert db.set_status(a["id"], "completed")
+    assert db.get_task(a["id"])["status"] == DONE
+    assert db.get_task(a["id"])["completed_at"] is not None
+    assert db.set_statuses([(b["id"], "completed")]) == [True]
+    assert db.count_by_status() == {"pending": 2, DONE: 2}
+    assert [task["title"] for task in db.list_tasks("completed")] == ["a", "b"]
+    assert ready(db) == ["after a", "after b"]
+
+
+def test_imported_completed_rows_are_done():
+    db = TaskDB()
+    db.import_tasks([{"title": "old", "status": "completed"}])
+    assert [task["status"] for task in db.list_tasks()] == [DONE]
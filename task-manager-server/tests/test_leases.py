@@ -0,0 +1,62 @@
+"""Leases from claim_next(): expiry requeues the task, renewal by its owner keeps it."""
+
+from tasks_db import DONE, TaskDB
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def claimed_db():
+    db = TaskDB()
+    db.clock = clock = Clock()
+    task = db.add_task("work")
+    assert db.claim_next("alice", ttl=10)["id"] == task["id"]
+    return db, clock, task["id"]
+
+
+def test_an_expired_lease_requeues_the_task():
+    db, clock, task_id = claimed_db()
+    clock.now += 9.9
+    assert db.expire_leases() == []
+    assert db.get_task(task_id)["lease_owner"] == "alice"
+
+    clock.now += 0.1
+    [expired] = db.expire_leases()
+    assert expired["id"] == task_id
+    assert expired["status"] == "pending"
+    assert expired["lease_owner"] is None
+    assert expired["lease_expires_at"] is None
+    # The next worker can take it, and the old owner can no longer renew.
+    assert db.claim_next("bob", ttl=10)["id"] == task_id
+    assert db.renew_lease(task_id, "alice", ttl=10) == {}
+
+
+def test_renewal_by_the_owner_pushes_expiry_back():
+    db, clock, task_id = claimed_db()
+    assert db.renew_lease(task_id, "bob", ttl=60) == {}
+    # Renew well past the lease heap's compaction threshold; only the latest expiry counts.
+    for _ in range(200):
+        clock.now += 5
+        renewed = db.renew_lease(task_id, "alice", ttl=10)
+        assert renewed["status"] == "in_progress"
+    # A lower bound: the head of the expiry heap may be a superseded lease.
+    assert db.next_expiry() <= clock.now + 10
+
+    clock.now += 9
+    assert db.expire_leases() == []
+    clock.now += 1
+    assert [task["id"] for task in db.expire_leases()] == [task_id]
+
+
+def test_finishing_a_task_ends_its_lease():
+    db, clock, task_id = claimed_db()
+    db.set_status(task_id, DONE)
+    clock.now += 60
+    assert db.expire_leases() == []
+    assert db.get_task(task_id)["status"] == DONE
+    assert db.renew_lease(task_id, "alice", ttl=10) == {}
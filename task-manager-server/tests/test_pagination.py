@@ -0,0 +1,72 @@
+"""Cursor pagination in query_tasks() and the get-tasks tool."""
+
+import json
+from itertools import chain
+
+from tasks_db import DONE, TaskDB
+
+
+def all_pages(db, limit, **filters):
+    pages, cursor = [], 0
+    while True:
+        page, cursor = db.query_tasks(cursor=cursor, limit=limit, **filters)
+        pages.append([task["title"] for task in page])
+        if cursor is None:
+            return pages
+
+
+def test_pages_cover_every_task_once_in_creation_order():
+    db = TaskDB()
+    titles = [f"Task {i}" for i in range(10)]
+    db.add_tasks({"title": title} for title in titles)
+    pages = all_pages(db, limit=4)
+    assert [len(page) for page in pages] == [4, 4, 2]
+    assert list(chain.from_iterable(pages)) == titles
+    # An exact multiple of the limit ends without an empty page.
+    assert [len(page) for page in all_pages(db, limit=5)] == [5, 5]
+
+
+def test_filters_and_fields_apply_within_pages():
+    db = TaskDB()
+    for i in range(12):
+        task = db.add_task(f"{'Report' if i % 2 else 'Email'} {i}")
+        if i % 3 == 0:
+            db.set_status(task["id"], DONE)
+    pages = all_pages(db, limit=2, status="pending", title="report")
+    assert list(chain.from_iterable(pages)) == ["Report 1", "Report 5", "Report 7", "Report 11"]
+    page, cursor = db.query_tasks(limit=1, fields=["id", "title"])
+    assert list(page[0]) == ["id", "title"]
+    assert cursor is not None
+
+
+def test_cursors_survive_writes_and_archiving_between_pages():
+    db = TaskDB(archive_after=60)
+    now = 10_000.0
+    db.clock = lambda: now
+    tasks = [db.add_task(f"Task {i}") for i in range(6)]
+    first, cursor = db.query_tasks(limit=3)
+    assert [task["title"] for task in first] == ["Task 0", "Task 1", "Task 2"]
+
+    # The first page's tasks are archived away and a new task arrives mid-listing.
+    for task in tasks[:4]:
+        db.set_status(task["id"], DONE)
+    now += 61
+    assert db.archive_completed() == 4
+    db.add_task("Task 6")
+    rest, cursor = db.query_tasks(cursor=cursor, limit=3)
+    assert [task["title"] for task in rest] == ["Task 4", "Task 5", "Task 6"]
+    assert cursor is None
+
+
+async def test_get_tasks_tool_pages_with_next_cursor(server):
+    server.db.add_tasks({"title": f"Task {i}"} for i in range(5))
+    seen, cursor = [], None
+    while True:
+        arguments = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+        _, result = await server.mcp.call_tool("get-tasks", {"input": arguments})
+        seen.append([task["title"] for task in result["tasks"]])
+        # The cursor goes back and forth as JSON, as it would from a client.
+        cursor = json.loads(json.dumps(result["next_cursor"]))
+        if cursor is None:
+            break
+    assert seen == [["Task 0", "Task 1"], ["Task 2", "Task 3"], ["Task 4"]]
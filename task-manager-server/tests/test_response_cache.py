@@ -0,0 +1,73 @@
+"""ResponseCache: repeated reads are served from the cache until db.version moves."""
+
+from response_cache import ResponseCache
+from tasks_db import TaskDB
+
+
+def counted(calls, build):
+    # build, recording each call in calls.
+    def wrapper():
+        calls.append(1)
+        return build()
+
+    return wrapper
+
+
+def listing(db, calls):
+    return counted(calls, lambda: {"tasks": db.list_tasks()})
+
+
+def test_repeated_reads_hit_until_a_write():
+    db = TaskDB()
+    cache = ResponseCache(db)
+    calls = []
+    db.add_task("first")
+    assert len(cache.get("get-tasks", "{}", listing(db, calls))["tasks"]) == 1
+    assert len(cache.get("get-tasks", "{}", listing(db, calls))["tasks"]) == 1
+    assert (len(calls), cache.hits, cache.misses) == (1, 1, 1)
+
+    # Other arguments are a separate entry.
+    cache.get("get-tasks", '{"status":"done"}', listing(db, calls))
+    assert len(calls) == 2
+
+    db.add_task("second")
+    assert len(cache.get("get-tasks", "{}", listing(db, calls))["tasks"]) == 2
+    assert len(calls) == 3
+    assert list(cache.entries) == [("get-tasks", "{}")]
+
+
+def test_an_expired_lease_invalidates_before_the_lookup():
+    db = TaskDB()
+    now = 1_700_000_000.0
+    db.clock = lambda: now
+    task = db.add_task("work")
+    db.claim_next("worker", ttl=10)
+    cache = ResponseCache(db)
+    calls = []
+    assert cache.get("get-task", task["id"], lambda: db.get_task(task["id"]))["status"] == "in_progress"
+
+    now += 10
+    response = cache.get("get-task", task["id"], counted(calls, lambda: db.get_task(task["id"])))
+    assert response["status"] == "pending"
+    assert calls == [1]
+
+
+def test_a_response_built_across_a_write_is_not_kept():
+    db = TaskDB()
+    cache = ResponseCache(db)
+
+    def racing_build():
+        # Another writer lands while this response is being built.
+        db.add_task("concurrent")
+        return {"tasks": []}
+
+    cache.get("get-tasks", "{}", racing_build)
+    assert cache.entries == {}
+
+
+def test_oldest_entries_are_evicted_first():
+    db = TaskDB()
+    cache = ResponseCache(db, max_entries=2)
+    for query in ["a", "b", "c"]:
+        cache.get("search-tasks", query, lambda query=query: query)
+    assert list(cache.entries) == [("search-tasks", "b"), ("search-tasks", "c")]
@@ -0,0 +1,75 @@
+"""next_task()/claim_next() order: the indexed pending-task heap kept in step with every write."""
+
+import random
+
+from tasks_db import DONE, TaskDB
+
+DUES = [None, "2030-01-01T00:00:00+00:00", "2030-06-01T00:00:00+00:00", "2031-01-01T00:00:00+00:00"]
+
+
+def expected_next(db, min_priority=None, due_before=None):
+    # Brute force over every task: highest priority, earliest due (undated last), oldest.
+    tasks = db.list_tasks()
+    ready = [
+        (-task["priority"], task["due_at"] is None, task["due_at"] or "", i, task["id"])
+        for i, task in enumerate(tasks)
+        if task["status"] == "pending"
+        and (min_priority is None or task["priority"] >= min_priority)
+        and (due_before is None or (task["due_at"] is not None and task["due_at"] <= due_before))
+    ]
+    return min(ready)[-1] if ready else None
+
+
+def test_most_urgent_first():
+    db = TaskDB()
+    db.add_task("low")
+    db.add_task("undated", priority=5)
+    db.add_task("due late", priority=5, due_at=DUES[3])
+    db.add_task("due soon", priority=5, due_at=DUES[1])
+    db.add_task("due soon too", priority=5, due_at=DUES[1])
+    order = []
+    while task := db.claim_next("worker", ttl=60):
+        order.append(task["title"])
+    assert order == ["due soon", "due soon too", "due late", "undated", "low"]
+
+
+def test_writes_move_tasks_on_and_off_the_schedule():
+    db = TaskDB()
+    first = db.add_task("first", priority=1)
+    second = db.add_task("second")
+    assert db.next_task()["id"] == first["id"]
+
+    db.update_task(second["id"], priority=2)
+    assert db.next_task()["id"] == second["id"]
+    db.set_status(second["id"], DONE)
+    assert db.next_task()["id"] == first["id"]
+    db.set_status(first["id"], "cancelled")
+    assert db.next_task() == {}
+
+    # Reopened tasks are scheduled again, in their place.
+    db.set_status(first["id"], "pending")
+    db.set_status(second["id"], "pending")
+    assert db.next_task()["id"] == second["id"]
+    assert db.next_task(due_before=DUES[3]) == {}
+    assert db.next_task(min_priority=3) == {}
+
+
+def test_schedule_matches_brute_force_after_random_writes():
+    rng = random.Random(7)  # noqa: S311 - a reproducible workload
+    db = TaskDB()
+    db.clock = lambda: 1_700_000_000.0
+    for step in range(600):
+        tasks = db.list_tasks()
+        op = rng.random()
+        if op < 0.35 or not tasks:
+            db.add_task(f"task {step}", priority=rng.randint(0, 4), due_at=rng.choice(DUES))
+        elif op < 0.6:
+            db.update_task(rng.choice(tasks)["id"], priority=rng.randint(0, 4), due_at=rng.choice(DUES))
+        elif op < 0.85:
+            db.set_status(rng.choice(tasks)["id"], rng.choice(["pending", "in_progress", DONE, "cancelled"]))
+        else:
+            db.claim_next("worker", ttl=60)
+        min_priority = rng.choice([None, 2])
+        due_before = rng.choice([None, DUES[2]])
+        expected = expected_next(db, min_priority, due_before)
+        assert db.next_task(min_priority, due_before).get("id") == expected
@@ -0,0 +1,110 @@
+"""ShardedTaskDB routing and merging over real worker processes."""
+
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sharding import ShardedTaskDB
+from tasks_db import VersionConflict
+
+SHARDS = 3
+
+
+def shard_of(task_id):
+    return uuid.UUID(task_id).int % SHARDS
+
+
+@pytest.fixture
+def db():
+    store = ShardedTaskDB(SHARDS)
+    yield store
+    store.close()
+
+
+def test_tasks_are_spread_and_found_on_their_shard(db):
+    tasks = db.add_tasks({"title": f"Task {i}"} for i in range(30))
+    assert {shard_of(task["id"]) for task in tasks} == set(range(SHARDS))
+    for task in tasks:
+        assert db.get_task(task["id"]) == task
+    ids = [task["id"] for task in reversed(tasks)] + [str(uuid.uuid4()), "not-an-id"]
+    assert db.get_tasks(ids) == [*reversed(tasks), {}, {}]
+
+
+def test_listing_merges_shards_in_creation_order(db):
+    tasks = [db.add_task(f"Task {i}") for i in range(25)]
+    seen, cursor = [], 0
+    while True:
+        page, cursor = db.query_tasks(cursor=cursor, limit=7)
+        seen += page
+        if cursor is None:
+            break
+    assert [task["id"] for task in seen] == [task["id"] for task in tasks]
+    with pytest.raises(ValueError, match="Not a cursor"):
+        db.query_tasks(cursor="12")
+
+
+def test_next_and_claim_take_the_most_urgent_task_of_any_shard(db):
+    db.add_tasks({"title": f"Task {i}", "priority": i % 4} for i in range(20))
+    urgent = db.add_task("Urgent", priority=9)
+    assert db.next_task()["id"] == urgent["id"]
+    assert db.claim_next("worker", ttl=60)["id"] == urgent["id"]
+    assert db.next_task()["priority"] == 3
+
+
+def test_dependencies_stay_on_one_shard(db):
+    first = db.add_task("First")
+    second = db.add_task("Second", depends_on=[first["id"]])
+    assert shard_of(second["id"]) == shard_of(first["id"])
+    others = db.add_tasks({"title": f"Other {i}"} for i in range(10))
+    spread = [task["id"] for task in others if shard_of(task["id"]) != shard_of(first["id"])][:1]
+    with pytest.raises(ValueError, match="one shard"):
+        db.add_task("Both", depends_on=[first["id"], *spread])
+
+
+def test_batch_conflict_leaves_every_shard_unchanged(db):
+    tasks = db.add_tasks({"title": f"Task {i}"} for i in range(12))
+    stale = {**tasks[0], "version": tasks[0]["version"] - 1}
+    updates = [(task["id"], "done", None) for task in tasks[1:]] + [(stale["id"], "done", stale["version"])]
+    with pytest.raises(VersionConflict):
+        db.set_statuses(updates)
+    assert db.count_by_status() == {"pending": 12}
+
+
+def test_writes_reach_the_change_feed_in_order(db):
+    seen = []
+    db.add_listener(lambda change: seen.append(change["version"]))
+    db.add_tasks({"title": f"Task {i}"} for i in range(10))
+    db.set_status(db.next_task()["id"], "done")
+    changes, reset = db.changes_since(0)
+    assert not reset
+    assert [change["version"] for change in changes] == seen == list(range(1, 12))
+
+
+def test_expired_leases_are_requeued_without_asking_every_shard(db):
+    task = db.add_task("Leased")
+    db.claim_next("worker", ttl=0.05)
+    assert db.expire_leases() == []
+    time.sleep(0.1)
+    assert [expired["id"] for expired in db.expire_leases()] == [task["id"]]
+    assert db.get_task(task["id"])["status"] == "pending"
+
+
+def test_calls_from_many_threads_are_pipelined(db):
+    tasks = db.add_tasks({"title": f"Task {i}"} for i in range(60))
+    with ThreadPoolExecutor(8) as pool:
+        found = list(pool.map(lambda task: db.get_task(task["id"]), tasks * 5))
+        claimed = list(pool.map(lambda i: db.claim_next(f"worker-{i}", ttl=60), range(60)))
+    assert found == tasks * 5
+    assert sorted(task["id"] for task in claimed) == sorted(task["id"] for task in tasks)
+
+
+def test_close_survives_a_dead_worker():
+    store = ShardedTaskDB(SHARDS)
+    store.add_tasks({"title": f"Task {i}"} for i in range(6))
+    store.workers[1].process.kill()
+    store.workers[1].process.wait()
+    store.close()
+    assert not any(worker.reader.is_alive() for worker in store.workers)
+    assert all(worker.process.poll() is not None for worker in store.workers)
@@ -0,0 +1,55 @@
+"""Storage engines: TaskDB state survives a restart, and a torn journal record is dropped."""
+
+import json
+
+import pytest
+
+from storage import JournalStorage, SQLiteStorage
+from tasks_db import TaskDB
+
+ENGINES = {
+    "sqlite": lambda path: SQLiteStorage(path / "tasks.db"),
+    "journal": lambda path: JournalStorage(path / "journal", snapshot_every=3),
+}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_tasks_survive_a_restart(tmp_path, engine):
+    db = TaskDB(ENGINES[engine](tmp_path))
+    first = db.add_task(title="Write the report", priority=2)
+    second = db.add_task(title="Review the report", depends_on=[first["id"]])
+    db.add_tasks({"title": f"Batch {i}"} for i in range(3))
+    db.update_task(first["id"], description="Quarterly numbers")
+    db.set_status(first["id"], "done")
+    before = db.list_tasks()
+    db.close()
+
+    reopened = TaskDB(ENGINES[engine](tmp_path))
+    assert reopened.list_tasks() == before
+    assert reopened.get_task(second["id"])["depends_on"] == [first["id"]]
+    # Versions carry on from the saved state, so expected_version still guards writes.
+    done = reopened.get_task(first["id"])
+    assert reopened.update_task(first["id"], title="Write it", expected_version=done["version"])
+    reopened.close()
+
+
+def test_torn_journal_record_is_dropped_and_appends_resume(tmp_path):
+    directory = tmp_path / "journal"
+    db = TaskDB(JournalStorage(directory))
+    kept = [db.add_task(title=f"Task {i}") for i in range(3)]
+    db.close()
+    journal = directory / "journal.ndjson"
+    intact = journal.stat().st_size
+    # A crash mid-append leaves the start of a record with no newline.
+    with journal.open("a", encoding="utf-8") as f:
+        f.write('{"id":"torn","title":"Half wri')
+
+    db = TaskDB(JournalStorage(directory))
+    assert [task["title"] for task in db.list_tasks()] == [task["title"] for task in kept]
+    assert journal.stat().st_size == intact
+    added = db.add_task(title="After the crash")
+    db.close()
+
+    lines = journal.read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[-1])["id"] == added["id"]
+    assert len(TaskDB(JournalStorage(directory)).list_tasks()) == 4
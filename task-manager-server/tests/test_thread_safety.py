@@ -0,0 +1,26 @@
+"""ThreadSafeTaskDB under racing threads, checked with the stress benchmark's checks."""
+
+import sys
+
+import pytest
+
+from benchmarks.stress import stress_claims, stress_writes
+from tasks_db import ThreadSafeTaskDB
+
+
+@pytest.fixture(autouse=True)
+def fast_switching():
+    # Switch threads as often as possible to provoke interleavings.
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def test_each_task_is_claimed_once():
+    stress_claims(ThreadSafeTaskDB, threads=8, tasks=2000)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_change_log_replays_to_final_state(seed):
+    stress_writes(ThreadSafeTaskDB, threads=8, ops=500, seed=seed)
@@ -0,0 +1,155 @@
+"""Similarity search over task text.
+
+Tasks are embedded by a pluggable function and compared by cosine
+similarity with brute-force search: a NumPy matrix product when NumPy is
+installed, plain Python otherwise. An embedding function takes a list of
+strings and returns one vector per string; the default hashes words and
+character trigrams into a fixed-size vector, so it works offline with no
+model and tolerates small spelling and inflection differences.
+"""
+
+import heapq
+import importlib
+import math
+import zlib
+from operator import itemgetter, mul
+
+from search_index import tokenize
+
+try:
+    import numpy as np
+except ImportError:  # optional: pure-Python dot products instead
+    np = None
+
+HASH_DIM = 256
+
+
+def hashing_embedding(texts, dim=HASH_DIM):
+    vectors = []
+    for text in texts:
+        vector = [0.0] * dim
+        for word in tokenize(text):
+            features = [(word, 1.0)]
+            padded = f"#{word}#"
+            features += [(padded[i : i + 3], 0.5) for i in range(len(padded) - 2)]
+            for feature, weight in features:
+                h = zlib.crc32(feature.encode())
+                vector[h % dim] += weight if h & 0x80000000 else -weight
+        vectors.append(vector)
+    return vectors
+
+
+def load_embedding(spec):
+    """Resolve a ``module:function`` spec to an embedding function."""
+    module, _, name = spec.partition(":")
+    if not name:
+        msg = f"Embedding must be given as module:function, got {spec!r}"
+        raise ValueError(msg)
+    return getattr(importlib.import_module(module), name)
+
+
+def _normalized(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class VectorIndex:
+    """Cosine-similarity index of task keys to embedded text.
+
+    Writes only queue the new text; queued texts are embedded in one batch
+    on the next search, so bursts of writes cost one embedding call.
+    """
+
+    def __init__(self, embed=None):
+        self.embed = embed or hashing_embedding
+        self._pending = {}
+        self._rows = {}
+        self._keys = []
+        # NumPy: (capacity, dim) float32 array of unit rows. Otherwise a list of unit vectors.
+        self._matrix = None if np is not None else []
+
+    def update(self, key, text):
+        self._pending[key] = text
+
+    def remove(self, key):
+        self._pending.pop(key, None)
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        # Move the last row into the gap so rows stay dense.
+        last = len(self._keys) - 1
+        if row != last:
+            moved = self._keys[row] = self._keys[last]
+            self._rows[moved] = row
+            self._matrix[row] = self._matrix[last]
+        self._keys.pop()
+        if np is None:
+            self._matrix.pop()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        keys, texts = list(self._pending), list(self._pending.values())
+        self._pending = {}
+        self._store(keys, self.embed(texts))
+
+    def _row(self, key):
+        row = self._rows.get(key)
+        if row is None:
+            row = self._rows[key] = len(self._keys)
+            self._keys.append(key)
+        return row
+
+    def _store(self, keys, vectors):
+        if np is None:
+            for key, vector in zip(keys, vectors, strict=True):
+                row = self._row(key)
+                unit = _normalized(vector)
+                if row == len(self._matrix):
+                    self._matrix.append(unit)
+                else:
+                    self._matrix[row] = unit
+            return
+        block = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        block /= np.where(norms == 0, 1, norms)
+        rows = [self._row(key) for key in keys]
+        if self._matrix is None:
+            self._matrix = np.zeros((max(1024, len(self._keys)), block.shape[1]), dtype=np.float32)
+        elif len(self._keys) > len(self._matrix):
+            grown = np.zeros((max(2 * len(self._matrix), len(self._keys)), self._matrix.shape[1]), dtype=np.float32)
+            grown[: len(self._matrix)] = self._matrix
+            self._matrix = grown
+        self._matrix[rows] = block
+
+    def search(self, text, limit=5, accept=None):
+        """Best ``limit`` ``(key, similarity)`` pairs for ``text``, best first.
+
+        ``accept(key)``, if given, filters candidates.
+        """
+        self._flush()
+        if not self._keys:
+            return []
+        query = _normalized(self.embed([text])[0])
+        if np is None:
+            scored = ((key, sum(map(mul, query, vector))) for key, vector in zip(self._keys, self._matrix, strict=True))
+            if accept is not None:
+                scored = ((key, score) for key, score in scored if accept(key))
+            return heapq.nlargest(limit, scored, key=itemgetter(1))
+        scores = self._matrix[: len(self._keys)] @ np.asarray(query, dtype=np.float32)
+        n = len(scores)
+        # Rank a shortlist first; only a selective filter needs the full sort.
+        k = min(n, limit if accept is None else limit * 8)
+        while True:
+            top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+            top = top[np.argsort(-scores[top], kind="stable")]
+            hits = []
+            for row in top:
+                key = self._keys[row]
+                if accept is None or accept(key):
+                    hits.append((key, float(scores[row])))
+                    if len(hits) == limit:
+                        return hits
+            if k == n:
+                return hits
+            k = n